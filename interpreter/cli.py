@@ -26,6 +26,7 @@ from typing import Any, Dict
 from .misc.get_input import async_get_input
 from .misc.spinner import SimpleSpinner
 from .profiles import Profile
+from .ui.output import output
 
 # Global interpreter object
 global_interpreter = None
@@ -240,6 +241,7 @@ async def async_main(args):
         global_interpreter = await async_load_interpreter(args)
         message = args["input"] if args["input"] is not None else sys.stdin.read()
         spinner.stop()
+        output.flush()
     print()
     global_interpreter.messages = [{"role": "user", "content": message}]
     try:
@@ -249,6 +251,7 @@ async def async_main(args):
         global_interpreter._spinner.stop()
     except asyncio.CancelledError:
         global_interpreter._spinner.stop()
+    output.flush()
     print()
 
     if global_interpreter.interactive:
@@ -16,6 +16,18 @@ SETTINGS: Dict[str, Tuple[Type, str]] = {
     "api_version": (str, "API version"),
     "temperature": (float, "Sampling temperature (0-1)"),
     "max_turns": (int, "Maximum conversation turns (-1 for unlimited)"),
+    "prompt_caching": (bool, "Cache the system prompt, tools and history (Anthropic)"),
+    "bash_timeout": (float, "Seconds before a bash command is interrupted"),
+    "bash_output_limit": (int, "Bytes of bash output shown per command (start + end)"),
+    "bash_pty": (bool, "Run bash on a pseudo-terminal (for programs that need a tty)"),
+    "bash_scrollback": (int, "Lines of terminal history kept per command in PTY mode"),
+    "screenshot_format": (str, "Screenshot format sent to the model (png, or lossy jpeg/webp)"),
+    "screenshot_quality": (int, "Quality of jpeg/webp screenshots (1-100)"),
+    "computer_fast": (bool, "Skip mouse animations and pauses in the computer tool"),
+    "computer_background_capture": (bool, "Capture the screen in the background for faster screenshots"),
+    "computer_active_display_only": (bool, "Only capture and control the active display"),
+    "computer_paste_min_length": (int, "Paste text at least this long instead of typing it (0: always type)"),
+    "edit_history_spill": (bool, "Save undo history past the memory cap to disk instead of dropping it"),
 }
 
 
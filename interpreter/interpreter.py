@@ -26,7 +26,7 @@ litellm.REPEATED_STREAMING_CHUNK_LIMIT = 99999999
 litellm.modify_params = True
 # litellm.drop_params = True
 
-from anthropic import Anthropic
+from anthropic import NOT_GIVEN, AsyncAnthropic
 from anthropic.types.beta import (
     BetaContentBlock,
     BetaContentBlockParam,
@@ -35,6 +35,8 @@ from anthropic.types.beta import (
     BetaRawContentBlockDeltaEvent,
     BetaRawContentBlockStartEvent,
     BetaRawContentBlockStopEvent,
+    BetaRawMessageDeltaEvent,
+    BetaRawMessageStartEvent,
     BetaTextBlockParam,
     BetaToolResultBlockParam,
 )
@@ -46,6 +48,7 @@ from .profiles import Profile
 # from .tools import BashTool, ComputerTool, EditTool, ToolCollection, ToolResult
 from .tools.base import ToolResult # Import base ToolResult
 from .ui.markdown import MarkdownRenderer
+from .ui.output import output
 from .ui.tool import ToolRenderer
 
 COMPUTER_USE_BETA_FLAG = "computer-use-20250124" # Updated hypothetical beta flag
@@ -74,7 +77,7 @@ def _make_api_tool_result(
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/png",
+                        "media_type": result.media_type or "image/png",
                         "data": result.base64_image,
                     },
                 }
@@ -87,6 +90,40 @@ def _make_api_tool_result(
     }
 
 
+def _with_cache_breakpoint(messages: list[dict]) -> list[dict]:
+    """
+    Return a copy of messages with a prompt-caching breakpoint on the latest user
+    message (a prompt or a batch of tool results). Only that message is copied, so
+    breakpoints never accumulate in the stored history.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if not isinstance(message, dict) or message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            if not content:
+                return messages
+            content = [{"type": "text", "text": content}]
+        elif not content or not isinstance(content[-1], dict):
+            return messages
+        else:
+            content = list(content)
+        content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+        return messages[:index] + [{**message, "content": content}] + messages[index + 1 :]
+    return messages
+
+
+async def _iter_chunks(response):
+    """Iterate a litellm response, whether it is an async stream or a list of chunks."""
+    if hasattr(response, "__aiter__"):
+        async for chunk in response:
+            yield chunk
+    else:
+        for chunk in response:
+            yield chunk
+
+
 class Interpreter:
     """
     Open Interpreter's main interface.
@@ -147,6 +184,18 @@ class Interpreter:
     max_turns: int
     debug: bool
     serve: bool
+    prompt_caching: bool
+    bash_timeout: float
+    bash_output_limit: int
+    bash_pty: bool
+    bash_scrollback: int
+    screenshot_format: str
+    screenshot_quality: int
+    computer_fast: bool
+    computer_background_capture: bool
+    computer_active_display_only: bool
+    computer_paste_min_length: int
+    edit_history_spill: bool
     messages: List[Dict[str, Any]]
 
     def __init__(self, profile=None):
@@ -174,6 +223,18 @@ class Interpreter:
         self.max_turns = -1
         self.debug = False
         self.serve = False
+        self.prompt_caching = True
+        self.bash_timeout = 300.0  # Seconds before a bash command is interrupted
+        self.bash_output_limit = 16000  # Bytes of bash output shown (head + tail), the rest is spooled
+        self.bash_pty = False  # Run bash on a pseudo-terminal, for programs that need a tty
+        self.bash_scrollback = 2000  # Lines of terminal history kept per command in PTY mode
+        self.screenshot_format = "png"  # png (lossless), or jpeg/webp for smaller, lossy screenshots
+        self.screenshot_quality = 80  # For jpeg and webp screenshots
+        self.computer_fast = False  # Skip mouse animations and pauses in the computer tool
+        self.computer_background_capture = False  # Keep a fresh screenshot ready on a background thread
+        self.computer_active_display_only = False  # Only see and control the DISPLAY_NUM/primary display
+        self.computer_paste_min_length = 200  # Paste text at least this long instead of typing it (0 to always type)
+        self.edit_history_spill = False  # Save undo history past the memory cap to disk instead of dropping it
         self.messages = []
         
         # Always load from profiles.py in CWD unless a specific profile object is passed
@@ -196,10 +257,23 @@ class Interpreter:
             if hasattr(self, key) and key != "profile":
                 setattr(self, key, value)
 
+        enterprise_config = getattr(self._profile, "enterprise_config", None)
+        if enterprise_config is not None:
+            self.prompt_caching = enterprise_config.use_prompt_caching
+
         self._client = None
+        self._loop = None  # Event loop reused by the sync respond() API
+        # Session-wide tool instances, keyed by tool name (see _get_tool_collection)
+        self._tool_instances = {}
+        self._tool_collection = None
+        self._tool_collection_key = None
+        self._warmup_task = None
+        self._warmup_loop = None  # The loop the warm-up task runs on
         self._spinner = SimpleSpinner("")
         self._command_handler = CommandHandler(self)
         self._stop_flag = False
+        # Per-turn token usage reported by the Anthropic API, including cache reads/writes
+        self.token_usage = []
         # Ensure messages is initialized if it wasn't set by profile load
         if not hasattr(self, 'messages') or self.messages is None:
             self.messages = []
@@ -250,6 +324,67 @@ class Interpreter:
         """
         return cls(Profile.from_file(path))
 
+    def _get_tool_collection(self):
+        """
+        Return a ToolCollection for the enabled tools. Tool instances are created once
+        and reused for the whole session, so the bash session, the editor's undo
+        history and the computer tool's display info survive between turns.
+        """
+        # Import tools here to avoid circular import at module level
+        from .tools import (
+            BashTool,
+            ComputerExtrasTool,
+            ComputerTool,
+            EditTool,
+            ToolCollection,
+        )
+
+        key = tuple(self.tools)
+        if self._tool_collection is None or self._tool_collection_key != key:
+            factories = {
+                "interpreter": BashTool,
+                "editor": EditTool,
+                "gui": ComputerTool,
+            }
+            tools = []
+            for tool_name, factory in factories.items():
+                if tool_name not in self.tools:
+                    continue
+                if tool_name not in self._tool_instances:
+                    self._tool_instances[tool_name] = factory(self) # Pass interpreter instance
+                tools.append(self._tool_instances[tool_name])
+            if "gui" in self.tools:
+                # zoom/sequence/save/locate, which Anthropic's computer tool can't declare
+                if "gui_extras" not in self._tool_instances:
+                    self._tool_instances["gui_extras"] = ComputerExtrasTool(
+                        self._tool_instances["gui"]
+                    )
+                tools.append(self._tool_instances["gui_extras"])
+            self._tool_collection = ToolCollection(*tools)
+            self._tool_collection_key = key
+        return self._tool_collection
+
+    def _warm_tools(self):
+        """
+        Start the bash session in the background, so the first command doesn't
+        wait for it. Only called from async_respond: a task started on some
+        other loop (e.g. the one the CLI builds us in) may never get to finish.
+        """
+        if "interpreter" not in self.tools:
+            return
+        loop = asyncio.get_running_loop()
+        if (
+            self._warmup_task is not None
+            and self._warmup_loop is loop
+            and not self._warmup_task.done()
+        ):
+            return
+        bash = self._get_tool_collection().tool_map.get("bash")
+        if bash is None or not hasattr(bash, "start"):
+            return
+        self._warmup_task = loop.create_task(bash.start())
+        self._warmup_loop = loop
+
     def default_system_message(self):
         system_message = "<SYSTEM_CAPABILITY>\n"
 
@@ -301,21 +436,28 @@ class Interpreter:
         Agentic sampling loop for the assistant/tool interaction.
         Yields chunks and maintains message history on the interpreter instance.
         """
-        # Import tools here to avoid circular import at module level
-        from .tools import BashTool, ComputerTool, EditTool, ToolCollection
+        try:
+            async for chunk in self._respond_turns(user_input):
+                yield chunk
+        finally:
+            # A turn that ends early (an API error, Ctrl-C) mustn't leave the
+            # warm-up halfway through spawning bash: if asyncio.run then cancels
+            # it, asyncio's subprocess setup waits forever for the killed shell
+            task = self._warmup_task
+            if (
+                task is not None
+                and not task.done()
+                and self._warmup_loop is asyncio.get_running_loop()
+            ):
+                await asyncio.wait([task])
 
+    async def _respond_turns(self, user_input=None):
         if user_input:
             self.messages.append({"role": "user", "content": user_input})
 
-        tools = []
-        if "interpreter" in self.tools:
-            tools.append(BashTool(self)) # Pass interpreter instance
-        if "editor" in self.tools:
-            tools.append(EditTool(self)) # Pass interpreter instance
-        if "gui" in self.tools:
-            tools.append(ComputerTool(self)) # Pass interpreter instance
-
-        tool_collection = ToolCollection(*tools) # Removed interpreter=self
+        # Tool instances (and the bash session) live for the whole session
+        tool_collection = self._get_tool_collection()
+        self._warm_tools()
 
         # Get provider and max_tokens, prioritizing profile settings
         provider = self.provider
@@ -390,7 +532,7 @@ class Interpreter:
                         anthropic_params["api_key"] = self.api_key
                     if self.api_base is not None:
                         anthropic_params["base_url"] = self.api_base
-                    self._client = Anthropic(**anthropic_params)
+                    self._client = AsyncAnthropic(**anthropic_params)
 
                 if self.debug:
                     print("Sending messages:", self.messages, "\n")
@@ -399,75 +541,77 @@ class Interpreter:
                 if model.startswith("anthropic/"):
                     model = model[len("anthropic/") :]
 
+                tool_params = tool_collection.to_params()
+                request_messages = self.messages
+                request_system = system["text"]
+                request_betas = []
+                if self.prompt_caching:
+                    # Breakpoints on the system prompt, the tool list and the latest
+                    # user turn, so turns 2..N read the whole prefix from cache
+                    request_system = [{**system, "cache_control": {"type": "ephemeral"}}]
+                    if tool_params:
+                        tool_params[-1] = {
+                            **tool_params[-1],
+                            "cache_control": {"type": "ephemeral"},
+                        }
+                    request_messages = _with_cache_breakpoint(self.messages)
+                    request_betas.append(PROMPT_CACHING_BETA_FLAG)
+
                 # Use Anthropic API which supports betas
-                raw_response = self._client.beta.messages.create(
+                raw_response = await self._client.beta.messages.create(
                     max_tokens=max_tokens,
-                    messages=self.messages,
+                    messages=request_messages,
                     model=model,
-                    system=system["text"],
-                    tools=tool_collection.to_params(),
-                    # betas=betas, # Removed potentially conflicting beta flag
+                    system=request_system,
+                    tools=tool_params,
+                    betas=request_betas or NOT_GIVEN,
                     stream=True,
                 )
 
                 response_content = []
                 current_block = None
                 first_token = True
+                usage = {"input_tokens": 0, "output_tokens": 0}
 
-                for chunk in raw_response:
+                async for chunk in raw_response:
                     yield chunk
 
                     if first_token:
                         self._spinner.stop()
                         first_token = False
 
-                    if isinstance(chunk, BetaRawContentBlockStartEvent):
+                    if isinstance(chunk, BetaRawMessageStartEvent):
+                        usage.update(chunk.message.usage.model_dump(exclude_none=True))
+                    elif isinstance(chunk, BetaRawMessageDeltaEvent):
+                        usage["output_tokens"] = chunk.usage.output_tokens
+                    elif isinstance(chunk, BetaRawContentBlockStartEvent):
                         current_block = chunk.content_block
                     elif isinstance(chunk, BetaRawContentBlockDeltaEvent):
                         if chunk.delta.type == "text_delta":
                             md.feed(chunk.delta.text)
-                            await asyncio.sleep(0)
                             if current_block and current_block.type == "text":
                                 current_block.text += chunk.delta.text
                         elif chunk.delta.type == "input_json_delta":
-                            if not hasattr(current_block, "partial_json"):
-                                current_block.partial_json = ""
-                                current_block.parsed_json = {}
-                                current_block.current_key = None
-                                current_block.current_value = ""
-
-                            current_block.partial_json += chunk.delta.partial_json
-
                             if hasattr(current_block, "name"):
                                 if edit.name == None:
                                     edit.name = current_block.name
-                                edit.feed(chunk.delta.partial_json)
+                            # The renderer's incremental parser also builds the block's input
+                            edit.feed(chunk.delta.partial_json)
 
                     elif isinstance(chunk, BetaRawContentBlockStopEvent):
                         edit.close()
-                        edit = ToolRenderer()
                         if current_block:
-                            if hasattr(current_block, "partial_json"):
-                                current_block.input = json.loads(
-                                    current_block.partial_json
-                                )
-                                delattr(current_block, "partial_json")
+                            if edit.current_json is not None:
+                                current_block.input = edit.current_json
                             else:
                                 md.feed("\n")
-                                await asyncio.sleep(0)
-
-                            for attr in [
-                                "partial_json",
-                                "parsed_json",
-                                "current_key",
-                                "current_value",
-                            ]:
-                                if hasattr(current_block, attr):
-                                    delattr(current_block, attr)
                             response_content.append(current_block)
                             current_block = None
+                        edit = ToolRenderer()
 
                 edit.close()
+                # Get the rendered response on screen before prompting or running tools
+                output.flush()
 
                 response = BetaMessage(
                     id=str(uuid.uuid4()),
@@ -477,8 +621,9 @@ class Interpreter:
                     stop_reason=None,
                     stop_sequence=None,
                     type="message",
-                    usage={"input_tokens": 0, "output_tokens": 0},
+                    usage=usage,
                 )
+                self._report_usage(usage)
 
                 # Only append if response has meaningful content
                 if response.content:
@@ -571,46 +716,51 @@ class Interpreter:
                                 user_approval = "y"
 
                 tool_result_content: list[BetaToolResultBlockParam] = []
-                for content_block in cast(list[BetaContentBlock], response.content):
-                    if content_block.type == "tool_use":
-                        if user_approval in ["y", "a"]:
-                            result = await tool_collection.run(
-                                name=content_block.name,
-                                tool_input=cast(dict[str, Any], content_block.input),
+                if user_approval in ["y", "a"]:
+                    # Independent calls run concurrently, results keep the block order
+                    results = await tool_collection.run_many(
+                        [
+                            (content_block.name, cast(dict[str, Any], content_block.input))
+                            for content_block in tool_use_blocks
+                        ]
+                    )
+                else:
+                    results = []
+                    for content_block in tool_use_blocks:
+                        if self.interactive:
+                            result = ToolResult(
+                                output="Tool execution cancelled by user"
                             )
                         else:
-                            if self.interactive:
-                                result = ToolResult(
-                                    output="Tool execution cancelled by user"
-                                )
-                            else:
-                                # Provide more specific feedback based on allowed lists
-                                error_msg = "Tool execution cancelled." # Default message
-                                if content_block.name == "bash":
-                                    cmd = content_block.input.get("command", "")
-                                    if cmd and cmd not in self.allowed_commands:
-                                        error_msg = f"Command '{cmd}' is not in allowed_commands."
-                                    elif not self.allowed_commands:
-                                        error_msg = "No commands are allowed in the current profile."
-                                    else: # Command is allowed or empty, but user denied
-                                        error_msg = "Command execution denied by user."
-                                elif content_block.name == "str_replace_editor":
-                                    path = content_block.input.get("path", "")
-                                    if path and path not in self.allowed_paths:
-                                        error_msg = f"Path '{path}' is not in allowed_paths."
-                                    elif not self.allowed_paths:
-                                        error_msg = "No paths are allowed for editing/viewing in the current profile."
-                                    else: # Path is allowed or empty, but user denied
-                                        error_msg = "File operation denied by user."
-                                else: # Computer tool etc. (Assume denied by user if not bash/editor)
-                                    error_msg = "Tool execution denied by user."
-
-                                result = ToolResult(error=error_msg) # Use error field
-
-                        # Append result whether it was run or denied/cancelled
-                        tool_result_content.append(
-                            _make_api_tool_result(result, content_block.id) # Pass ToolResult directly
-                        )
+                            # Provide more specific feedback based on allowed lists
+                            error_msg = "Tool execution cancelled." # Default message
+                            if content_block.name == "bash":
+                                cmd = content_block.input.get("command", "")
+                                if cmd and cmd not in self.allowed_commands:
+                                    error_msg = f"Command '{cmd}' is not in allowed_commands."
+                                elif not self.allowed_commands:
+                                    error_msg = "No commands are allowed in the current profile."
+                                else: # Command is allowed or empty, but user denied
+                                    error_msg = "Command execution denied by user."
+                            elif content_block.name == "str_replace_editor":
+                                path = content_block.input.get("path", "")
+                                if path and path not in self.allowed_paths:
+                                    error_msg = f"Path '{path}' is not in allowed_paths."
+                                elif not self.allowed_paths:
+                                    error_msg = "No paths are allowed for editing/viewing in the current profile."
+                                else: # Path is allowed or empty, but user denied
+                                    error_msg = "File operation denied by user."
+                            else: # Computer tool etc. (Assume denied by user if not bash/editor)
+                                error_msg = "Tool execution denied by user."
+
+                            result = ToolResult(error=error_msg) # Use error field
+                        results.append(result)
+
+                for content_block, result in zip(tool_use_blocks, results):
+                    # Append result whether it was run or denied/cancelled
+                    tool_result_content.append(
+                        _make_api_tool_result(result, content_block.id) # Pass ToolResult directly
+                    )
 
                 if not tool_result_content:
                     break
@@ -626,9 +776,6 @@ class Interpreter:
                     break
 
             else:
-                # Import tools here to avoid circular import at module level
-                from .tools import BashTool, ComputerTool, EditTool, ToolCollection
-
                 tools = []
                 if "interpreter" in self.tools:
                     tools.append(
@@ -668,7 +815,7 @@ class Interpreter:
 * If `path` is a file, `view` displays the result of applying `cat -n`. If `path` is a directory, `view` lists non-hidden files and directories up to 2 levels deep
 * The `create` command cannot be used if the specified `path` already exists as a file
 * If a `command` generates a long output, it will be truncated and marked with `<response clipped>`
-* The `undo_edit` command will revert the last edit made to the file at `path`
+* The `undo_edit` command will revert the last edit made to the file at `path`. Changes made to other parts of the file since are kept, but an edit can't be undone once its own lines were changed by something else
 
 Notes for using the `str_replace` command:
 * The `old_str` parameter should match EXACTLY one or more consecutive lines from the original file. Be mindful of whitespaces!
@@ -750,6 +897,10 @@ Notes for using the `str_replace` command:
                                                 "double_click",  # Perform double left click
                                                 "screenshot",  # Take a screenshot
                                                 "cursor_position",  # Get current cursor coordinates
+                                                "zoom",  # Screenshot of a region at full resolution
+                                                "sequence",  # Several input actions, one screenshot at the end
+                                                "save",  # Save the element under the cursor under a label
+                                                "locate",  # Find a saved element
                                             ],
                                         },
                                         "text": {
@@ -763,6 +914,34 @@ Notes for using the `str_replace` command:
                                             "minItems": 2,
                                             "maxItems": 2,
                                         },
+                                        "region": {
+                                            "type": "array",
+                                            "description": "x1,y1,x2,y2 of the area to show at full resolution (required for 'zoom')",
+                                            "items": {"type": "integer"},
+                                            "minItems": 4,
+                                            "maxItems": 4,
+                                        },
+                                        "label": {
+                                            "type": "string",
+                                            "description": "On a click or 'save', saves the element under the cursor under this name. For 'locate', the name of the element to find, which returns its coordinates without a screenshot",
+                                        },
+                                        "actions": {
+                                            "type": "array",
+                                            "description": "Input actions to run in order for 'sequence', each with its own action, text and coordinate. Stops at the first one that fails",
+                                            "items": {
+                                                "type": "object",
+                                                "properties": {
+                                                    "action": {"type": "string"},
+                                                    "text": {"type": "string"},
+                                                    "coordinate": {
+                                                        "type": "array",
+                                                        "items": {"type": "integer"},
+                                                    },
+                                                    "label": {"type": "string"},
+                                                },
+                                                "required": ["action"],
+                                            },
+                                        },
                                     },
                                     "required": ["action"],
                                 },
@@ -812,16 +991,7 @@ Notes for using the `str_replace` command:
                     stream = False
 
                 if provider == "anthropic" and self.tool_calling:
-                    # Re-import tools here as well for this specific provider logic
-                    from .tools import ToolCollection
-                    # Create tool instances again to pass to ToolCollection
-                    anthropic_tools = []
-                    if "interpreter" in self.tools: anthropic_tools.append(BashTool(self))
-                    if "editor" in self.tools: anthropic_tools.append(EditTool(self))
-                    if "gui" in self.tools: anthropic_tools.append(ComputerTool(self))
-                    anthropic_tool_collection = ToolCollection(*anthropic_tools)
-
-                    params["tools"] = anthropic_tool_collection.to_params()
+                    params["tools"] = tool_collection.to_params()
                     # The below logic seems specific to older Anthropic format, might need review
                     # for t in params["tools"]:
                     #     t["function"] = {"name": t["name"]}
@@ -848,7 +1018,7 @@ Notes for using the `str_replace` command:
                             print(str(m))
                     print()
 
-                raw_response = litellm.completion(**params)
+                raw_response = await litellm.acompletion(**params)
 
                 if not stream:
                     raw_response.choices[0].delta = raw_response.choices[0].message
@@ -916,7 +1086,7 @@ Notes for using the `str_replace` command:
                 message = None
                 first_token = True
 
-                for chunk in raw_response:
+                async for chunk in _iter_chunks(raw_response):
                     yield chunk
 
                     if first_token:
@@ -928,7 +1098,6 @@ Notes for using the `str_replace` command:
 
                     if chunk.choices[0].delta.content:
                         md.feed(chunk.choices[0].delta.content)
-                        await asyncio.sleep(0)
 
                         if message.content == None:
                             message.content = chunk.choices[0].delta.content
@@ -981,6 +1150,7 @@ Notes for using the `str_replace` command:
                     if message:
                         self.messages.append(message) # This might be incorrect, should append dict?
 
+                output.flush()
                 print()
 
                 if not message or not message.tool_calls:
@@ -993,36 +1163,35 @@ Notes for using the `str_replace` command:
 
                 user_content_to_add = []
 
-                # Re-import ToolCollection here as well
-                from .tools import ToolCollection
-                # Create tool instances again to pass to ToolCollection
-                run_tools = []
-                if "interpreter" in self.tools: run_tools.append(BashTool(self))
-                if "editor" in self.tools: run_tools.append(EditTool(self))
-                if "gui" in self.tools: run_tools.append(ComputerTool(self))
-                run_tool_collection = ToolCollection(*run_tools)
-
-                for tool_call in message.tool_calls:
-                    function_arguments = json.loads(tool_call.function.arguments)
-
-                    if user_approval == "y":
-                        result = await run_tool_collection.run( # Use the collection created here
-                            name=tool_call.function.name,
-                            tool_input=cast(dict[str, Any], function_arguments),
-                        )
-                    else:
-                        result = ToolResult(output="Tool execution cancelled by user")
+                if user_approval == "y":
+                    results = await tool_collection.run_many(
+                        [
+                            (
+                                tool_call.function.name,
+                                cast(dict[str, Any], json.loads(tool_call.function.arguments)),
+                            )
+                            for tool_call in message.tool_calls
+                        ]
+                    )
+                else:
+                    results = [
+                        ToolResult(output="Tool execution cancelled by user")
+                        for _ in message.tool_calls
+                    ]
 
+                for tool_call, result in zip(message.tool_calls, results):
                     if self.tool_calling:
+                        # Not `output`, that would hide the terminal writer
+                        # for the whole of the turn loop
                         if result.error:
-                            output = result.error
+                            tool_text = result.error
                         else:
-                            output = result.output
+                            tool_text = result.output
 
                         tool_output = ""
 
-                        if output:
-                            tool_output += output
+                        if tool_text:
+                            tool_output += tool_text
 
                         if result.base64_image:
                             tool_output += (
@@ -1032,7 +1201,7 @@ Notes for using the `str_replace` command:
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:image/png;base64,{result.base64_image}",
+                                        "url": f"data:{result.media_type or 'image/png'};base64,{result.base64_image}",
                                     },
                                 }
                             )
@@ -1058,7 +1227,7 @@ Notes for using the `str_replace` command:
                                 {
                                     "type": "image",
                                     "image_url": {
-                                        "url": "data:image/png;base64,"
+                                        "url": f"data:{result.media_type or 'image/png'};base64,"
                                         + result.base64_image
                                     },
                                 },
@@ -1073,6 +1242,24 @@ Notes for using the `str_replace` command:
                         {"role": "user", "content": user_content_to_add}
                     )
 
+    def _report_usage(self, usage: dict) -> None:
+        """Record the token usage of one turn, and show it in debug mode"""
+        turn_usage = {
+            "input_tokens": usage.get("input_tokens") or 0,
+            "output_tokens": usage.get("output_tokens") or 0,
+            "cache_read_input_tokens": usage.get("cache_read_input_tokens") or 0,
+            "cache_creation_input_tokens": usage.get("cache_creation_input_tokens")
+            or 0,
+        }
+        self.token_usage.append(turn_usage)
+        if self.debug:
+            print(
+                f"\n\033[38;5;240mTokens: {turn_usage['input_tokens']} in, "
+                f"{turn_usage['output_tokens']} out, "
+                f"{turn_usage['cache_read_input_tokens']} cache read, "
+                f"{turn_usage['cache_creation_input_tokens']} cache write\033[0m"
+            )
+
     def _ask_user_approval(self) -> str:
         """Ask user for approval to run a tool"""
         # print("\n\033[38;5;240m(\033[0my\033[38;5;240m)es (\033[0mn\033[38;5;240m)o (\033[0ma\033[38;5;240m)lways approve this command: \033[0m", end="", flush=True)
@@ -1139,9 +1326,11 @@ Notes for using the `str_replace` command:
                 except asyncio.CancelledError:
                     self._spinner.stop()
 
+                output.flush()
                 print()
         except:
             self._spinner.stop()
+            output.flush()
             print(traceback.format_exc())
             print("\n\n\033[91mAn error has occurred.\033[0m")
             if self.interactive:
@@ -1172,11 +1361,14 @@ Notes for using the `str_replace` command:
 
     def _sync_respond_stream(self):
         """Synchronous generator that yields responses. Only use in synchronous contexts."""
-        loop = asyncio.new_event_loop()
+        # Reuse one loop across calls, the async API client is bound to the loop it first ran on
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        loop = self._loop
         asyncio.set_event_loop(loop)
+        # Convert async generator to sync generator
+        async_gen = self.async_respond()
         try:
-            # Convert async generator to sync generator
-            async_gen = self.async_respond()
             while True:
                 try:
                     chunk = loop.run_until_complete(async_gen.__anext__())
@@ -1184,7 +1376,7 @@ Notes for using the `str_replace` command:
                 except StopAsyncIteration:
                     break
         finally:
-            loop.close()
+            loop.run_until_complete(async_gen.aclose())
 
     def server(self):
         """
@@ -1,6 +1,7 @@
 import requests
 
 from ..ui.markdown import MarkdownRenderer
+from ..ui.output import output
 from .stream_text import stream_text
 
 
@@ -10,6 +11,7 @@ def desktop_prompt():
         "To get early access to the **Tia Interpreter Desktop App**, please provide the following information:\n\n"
     ):
         renderer.feed(chunk)
+    output.flush()
     first_name = input("What's your first name? ").strip()
     email = input("What's your email? ").strip()
 
@@ -0,0 +1,214 @@
+import json
+import re
+
+# A run of string content made of whole characters and whole escape sequences
+_STRING_RUN = re.compile(r'(?:[^"\\]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+_HIGH_SURROGATE = re.compile(r"\\u[dD][89abAB][0-9a-fA-F]{2}$")
+_PARTIAL_ESCAPE = re.compile(r"\\(u[0-9a-fA-F]{0,3})?")
+_WHITESPACE = " \t\r\n"
+_LITERAL_END = ",}] \t\r\n"
+
+
+class JSONStreamParser:
+    """
+    Incremental parser for a JSON object that arrives in fragments, like the
+    arguments of a streamed tool call.
+
+    Parser state is kept between chunks, so every character is scanned once no
+    matter how the input is split. feed() returns the changes to the top-level
+    keys as (key, delta) events: string values are reported as the text that
+    was added to them (starting with an empty delta when the string opens),
+    other values once, when they are complete.
+
+    >>> parser = JSONStreamParser()
+    >>> parser.feed('{"command": "ls -')
+    [('command', ''), ('command', 'ls -')]
+    >>> parser.feed('la", "restart": false}')
+    [('command', 'la'), ('restart', False)]
+    >>> parser.value
+    {'command': 'ls -la', 'restart': False}
+    """
+
+    def __init__(self):
+        self.value = None  # The root container, filled in as values complete
+        self.done = False
+        self._pending = ""  # Unconsumed tail, e.g. half of an escape sequence
+        self._stack = []  # Open containers, innermost last
+        self._keys = []  # Current key of each open container (None for arrays)
+        self._state = "value"
+        self._string_parts = []
+        self._string_is_key = False
+        self._literal = ""
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        """Consume the next fragment and return the top-level (key, delta) events."""
+        events = []
+        text = self._pending + chunk if self._pending else chunk
+        self._pending = ""
+        i, n = 0, len(text)
+
+        while i < n:
+            state = self._state
+
+            if state == "string":
+                match = _STRING_RUN.match(text, i)
+                run = match.group()
+                end = match.end()
+                if end == n or _PARTIAL_ESCAPE.fullmatch(text, end):
+                    # The chunk ended inside the string, hold back an incomplete escape
+                    # sequence and a high surrogate whose other half may follow
+                    tail = _HIGH_SURROGATE.search(run)
+                    if tail:
+                        self._pending = run[tail.start() :] + text[end:]
+                        run = run[: tail.start()]
+                    else:
+                        self._pending = text[end:]
+                    self._add_string_text(run, events)
+                    return events
+                self._add_string_text(run, events)
+                if text[end] == '"':
+                    i = end + 1
+                    self._end_string(events)
+                else:
+                    # Invalid escape, keep the character as-is rather than failing
+                    self._add_string_text(text[end + 1 : end + 2], events, raw=True)
+                    i = end + 2
+                continue
+
+            char = text[i]
+
+            if state == "literal":
+                if char in _LITERAL_END:
+                    self._end_literal(events)
+                    continue  # Re-handle the delimiter in the new state
+                self._literal += char
+                i += 1
+                continue
+
+            i += 1
+            if char in _WHITESPACE:
+                continue
+
+            if state == "value":
+                if char == '"':
+                    self._start_string(is_key=False, events=events)
+                elif char == "{":
+                    self._open({})
+                    self._state = "key"
+                elif char == "[":
+                    self._open([])
+                    self._state = "value"
+                elif char == "]" and self._stack and isinstance(self._stack[-1], list):
+                    self._close(events)  # Empty array
+                else:
+                    self._literal = char
+                    self._state = "literal"
+            elif state == "key":
+                if char == '"':
+                    self._start_string(is_key=True, events=events)
+                elif char == "}":
+                    self._close(events)  # Empty object
+                else:
+                    raise ValueError(f"Expected an object key, got {char!r}")
+            elif state == "colon":
+                if char != ":":
+                    raise ValueError(f"Expected ':', got {char!r}")
+                self._state = "value"
+            elif state == "comma":
+                if char == ",":
+                    self._state = "key" if isinstance(self._stack[-1], dict) else "value"
+                elif char in "}]":
+                    self._close(events)
+                else:
+                    raise ValueError(f"Expected ',' or a closing bracket, got {char!r}")
+            elif state == "done":
+                raise ValueError(f"Unexpected data after the JSON value: {char!r}")
+
+        return events
+
+    def _top_level_key(self):
+        """The top-level key the value being parsed belongs to, if it is a direct child."""
+        if len(self._stack) == 1 and isinstance(self._stack[0], dict):
+            return self._keys[0]
+        return None
+
+    def _open(self, container):
+        if self._stack:
+            self._attach(container)
+        else:
+            self.value = container
+        self._stack.append(container)
+        self._keys.append(None)
+
+    def _close(self, events):
+        container = self._stack.pop()
+        self._keys.pop()
+        if not self._stack:
+            self._state = "done"
+            self.done = True
+            return
+        self._state = "comma"
+        key = self._top_level_key()
+        if key is not None:
+            events.append((key, container))
+
+    def _attach(self, value):
+        parent = self._stack[-1]
+        if isinstance(parent, dict):
+            parent[self._keys[-1]] = value
+        else:
+            parent.append(value)
+
+    def _start_string(self, is_key, events):
+        self._state = "string"
+        self._string_is_key = is_key
+        self._string_parts = []
+        if not is_key:
+            key = self._top_level_key()
+            if key is not None:
+                events.append((key, ""))
+
+    def _add_string_text(self, run, events, raw=False):
+        if not run:
+            return
+        if not raw and "\\" in run:
+            run = json.loads('"' + run + '"', strict=False)
+        self._string_parts.append(run)
+        if not self._string_is_key:
+            key = self._top_level_key()
+            if key is not None:
+                events.append((key, run))
+
+    def _end_string(self, events):
+        string = "".join(self._string_parts)
+        self._string_parts = []
+        if self._string_is_key:
+            self._keys[-1] = string
+            self._state = "colon"
+        elif self._stack:
+            self._attach(string)
+            self._state = "comma"
+        else:
+            self.value = string
+            self._state = "done"
+            self.done = True
+
+    def _end_literal(self, events):
+        literal, self._literal = self._literal, ""
+        value = json.loads(literal)
+        if not self._stack:
+            self.value = value
+            self._state = "done"
+            self.done = True
+            return
+        self._attach(value)
+        self._state = "comma"
+        key = self._top_level_key()
+        if key is not None:
+            events.append((key, value))
+
+    def close(self):
+        """Finish parsing, a trailing top-level literal has no delimiter after it."""
+        if self._state == "literal" and not self._stack:
+            self._end_literal([])
+        return self.value
@@ -0,0 +1,155 @@
+from PIL import Image
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None  # Callers check TEMPLATE_MATCHING before using anything here
+
+TEMPLATE_MATCHING = np is not None
+DEFAULT_SCALES = (1.0, 0.9, 1.1, 0.8, 1.25)
+COARSE_FACTOR = 2  # The search over scales runs at 1/2 size, then the best hit is refined
+
+
+def _window_sums(integral, h, w):
+    """Sums of every h x w window, from an integral image with a zero row and column in front."""
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+
+class FrameMatcher:
+    """
+    Finds templates in one grayscale frame with normalized cross-correlation.
+
+    The frame's FFT and its integral images are computed once, then each
+    template (at each scale) costs one FFT product and a few array
+    operations, with no Python loop over positions.
+
+    >>> frame = np.random.default_rng(0).random((120, 160))
+    >>> FrameMatcher(frame).match(frame[40:60, 70:100])[:3]
+    (1.0, 70, 40)
+    >>> frame[90:110, 10:40] = frame[40:60, 70:100]  # The same patch twice
+    >>> FrameMatcher(frame).match(frame[40:60, 70:100])[3]
+    (1.0, 10, 90)
+    """
+
+    def __init__(self, frame):
+        self.frame = np.asarray(frame, dtype=np.float32)
+        self.shape = self.frame.shape
+        self._spectrum = np.fft.rfft2(self.frame)
+        # The integral images need float64, window sums are differences of big numbers
+        frame64 = self.frame.astype(np.float64)
+        pad = ((1, 0), (1, 0))
+        self._integral = np.pad(frame64.cumsum(0).cumsum(1), pad)
+        self._integral_sq = np.pad((frame64**2).cumsum(0).cumsum(1), pad)
+
+    def match(self, template):
+        """
+        The best match of template as (score, x, y, runner_up), with (x, y) its
+        top-left corner and score from -1 to 1. runner_up is the best (score, x,
+        y) that doesn't overlap it, to tell a unique match from one of several
+        (None if there's no room for one). None if the template is flat or
+        doesn't fit.
+        """
+        template = np.asarray(template, dtype=np.float32)
+        h, w = template.shape
+        H, W = self.shape
+        if h > H or w > W:
+            return None
+        centered = template - template.mean()
+        template_norm = np.sqrt((centered**2).sum())
+        if template_norm < 1e-6:
+            return None  # A flat patch matches everything equally well
+
+        # Cross-correlation of the frame with the zero-mean template at every
+        # offset, via the FFT. Only offsets where it fits entirely are used,
+        # so the wrap-around of the circular correlation never shows up
+        correlation = np.fft.irfft2(
+            self._spectrum * np.conj(np.fft.rfft2(centered, s=self.shape)), s=self.shape
+        )[: H - h + 1, : W - w + 1]
+
+        n = h * w
+        sums = _window_sums(self._integral, h, w)
+        energy = _window_sums(self._integral_sq, h, w) - sums**2 / n
+        denominator = template_norm * np.sqrt(np.maximum(energy, 0))
+        scores = np.divide(
+            correlation,
+            denominator,
+            out=np.zeros_like(correlation),
+            where=denominator > 1e-6 * template_norm,
+        )
+        y, x = np.unravel_index(np.argmax(scores), scores.shape)
+        best = round(float(scores[y, x]), 4)
+
+        # Blank out every position that overlaps the best match, what's left
+        # is somewhere else on the screen
+        scores[max(y - h + 1, 0) : y + h, max(x - w + 1, 0) : x + w] = -np.inf
+        runner_up = None
+        if np.isfinite(scores).any():
+            y2, x2 = np.unravel_index(np.argmax(scores), scores.shape)
+            runner_up = (round(float(scores[y2, x2]), 4), int(x2), int(y2))
+        return best, int(x), int(y), runner_up
+
+
+def _refine(frame, template, x, y, radius):
+    """The best (score, x, y) for template within radius pixels of (x, y), computed directly."""
+    h, w = template.shape
+    H, W = frame.shape
+    x0, y0 = max(x - radius, 0), max(y - radius, 0)
+    x1, y1 = min(x + radius, W - w), min(y + radius, H - h)
+    if x1 < x0 or y1 < y0:
+        return None
+    windows = sliding_window_view(frame[y0 : y1 + h, x0 : x1 + w], (h, w))
+    windows = windows - windows.mean(axis=(2, 3), keepdims=True)
+    centered = template - template.mean()
+    denominator = np.sqrt((windows**2).sum(axis=(2, 3))) * np.sqrt((centered**2).sum())
+    scores = np.divide(
+        (windows * centered).sum(axis=(2, 3)),
+        denominator,
+        out=np.zeros(denominator.shape),
+        where=denominator > 1e-6,
+    )
+    dy, dx = np.unravel_index(np.argmax(scores), scores.shape)
+    return round(float(scores[dy, dx]), 4), int(x0 + dx), int(y0 + dy)
+
+
+def locate(frame: Image.Image, template: Image.Image, scales=DEFAULT_SCALES):
+    """
+    Find template in frame, trying it at each of the scales, e.g. for a page
+    that was zoomed since the template was saved. Returns (score, x, y, width,
+    height, runner_up) of the best match in frame pixels, where runner_up is
+    the (score, x, y) of the best match elsewhere (None if there's no room for
+    one), or None if nothing could be compared.
+    """
+    frame = frame.convert("L")
+    template = template.convert("L")
+    matcher = FrameMatcher(np.asarray(frame.reduce(COARSE_FACTOR)))
+
+    best = None
+    for scale in scales:
+        size = (round(template.width * scale), round(template.height * scale))
+        if min(size) < 2 * COARSE_FACTOR:
+            continue
+        scaled = template.resize(size, Image.Resampling.BILINEAR) if scale != 1 else template
+        match = matcher.match(np.asarray(scaled.reduce(COARSE_FACTOR)))
+        if match is not None and (best is None or match[0] > best[0]):
+            best = (*match, scaled)
+    if best is None:
+        return None
+
+    _, x, y, runner_up, scaled = best
+    frame_pixels = np.asarray(frame, dtype=np.float64)
+    template_pixels = np.asarray(scaled, dtype=np.float64)
+    refined = _refine(
+        frame_pixels, template_pixels, x * COARSE_FACTOR, y * COARSE_FACTOR, COARSE_FACTOR
+    )
+    if refined is None:
+        return None
+    if runner_up is not None:
+        score, x2, y2 = runner_up
+        x2, y2 = x2 * COARSE_FACTOR, y2 * COARSE_FACTOR
+        runner_up = _refine(frame_pixels, template_pixels, x2, y2, COARSE_FACTOR) or (
+            score,
+            x2,
+            y2,
+        )
+    return (*refined, scaled.width, scaled.height, runner_up)
@@ -2,7 +2,7 @@ import os
 
 from .base import CLIResult, ToolResult
 from .collection import ToolCollection
-from .computer import ComputerTool
+from .computer import ComputerExtrasTool, ComputerTool
 from .edit import EditTool
 
 # Use environment variable to choose bash tool, default to the more featured one
@@ -14,6 +14,7 @@ else:
 __ALL__ = [
     BashTool,
     CLIResult,
+    ComputerExtrasTool,
     ComputerTool,
     EditTool,
     ToolCollection,
@@ -1,6 +1,6 @@
 from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass, fields, replace
-from typing import Any
+from typing import Any, ClassVar
 
 from anthropic.types.beta import BetaToolUnionParam
 
@@ -8,11 +8,21 @@ from anthropic.types.beta import BetaToolUnionParam
 class BaseAnthropicTool(metaclass=ABCMeta):
     """Abstract base class for Anthropic-defined tools."""
 
+    # How many calls to this tool may run at once (None for no limit)
+    max_concurrency: ClassVar[int | None] = None
+
     @abstractmethod
     def __call__(self, **kwargs) -> Any:
         """Executes the tool with the given arguments."""
         ...
 
+    def is_exclusive(self, tool_input: dict[str, Any]) -> bool:
+        """
+        Whether a call must not overlap with the other calls of the same turn,
+        e.g. because it changes state that they may read.
+        """
+        return False
+
     @abstractmethod
     def to_params(
         self,
@@ -27,6 +37,7 @@ class ToolResult:
     output: str | None = None
     error: str | None = None
     base64_image: str | None = None
+    media_type: str | None = None  # Of base64_image, image/png if not set
     system: str | None = None
 
     def __bool__(self):
@@ -46,6 +57,7 @@ class ToolResult:
             output=combine_fields(self.output, other.output),
             error=combine_fields(self.error, other.error),
             base64_image=combine_fields(self.base64_image, other.base64_image, False),
+            media_type=self.media_type if self.base64_image else other.media_type,
             system=combine_fields(self.system, other.system),
         )
 
@@ -1,97 +1,505 @@
 import asyncio
+import codecs
+import itertools
 import os
+import re
+import shlex
 import shutil
+import signal
+import subprocess
 import traceback
+import uuid
+from collections import deque
 from typing import ClassVar, Literal, Any
 
 import pyte
 from anthropic.types.beta import BetaToolBash20241022Param
 
 from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
+from .run import MAX_RESPONSE_LEN, SPILLED_MESSAGE, spool_dir, spool_path
+
+READ_SIZE = 64 * 1024
+DEFAULT_TIMEOUT = 300.0  # seconds
+DEFAULT_OUTPUT_LIMIT = MAX_RESPONSE_LEN  # bytes shown per command, half from the start, half from the end
+INTERRUPT_GRACE = 2.0  # seconds between escalating from SIGTERM to SIGKILL to a new shell
+DEFAULT_SCROLLBACK = 2000  # lines a PTY session's terminal remembers above the screen
+
+# Color/style escapes can just be stripped, anything that moves the cursor
+# (carriage returns, backspaces, other escape sequences) needs a terminal emulator
+_SGR = re.compile(r"\x1b\[[0-9;]*m")
+_CURSOR_CONTROL = re.compile(r"\r(?!\n)|\x08|\x1b(?!\[[0-9;]*m)")
+# A command ending in a lone & (not &&) is meant to keep running in the background
+_BACKGROUND = re.compile(r"(?<![&|>])&\s*$")
+
+
+class _OutputBuffer:
+    """
+    Keeps the first `head` and last `tail` bytes of a command's output in memory.
+    Once the output outgrows them, all of it is also streamed to a spool file.
+    """
+
+    def __init__(self, head: int, tail: int):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.spool = None
+        self.spool_file = None
+
+    def add(self, data: bytes):
+        self.total += len(data)
+        if self.spool_file is not None:
+            self.spool_file.write(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit and self.spool_file is None:
+                # Too big to keep, everything from here on also goes to disk
+                self.spool = spool_path("bash")
+                self.spool_file = open(self.spool, "wb")
+                self.spool_file.write(self.head + self.tail)
+            # Trim in batches so a flood of small chunks stays O(n)
+            if len(self.tail) > 2 * self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    def close(self):
+        if self.spool_file is not None:
+            self.spool_file.close()
+
+    def parts(self) -> tuple[bytes, bytes, int]:
+        """The head, the tail and how many bytes were dropped between them."""
+        tail = bytes(self.tail[max(len(self.tail) - self.tail_limit, 0) :])
+        return bytes(self.head), tail, self.total - len(self.head) - len(tail)
+
+
+class _ScrollbackScreen(pyte.Screen):
+    """
+    A terminal screen with a history of at most `scrollback` lines above it,
+    like pyte.HistoryScreen but with the history kept as plain strings.
+
+    Playing every byte through pyte is slow (a few thousand lines a second), so
+    feed() only keeps the last scrollback + screen lines of raw output, and
+    they are played when the text is asked for. Cursor movement is limited to
+    the screen, so only lines that were going to be forgotten anyway are lost.
+    """
+
+    def __init__(self, columns: int, lines: int, scrollback: int):
+        super().__init__(columns, lines)
+        self.history = deque(maxlen=scrollback)
+        self.forgotten = 0  # Lines dropped from the top of the history
+        self._raw = deque([""], maxlen=scrollback + lines)
+        self._raw_line_limit = 4 * columns * lines  # e.g. a progress bar redrawn with \r
+        self._stream = pyte.Stream(self)
+        self.set_mode(pyte.modes.LNM)  # The raw lines are joined back with bare \n
+
+    def feed(self, text: str):
+        first, *rest = text.split("\n")
+        self._raw[-1] += first
+        for line in rest:
+            if len(self._raw) == self._raw.maxlen:
+                self.forgotten += 1
+            self._raw.append(line)
+        if len(self._raw[-1]) > self._raw_line_limit:
+            self._raw[-1] = self._raw[-1][-self._raw_line_limit :]
+
+    def _play(self):
+        if len(self._raw) > 1 or self._raw[0]:
+            raw = "\n".join(self._raw)
+            self._raw.clear()
+            self._raw.append("")
+            self._stream.feed(raw)
+
+    def index(self):
+        top, bottom = self.margins or pyte.screens.Margins(0, self.lines - 1)
+        if self.cursor.y == bottom:
+            if len(self.history) == self.history.maxlen:
+                self.forgotten += 1
+            line = self.buffer[top]
+            self.history.append("".join(line[x].data for x in range(self.columns)).rstrip())
+        super().index()
+
+    def last_lines(self, n: int | None = None) -> list[str]:
+        """The last n lines of output (all of them if n is None), history first."""
+        self._play()
+        lines = [line.rstrip() for line in self.display]
+        while lines and not lines[-1]:
+            lines.pop()
+        need = len(self.history) if n is None else max(n - len(lines), 0)
+        if need:
+            earlier = list(itertools.islice(reversed(self.history), need))
+            lines = earlier[::-1] + lines
+        return lines if n is None else lines[-n:]
+
+
+class _BackgroundJob:
+    """A command running detached from the shell sessions, with its output going to a log file."""
+
+    def __init__(self, job_id: int, command: str, process: subprocess.Popen, log_path, exit_path):
+        self.id = job_id
+        self.command = command
+        self.process = process
+        self.log_path = log_path
+        self.exit_path = exit_path  # Written with the command's exit code once it's done
 
 
 class _BashSession:
-    """A session of a bash shell."""
+    """
+    A session of a bash shell.
+
+    By default the shell talks to us over pipes. With `pty=True` it gets a
+    pseudo-terminal instead, so programs that check isatty behave like they
+    would for a person, and their output is played on a terminal screen that
+    keeps `scrollback` lines of history.
+    """
 
-    def __init__(self):
+    def __init__(self, state_path=None, pty=False, scrollback=DEFAULT_SCROLLBACK):
         self._started = False
+        self._stopped = False
+        self.pty = pty and os.name != "nt"
+        self.scrollback = scrollback
+        self._master = None  # Our end of the PTY
+        self._reader = None
+        self._transport = None
+        # Where the shell saves its cwd and exported env after each command, so
+        # other sessions and background jobs can start from the same place
+        self.state_path = state_path
+        self.busy = False
+        self._start_lock = None  # Made on the loop that starts us, see start()
+        self._start_lock_loop = None
         self._process = None
-        self._sentinel = "<<exit>>"
         # Get terminal size, fallback to 80x24 if we can't
-        terminal_size = shutil.get_terminal_size((80, 24))
-        self._screen = pyte.Screen(terminal_size.columns, terminal_size.lines)
-        self._stream = pyte.Stream(self._screen)
+        self._columns, self._rows = shutil.get_terminal_size((80, 24))
 
     async def start(self):
-        if self._started:
-            return
+        # The lock makes a background warm-up and the first command share one
+        # spawn. It belongs to the running loop, a lock held by a task on a
+        # loop that's gone would never be released
+        loop = asyncio.get_running_loop()
+        if self._start_lock is None or self._start_lock_loop is not loop:
+            self._start_lock, self._start_lock_loop = asyncio.Lock(), loop
+        async with self._start_lock:
+            if self._started:
+                return
+            if self.pty:
+                await self._start_pty()
+                self._started = True
+                return
+
+            # Explicitly use PowerShell on Windows
+            shell = (
+                ["powershell.exe", "-NoProfile", "-Command", "-"]
+                if os.name == "nt"
+                else ["/bin/bash"]
+            )
+            # Exec'd directly, so the shell is our child and its jobs are its children.
+            # stderr shares the stdout pipe, so it's drained as it's written and
+            # interleaves with stdout in the order the command produced it
+            self._process = await asyncio.create_subprocess_exec(
+                *shell,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            if os.name != "nt":
+                # Job control puts every command in its own process group, so a
+                # hung one can be interrupted without taking the shell with it
+                self._process.stdin.write(b"set -m\n")
+            self._reader = self._process.stdout
+            self._started = True
+
+    async def _start_pty(self):
+        import fcntl
+        import pty
+        import struct
+        import termios
+
+        master, slave = pty.openpty()
+        fcntl.ioctl(
+            slave, termios.TIOCSWINSZ, struct.pack("HHHH", self._rows, self._columns, 0, 0)
+        )
+        # No echo, so our commands don't show up in their own output, and no
+        # canonical mode, which would cut command lines off at 4096 bytes
+        attrs = termios.tcgetattr(slave)
+        attrs[3] &= ~(termios.ECHO | termios.ICANON)
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+        def make_controlling_terminal():
+            os.setsid()
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+        # On a terminal bash is interactive, which also gives us job control.
+        # No prompts, no readline, and no pagers waiting for a keypress
+        env = {
+            **os.environ,
+            "PS1": "",
+            "PS2": "",
+            "TERM": "xterm",
+            "PAGER": "cat",
+            "GIT_PAGER": "cat",
+        }
+        self._process = await asyncio.create_subprocess_exec(
+            "/bin/bash",
+            "--norc",
+            "--noprofile",
+            "--noediting",
+            stdin=slave,
+            stdout=slave,
+            stderr=slave,
+            env=env,
+            preexec_fn=make_controlling_terminal,
+        )
+        os.close(slave)
 
-        # Explicitly use PowerShell on Windows
-        shell = "powershell.exe -NoProfile -Command -" if os.name == "nt" else "/bin/bash"
-        self._process = await asyncio.create_subprocess_shell(
-            shell,
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+        self._master = master
+        self._reader = asyncio.StreamReader()
+        self._transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(self._reader),
+            os.fdopen(master, "rb", 0),
         )
-        self._started = True
+        await self._write(b"set +o history\n")
+
+    async def _write(self, data: bytes):
+        if not self.pty:
+            self._process.stdin.write(data)
+            await self._process.stdin.drain()
+            return
+        # The PTY is non-blocking, wait for the shell to catch up if it fills
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self._master, view) :]
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+
+    async def _read(self) -> bytes:
+        try:
+            return await self._reader.read(READ_SIZE)
+        except OSError:
+            return b""  # A PTY reports EIO once the shell is gone
 
     def stop(self):
         if not self._started:
             return
+        self._stopped = True
         if self._process and self._process.returncode is None:
-            self._process.terminate()
+            self._interrupt(signal.SIGKILL if os.name != "nt" else None)
+            if self.pty:
+                self._process.kill()  # An interactive shell ignores SIGTERM
+            else:
+                self._process.terminate()
+        if self._transport is not None:
+            self._transport.close()
+
+    def _interrupt(self, sig) -> bool:
+        """Signal the process groups of the running command, but not the shell's own."""
+        if os.name == "nt" or not self._process or self._process.returncode is not None:
+            return False
+        try:
+            children = subprocess.run(
+                ["pgrep", "-P", str(self._process.pid)],
+                capture_output=True,
+                text=True,
+                timeout=5,
+            ).stdout.split()
+            shell_group = os.getpgid(self._process.pid)
+        except (OSError, subprocess.SubprocessError):
+            return False
+
+        groups = set()
+        for child in children:
+            try:
+                groups.add(os.getpgid(int(child)))
+            except (ProcessLookupError, ValueError):
+                pass
+        groups.discard(shell_group)
+        for group in groups:
+            try:
+                os.killpg(group, sig)
+            except ProcessLookupError:
+                pass
+        return bool(groups)
 
-    def _get_screen_text(self) -> str:
-        """Get the current screen content as a string."""
-        return "\n".join(line.rstrip() for line in self._screen.display).rstrip()
+    def has_exited(self) -> bool:
+        return self._started and (self._stopped or self._process.returncode is not None)
 
-    async def run(self, command: str):
-        """Execute a command in the shell."""
+    def _render(self, data: bytes) -> str:
+        """Turn the raw output of a command into the text it would show on screen."""
+        text = data.decode(errors="replace")
+        if _CURSOR_CONTROL.search(text):
+            # Progress bars and the like, replay it once on a screen tall enough for all of it
+            screen = pyte.Screen(self._columns, text.count("\n") + 1)
+            screen.set_mode(pyte.modes.LNM)  # Pipes don't turn \n into \r\n for us
+            pyte.Stream(screen).feed(text)
+            lines = screen.display
+        else:
+            lines = _SGR.sub("", text).split("\n")
+        return "\n".join(line.rstrip() for line in lines).rstrip()
+
+    def _screen_output(self, screen, output_limit, spool) -> str:
+        """The end of what's on the terminal, at most output_limit characters of it."""
+        lines = screen.last_lines()
+        kept = deque()
+        size = 0
+        for line in reversed(lines):
+            size += len(line) + 1
+            if size > output_limit and kept:
+                break
+            kept.appendleft(line)
+        left_out = screen.forgotten + len(lines) - len(kept)
+        final_output = "\n".join(kept).strip("\n")
+        if not left_out:
+            return final_output or "<No output>"
+        if spool:
+            message = SPILLED_MESSAGE.format(elided=f"{left_out} lines", path=spool)
+        else:
+            message = f"<response clipped><NOTE>{left_out} earlier lines scrolled out of the terminal's history.</NOTE>"
+        return f"{message}\n{final_output}"
+
+    async def run(
+        self,
+        command: str,
+        timeout: float | None = DEFAULT_TIMEOUT,
+        output_limit: int = DEFAULT_OUTPUT_LIMIT,
+        prelude: str = "",
+        live: bool = True,
+    ):
+        """
+        Execute a command in the shell. After `timeout` seconds the command is
+        interrupted, and only the first and last output_limit / 2 bytes of its
+        output are kept. Output is shown as it arrives if `live`, else all at
+        once when the command is done, under the command, so it doesn't get
+        mixed up with another command's.
+        """
         if not self._started:
             raise ToolError("Session has not started.")
-        if self._process.returncode is not None:
+        if self.has_exited():
             return ToolResult(
                 system="tool must be restarted",
                 error=f"shell has exited with returncode {self._process.returncode}",
             )
 
         try:
-            self._screen.reset()
+            # A fresh sentinel per command, so output can't fake the end of the next one
+            sentinel = f"<<exit-{uuid.uuid4().hex}>>"
+            if os.name == "nt":
+                wrapped_command = f'{command}\n echo "{sentinel}$LASTEXITCODE"\n'
+            elif self.state_path:
+                state = shlex.quote(str(self.state_path))
+                wrapped_command = (
+                    f"{prelude}{command}\n __status=$?; "
+                    f"{{ builtin pwd; builtin export -p; }} > {state}.tmp 2>/dev/null "
+                    f"&& mv -f {state}.tmp {state}; "
+                    f'echo "{sentinel}$__status"\n'
+                )
+            else:
+                wrapped_command = f'{prelude}{command}\n echo "{sentinel}$?"\n'
+            await self._write(wrapped_command.encode())
 
-            wrapped_command = f'{command}\n echo "{self._sentinel}"\n'
-            self._process.stdin.write(wrapped_command.encode())
-            await self._process.stdin.drain()
+            marker = sentinel.encode()
+            buffer = _OutputBuffer(output_limit // 2, output_limit - output_limit // 2)
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            # Output that may still turn out to be (part of) the sentinel, never
+            # more than a sentinel's worth plus the latest read
+            pending = bytearray()
+            found = -1
+            exit_code = None
+            screen = None
+            if self.pty:
+                screen = _ScrollbackScreen(self._columns, self._rows, self.scrollback)
+
+            held = None if live else [f"$ {command}\n"]
+
+            def show(text):
+                if held is None:
+                    print(text, end="", flush=True)
+                else:
+                    held.append(text)
+
+            def emit(data):
+                buffer.add(data)
+                text = decoder.decode(bytes(data))
+                if screen is not None:
+                    screen.feed(text)
+                show(text)
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout if timeout else None
+            interrupts = [signal.SIGTERM, signal.SIGKILL] if os.name != "nt" else []
+            timed_out = False
+            shell_restarted = False
 
             while True:
-                chunk = await self._process.stdout.read(1024)
+                wait = None if deadline is None else max(deadline - loop.time(), 0)
+                try:
+                    chunk = await asyncio.wait_for(self._read(), wait)
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    if interrupts and self._interrupt(interrupts.pop(0)):
+                        # Give it a moment to die and the sentinel to come through
+                        deadline = loop.time() + INTERRUPT_GRACE
+                        continue
+                    # Nothing left to interrupt but the shell itself (e.g. a builtin loop)
+                    self.stop()
+                    shell_restarted = True
+                    break
                 if not chunk:
                     break
 
-                # Decode and handle sentinel
-                decoded = chunk.decode(errors="replace")
-                if self._sentinel in decoded:
-                    # Print everything before the sentinel
-                    print(decoded.split(self._sentinel)[0], end="", flush=True)
-                else:
-                    print(decoded, end="", flush=True)
+                pending += chunk
+                if found == -1:
+                    found = pending.find(marker)
 
-                # Feed to terminal emulator for final state
-                self._stream.feed(decoded)
+                if found != -1:
+                    newline = pending.find(b"\n", found)
+                    if newline != -1:
+                        code = pending[found + len(marker) : newline].strip()
+                        exit_code = int(code) if code.lstrip(b"-").isdigit() else None
+                        emit(pending[:found])
+                        pending.clear()
+                        break
+                else:
+                    # Everything but a possible start of the sentinel is real output
+                    cut = len(pending) - len(marker) + 1
+                    if cut > 0:
+                        emit(pending[:cut])
+                        del pending[:cut]
 
-                screen_text = self._get_screen_text()
-                if self._sentinel in screen_text:
-                    final_text = screen_text.split(self._sentinel)[0].rstrip()
-                    return CLIResult(output=final_text if final_text else "<No output>")
+            if exit_code is None:
+                # The shell went away before the sentinel, keep whatever was left
+                emit(pending[:found] if found != -1 else pending)
+            show(decoder.decode(b"", final=True))
+            if held is not None:
+                text = "".join(held)
+                print(text, end="" if text.endswith("\n") else "\n", flush=True)
 
-            error = await self._process.stderr.read()
-            if error:
-                error_text = error.decode(errors="replace")
-                print(error_text, end="", flush=True)
-                self._stream.feed(error_text)
+            buffer.close()
+            head, tail, elided = buffer.parts()
+            if screen is not None:
+                final_output = self._screen_output(screen, output_limit, buffer.spool)
+            elif elided:
+                message = SPILLED_MESSAGE.format(
+                    elided=f"{elided} bytes", path=buffer.spool
+                )
+                final_output = (
+                    f"{self._render(head)}\n{message}\n{self._render(tail)}"
+                )
+            else:
+                final_output = self._render(head + tail) or "<No output>"
 
-            final_output = self._get_screen_text()
-            return CLIResult(output=final_output if final_output else "<No output>")
+            if shell_restarted:
+                final_output += (
+                    f"\n\n(command timed out after {timeout:g}s and the shell had to be "
+                    "restarted, so the working directory and environment were reset)"
+                )
+            elif timed_out:
+                final_output += f"\n\n(command timed out after {timeout:g}s and was interrupted)"
+            elif exit_code:
+                final_output += f"\n\n(exit code {exit_code})"
+            return CLIResult(output=final_output)
 
         except KeyboardInterrupt as e:
             self.stop()
@@ -110,37 +518,158 @@ class BashTool(BaseAnthropicTool):
     """
     A tool that allows the agent to run bash commands.
     The tool parameters are defined by Anthropic and are not editable.
+
+    Commands run in a primary shell session. One that arrives while it's busy
+    (from an overlapping turn, a turn's own commands run one by one) runs in
+    another session from a small pool, which first picks up the primary's cwd
+    and exported environment. Commands ending in `&` become
+    background jobs that log to a file instead of tying up a session.
     """
 
     _session: _BashSession | None
     name: ClassVar[Literal["bash"]] = "bash"
     api_type: ClassVar[Literal["bash_20250124"]] = "bash_20250124" # Updated identifier
+    # A turn's commands often build on each other (cd, export, functions),
+    # so they run one at a time on the primary session, in order
+    max_concurrency: ClassVar[int | None] = 1
     interpreter: Any # Add interpreter reference
 
     def __init__(self, interpreter: Any): # Accept interpreter instance
         self.interpreter = interpreter
-        self._session = None
+        self._session = None  # The primary session
+        self._pool = []  # Extra sessions for commands that overlap with the primary's
+        self._job_ids = itertools.count(1)
+        self._jobs: dict[int, _BackgroundJob] = {}  # Background jobs not reaped yet
         super().__init__()
 
+    @property
+    def _state_path(self):
+        return None if os.name == "nt" else spool_dir() / "bash-state"
+
+    async def start(self):
+        """Start the shell session ahead of the first command (no-op if running)."""
+        if self._session is None or self._session.has_exited():
+            self._session = self._new_session(self._state_path)
+        await self._session.start()
+
+    def _new_session(self, state_path=None) -> _BashSession:
+        return _BashSession(
+            state_path,
+            pty=getattr(self.interpreter, "bash_pty", False),
+            scrollback=getattr(self.interpreter, "bash_scrollback", DEFAULT_SCROLLBACK),
+        )
+
+    def _inherit_prelude(self) -> str:
+        """Shell code that moves a session to the primary's last cwd and env."""
+        state = self._state_path
+        if state is None or not state.exists():
+            return ""
+        state = shlex.quote(str(state))
+        return (
+            f"cd -- \"$(head -n 1 {state})\" 2>/dev/null; "
+            f". <(tail -n +2 {state}) 2>/dev/null\n"
+        )
+
+    async def _acquire_session(self) -> tuple[_BashSession, str]:
+        """An idle session for the next command, plus the prelude it needs to run first."""
+        if not self._session.busy:
+            self._session.busy = True
+            return self._session, ""
+
+        self._pool = [session for session in self._pool if not session.has_exited()]
+        session = next((session for session in self._pool if not session.busy), None)
+        if session is None:
+            session = self._new_session()
+            self._pool.append(session)
+        session.busy = True
+        await session.start()
+        return session, self._inherit_prelude()
+
+    def start_job(self, command: str) -> _BackgroundJob:
+        """Start command detached, in its own process group, logging to a spool file."""
+        self._reap_jobs()
+        job_id = next(self._job_ids)
+        log_path = spool_path(f"job-{job_id}")
+        exit_path = log_path.with_suffix(".exit")
+        # The command gets a shell of its own so an `exit` in it can't skip
+        # writing its status, which is the only way the model gets to see it
+        wrapper = '/bin/bash -c "$1"; echo $? > "$2"'
+        with open(log_path, "wb") as log:
+            process = subprocess.Popen(
+                [
+                    "/bin/bash", "-c", wrapper, "job",
+                    self._inherit_prelude() + command, str(exit_path),
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        job = _BackgroundJob(job_id, command, process, log_path, exit_path)
+        self._jobs[job_id] = job
+        return job
+
+    def _reap_jobs(self):
+        """Collect jobs that have finished, so they don't linger as zombies."""
+        # A zombie still answers `kill -0`, so a finished job would look like
+        # it's running until it's waited on
+        for job_id, job in list(self._jobs.items()):
+            if job.process.poll() is not None:
+                del self._jobs[job_id]
+
     async def __call__(
-        self, command: str | None = None, restart: bool = False, **kwargs
+        self,
+        command: str | None = None,
+        restart: bool = False,
+        timeout: float | None = None,
+        **kwargs,
     ):
         if restart:
-            if self._session:
-                self._session.stop()
-            self._session = _BashSession()
+            for session in [self._session, *self._pool]:
+                if session:
+                    session.stop()
+            self._pool = []
+            self._session = self._new_session(self._state_path)
             await self._session.start()
             return ToolResult(system="tool has been restarted.")
 
-        if self._session is None:
-            self._session = _BashSession()
-            await self._session.start()
+        await self.start()
+        self._reap_jobs()
 
         if command is not None:
             # Check if command is allowed - REMOVED FOR UNRESTRICTED ACCESS
             # if command not in self.interpreter.allowed_commands:
             #     return ToolResult(error=f"Command '{command}' is not in allowed_commands.")
-            return await self._session.run(command)
+            if os.name != "nt" and _BACKGROUND.search(command):
+                job = self.start_job(_BACKGROUND.sub("", command))
+                return CLIResult(
+                    output=(
+                        f"Started background job {job.id} (pid {job.process.pid}). Its output "
+                        f"goes to {job.log_path}. Check on it with `tail -n 20 {job.log_path}`, "
+                        f"see if it's still running with `kill -0 {job.process.pid}`, "
+                        f"and stop it with `kill -- -{job.process.pid}`. Once it's done, "
+                        f"`cat {job.exit_path}` gives its exit code (a job that was "
+                        f"killed has none)."
+                    )
+                )
+
+            if timeout is None:
+                timeout = getattr(self.interpreter, "bash_timeout", DEFAULT_TIMEOUT)
+            session, prelude = await self._acquire_session()
+            try:
+                return await session.run(
+                    command,
+                    timeout=timeout,
+                    output_limit=getattr(
+                        self.interpreter, "bash_output_limit", DEFAULT_OUTPUT_LIMIT
+                    ),
+                    prelude=prelude,
+                    # Only the primary streams, commands from an overlapping turn
+                    # on the pool are shown whole when they finish
+                    live=session is self._session,
+                )
+            finally:
+                session.busy = False
 
         raise ToolError("no command provided.")
 
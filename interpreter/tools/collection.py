@@ -1,5 +1,6 @@
 """Collection classes for managing multiple tools."""
 
+import asyncio
 from typing import Any
 
 from anthropic.types.beta import BetaToolUnionParam
@@ -27,3 +28,38 @@ class ToolCollection:
             return await tool(**tool_input)
         except ToolError as e:
             return ToolFailure(error=e.message)
+
+    async def run_many(
+        self, calls: list[tuple[str, dict[str, Any]]]
+    ) -> list[ToolResult]:
+        """
+        Run the (name, tool_input) calls of one assistant turn, concurrently where
+        possible. An exclusive call waits for the calls before it, and the calls after
+        it wait for it. Each tool's max_concurrency is respected, and results are
+        returned in the order of the calls.
+        """
+        limits = {
+            name: asyncio.Semaphore(tool.max_concurrency)
+            for name, tool in self.tool_map.items()
+            if tool.max_concurrency
+        }
+
+        async def run_one(name: str, tool_input: dict[str, Any]) -> ToolResult:
+            limit = limits.get(name)
+            if limit is None:
+                return await self.run(name=name, tool_input=tool_input)
+            async with limit:
+                return await self.run(name=name, tool_input=tool_input)
+
+        results: list[ToolResult] = []
+        batch = []
+        for name, tool_input in calls:
+            tool = self.tool_map.get(name)
+            if tool is not None and tool.is_exclusive(tool_input):
+                results.extend(await asyncio.gather(*batch))
+                batch = []
+                results.append(await run_one(name, tool_input))
+            else:
+                batch.append(run_one(name, tool_input))
+        results.extend(await asyncio.gather(*batch))
+        return results
@@ -1,14 +1,15 @@
 import asyncio
 import base64
+import functools
+import io
 import math
 import os
 import platform
-import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum
-from pathlib import Path
 from typing import Literal, TypedDict
-from uuid import uuid4
 
 try:
     import pyautogui
@@ -18,15 +19,59 @@ except:
     traceback.print_exc()
     print("Failed to import pyautogui. Computer tool will not work.")
 
-from anthropic.types.beta import BetaToolComputerUse20241022Param
+try:
+    import pyperclip  # Comes with pyautogui (through mouseinfo)
+except ImportError:
+    pyperclip = None  # Long text is typed then
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Screenshots are always sent then
+
+from anthropic.types.beta import BetaToolComputerUse20241022Param, BetaToolParam
+from PIL import Image, features
 from typing import Literal, TypedDict, Any # Added Any
 from screeninfo import get_monitors
 
+from ..misc.template_match import TEMPLATE_MATCHING, locate
 from .base import BaseAnthropicTool, ToolError, ToolResult
 from .run import run
 
 TYPING_DELAY_MS = 12
 TYPING_GROUP_SIZE = 50
+DEFAULT_PASTE_MIN_LENGTH = 200  # Text at least this long is pasted instead of typed
+PASTE_SETTLE = 0.2  # Seconds for the app to read the clipboard before it's restored
+
+# Pillow format name and media type of each screenshot format
+SCREENSHOT_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+# Lossless by default, lossy formats blur small text and thin lines the model
+# has to read, so jpeg/webp are opt-in for when size matters more
+DEFAULT_SCREENSHOT_FORMAT = "png"
+DEFAULT_SCREENSHOT_QUALITY = 80
+
+# Screens are compared as the mean brightness of 8x8 pixel blocks, and count as
+# unchanged if no block moved by more than FRAME_TOLERANCE levels (of 255)
+FRAME_BLOCK_SIZE = 8
+FRAME_TOLERANCE = 2
+UNCHANGED_MESSAGE = "Screen unchanged since the last screenshot."
+
+MOVE_DURATION = 1.2  # Seconds the eased mouse movement takes
+FAST_DRAG_DURATION = 0.2  # Drags still need some in-between moves to register
+MOVE_STEP_INTERVAL = 1 / 60
+CLICK_PAUSE = 0.1
+SETTLE_INTERVAL = 0.1  # Seconds between frames when waiting for the screen to settle
+
+# Background capture: frames every CAPTURE_INTERVAL seconds, or every
+# SETTLE_INTERVAL for CAPTURE_ACTIVE_PERIOD seconds after input
+CAPTURE_INTERVAL = 0.5
+CAPTURE_ACTIVE_PERIOD = 2.0
+CAPTURE_WAIT = 1.0  # Longest wait for a fresh background frame before grabbing one directly
 
 Action = Literal[
     "key",
@@ -39,8 +84,35 @@ Action = Literal[
     "double_click",
     "screenshot",
     "cursor_position",
+    "zoom",
+    "sequence",
+    "save",
+    "locate",
 ]
 
+# Actions that drive the mouse and keyboard, the ones a sequence can contain
+INPUT_ACTIONS = (
+    "key",
+    "type",
+    "mouse_move",
+    "left_click",
+    "left_click_drag",
+    "right_click",
+    "middle_click",
+    "double_click",
+)
+MAX_SEQUENCE_LENGTH = 20
+
+# Clicks with a label save the TEMPLATE_SIZE patch (in screenshot pixels)
+# around the cursor, for "locate" to find again later without a screenshot
+TEMPLATE_SIZE = (96, 40)
+MIN_TEMPLATE_CONTRAST = 4.0  # Std dev of brightness, flatter patches can't be told apart
+LOCATE_THRESHOLD = 0.8  # Normalized cross-correlation that counts as found
+# A match only counts if the next best place on the screen scores at least
+# this much lower, otherwise it could be either of two identical buttons.
+# Buttons that only differ in their label typically score ~0.07 lower
+LOCATE_MARGIN = 0.05
+
 
 class Resolution(TypedDict):
     width: int
@@ -71,28 +143,115 @@ def chunks(s: str, chunk_size: int) -> list[str]:
     return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
 
 
-def smooth_move_to(x, y, duration=1.2):
-    start_x, start_y = pyautogui.position()
-    dx = x - start_x
-    dy = y - start_y
-    distance = math.hypot(dx, dy)  # Calculate the distance in pixels
+def encode_image(image: Image.Image, image_format: str, quality: int) -> tuple[str, str]:
+    """Encode an image in memory, returns (base64, media type)."""
+    image_format = (image_format or "png").lower()
+    if image_format not in SCREENSHOT_FORMATS:
+        raise ToolError(
+            f"Unknown screenshot format {image_format!r}, use one of png, jpeg or webp"
+        )
+    if image_format == "webp" and not features.check("webp"):
+        image_format = "png"  # Pillow was built without WebP support
+    pil_format, media_type = SCREENSHOT_FORMATS[image_format]
+
+    options = {}
+    if pil_format != "PNG":
+        options["quality"] = max(1, min(int(quality), 100))
+        if pil_format == "WEBP":
+            options["method"] = 2  # About twice as fast as the default 4, ~5% bigger
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")  # JPEG has no alpha
 
-    start_time = time.time()
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return base64.b64encode(buffer.getbuffer()).decode(), media_type
 
-    while True:
-        elapsed_time = time.time() - start_time
-        if elapsed_time > duration:
-            break
 
-        t = elapsed_time / duration
-        eased_t = (1 - math.cos(t * math.pi)) / 2  # easeInOutSine function
+def frame_fingerprint(image: Image.Image):
+    """A small grayscale summary of a frame to compare against the next one."""
+    if np is None:
+        return None
+    return np.asarray(image.convert("L").reduce(FRAME_BLOCK_SIZE), dtype=np.int16)
 
-        target_x = start_x + dx * eased_t
-        target_y = start_y + dy * eased_t
-        pyautogui.moveTo(target_x, target_y)
 
-    # Ensure the mouse ends up exactly at the target (x, y)
-    pyautogui.moveTo(x, y)
+def frames_match(a, b) -> bool:
+    """Whether two fingerprints are of effectively the same screen."""
+    if a is None or b is None or a.shape != b.shape:
+        return False
+    return int(np.abs(a - b).max()) <= FRAME_TOLERANCE
+
+
+class FrameGrabber:
+    """
+    Captures the screen on a background thread, so a recent frame, already
+    scaled, is ready whenever a screenshot is needed.
+
+    Each frame is grabbed and scaled off to the side, then swapped in as the
+    current one, so readers never wait on a capture in progress. Input
+    invalidates the current frame: only frames whose capture started after
+    the last invalidate() are handed out, and for a while after input the
+    thread captures more often, to follow the screen as it settles.
+    """
+
+    def __init__(self, grab, interval=CAPTURE_INTERVAL):
+        self._grab = grab
+        self.interval = interval
+        self._frame = None  # (image, capture start time), the front buffer
+        self._invalidated_at = 0.0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="screen-capture", daemon=True
+        )
+        self._thread.start()
+
+    def invalidate(self):
+        """Mark the current frame as stale, e.g. because input is about to change the screen."""
+        with self._condition:
+            self._invalidated_at = time.monotonic()
+            self._condition.notify_all()
+
+    def frame(self, newer_than: float = 0.0, timeout: float = CAPTURE_WAIT):
+        """
+        The current (image, capture time), waiting for one that was captured
+        after newer_than and the last invalidation. None if there's none in time.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                newer_than = max(newer_than, self._invalidated_at)
+                if self._frame is not None and self._frame[1] > newer_than:
+                    return self._frame
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopped:
+                    return None
+                self._condition.wait(remaining)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _run(self):
+        while not self._stopped:
+            started = time.monotonic()
+            try:
+                image = self._grab()
+            except Exception:
+                image = None  # e.g. the display went away, try again next time
+            with self._condition:
+                if image is not None:
+                    self._frame = (image, started)
+                    self._condition.notify_all()
+                active = time.monotonic() - self._invalidated_at < CAPTURE_ACTIVE_PERIOD
+                next_capture = started + (SETTLE_INTERVAL if active else self.interval)
+                invalidated_at = self._invalidated_at
+                # Input starts the next capture early
+                while not self._stopped and self._invalidated_at == invalidated_at:
+                    remaining = next_capture - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
 
 
 class ComputerTool(BaseAnthropicTool):
@@ -108,11 +267,16 @@ class ComputerTool(BaseAnthropicTool):
     display_num: int | None
     interpreter: Any # Add interpreter reference
 
-    _screenshot_delay = 2.0
+    _screenshot_delay = 2.0  # Longest wait for a shell command's effect to show up
+    _settle_timeout = 1.0  # Longest wait for the screen to stop changing after an action
     _scaling_enabled = True
+    _skip_unchanged = True  # Answer actions that changed nothing with text instead of an image
+
+    max_concurrency = 1  # There is only one mouse and keyboard
 
     @property
     def options(self) -> ComputerToolOptions:
+        self._update_display()
         width, height = self.scale_coordinates(
             ScalingSource.COMPUTER, self.width, self.height
         )
@@ -128,25 +292,73 @@ class ComputerTool(BaseAnthropicTool):
     def __init__(self, interpreter: Any): # Accept interpreter instance
         self.interpreter = interpreter
         super().__init__()
-
-        self.width, self.height = pyautogui.size()
+        # Everything that blocks (input, capture, encoding) runs on this one
+        # thread, off the event loop and in the order it was asked for
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="computer")
+
+        self._screen_size = pyautogui.size()
+        self.width, self.height = self._screen_size
+        self._last_frame = None  # Fingerprint of the last screenshot that was sent
+        self._templates = {}  # label -> (grayscale patch, click offset in it), see _remember
+        self._grabber = None  # Background capture, see _update_grabber
+        # (left, top, width, height) of the display we're limited to, None for all of them
+        self._region = None
 
         # Get display number and set up display offset
         self.display_num = None
         self._display_offset_x = 0
+        try:
+            self._monitors = get_monitors()
+        except Exception:
+            self._monitors = []  # No monitor info, e.g. headless
         if (display_num := os.getenv("DISPLAY_NUM")) is not None:
             self.display_num = int(display_num)
-            # Get all displays using screeninfo
-            try:
-                monitors = get_monitors()
-                # Calculate x offset based on display number
-                # Assuming displays are arranged horizontally
-                self._display_offset_x = sum(
-                    m.width for m in monitors[: self.display_num]
-                )
-            except ImportError:
-                # Fallback if screeninfo not available
-                self._display_offset_x = 0
+            # Calculate x offset based on display number
+            # Assuming displays are arranged horizontally
+            self._display_offset_x = sum(
+                m.width for m in self._monitors[: self.display_num]
+            )
+
+    async def _run(self, func, *args, **kwargs):
+        """Run blocking work on the tool's thread and wait for it without blocking the loop."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def _active_monitor(self):
+        """The DISPLAY_NUM monitor if there is one, otherwise the primary monitor."""
+        if not self._monitors:
+            return None
+        if self.display_num is not None and self.display_num < len(self._monitors):
+            return self._monitors[self.display_num]
+        return next((m for m in self._monitors if m.is_primary), self._monitors[0])
+
+    def _update_display(self):
+        """Limit the tool to the active display, or not, per computer_active_display_only."""
+        region = None
+        monitor = None
+        if getattr(self.interpreter, "computer_active_display_only", False):
+            monitor = self._active_monitor()
+        if monitor is not None:
+            region = (monitor.x, monitor.y, monitor.width, monitor.height)
+        if region == self._region:
+            return
+        self._region = region
+        self.width, self.height = region[2:] if region else self._screen_size
+        self._last_frame = None  # A different screen now
+        if self._grabber is not None:
+            self._grabber.invalidate()
+
+    def _to_screen(self, x: int, y: int) -> tuple[int, int]:
+        """Tool coordinates (unscaled) to coordinates on the whole virtual screen."""
+        if self._region:
+            return x + self._region[0], y + self._region[1]
+        return x, y
+
+    def _from_screen(self, x: int, y: int) -> tuple[int, int]:
+        if self._region:
+            return x - self._region[0], y - self._region[1]
+        return x, y
 
     async def __call__(
         self,
@@ -154,8 +366,108 @@ class ComputerTool(BaseAnthropicTool):
         action: Action,
         text: str | None = None,
         coordinate: tuple[int, int] | None = None,
+        region: list[int] | None = None,
+        actions: list[dict] | None = None,
+        label: str | None = None,
         **kwargs,
     ):
+        self._update_display()
+        self._update_grabber()
+
+        if action == "screenshot":
+            return await self.screenshot()
+
+        if action == "zoom":
+            return await self.zoom(region)
+
+        if action == "sequence":
+            return await self.run_sequence(actions)
+
+        if action == "save":
+            return await self.save(label)
+
+        if action == "locate":
+            return await self.locate(label)
+
+        if action == "cursor_position":
+            x, y = self._from_screen(*await self._run(pyautogui.position))
+            x, y = self.scale_coordinates(ScalingSource.COMPUTER, x, y)
+            return ToolResult(output=f"X={x},Y={y}")
+
+        grabber = self._grabber
+        if grabber is not None:
+            grabber.invalidate()
+        try:
+            await self._act(action, text, coordinate, label)
+        finally:
+            if grabber is not None:
+                grabber.invalidate()  # Frames taken mid-action don't count either
+
+        # Take a screenshot after the action
+        return await self.screenshot(
+            skip_if_unchanged=self._skip_unchanged, settle=self._settle_timeout
+        )
+
+    async def run_sequence(self, actions: list[dict] | None) -> ToolResult:
+        """
+        Run several input actions back to back and take one screenshot at the
+        end. The whole list is checked before anything runs, and it stops at
+        the first action that fails.
+        """
+        if not isinstance(actions, list) or not actions:
+            raise ToolError("actions must be a non-empty list of actions")
+        if len(actions) > MAX_SEQUENCE_LENGTH:
+            raise ToolError(f"A sequence can have at most {MAX_SEQUENCE_LENGTH} actions")
+        steps = []
+        for number, step in enumerate(actions, 1):
+            if not isinstance(step, dict) or step.get("action") not in INPUT_ACTIONS:
+                raise ToolError(
+                    f"Action {number} must be an object whose action is one of "
+                    + ", ".join(INPUT_ACTIONS)
+                )
+            step = (
+                step["action"],
+                step.get("text"),
+                step.get("coordinate"),
+                step.get("label"),
+            )
+            try:
+                self._check_action(*step)
+            except ToolError as e:
+                raise ToolError(f"Action {number} ({step[0]}): {e.message}")
+            steps.append(step)
+
+        grabber = self._grabber
+        if grabber is not None:
+            grabber.invalidate()
+        done = 0
+        failure = None
+        try:
+            for step in steps:
+                await self._act(*step)
+                done += 1
+        except ToolError as e:
+            failure = f"Action {done + 1} ({steps[done][0]}) failed: {e.message}"
+        finally:
+            if grabber is not None:
+                grabber.invalidate()
+
+        result = await self.screenshot(
+            skip_if_unchanged=self._skip_unchanged, settle=self._settle_timeout
+        )
+        # The outcome goes in the output rather than the error, so the
+        # screenshot of where it stopped still reaches the model
+        summary = f"Ran {done} of {len(steps)} actions."
+        if failure:
+            summary += f" {failure}"
+        if result.output:
+            summary += f"\n{result.output}"
+        return result.replace(output=summary)
+
+    def _check_action(self, action: Action, text: str | None, coordinate, label=None):
+        """Raise a ToolError if the arguments don't fit the action."""
+        if label is not None and (not isinstance(label, str) or not label.strip()):
+            raise ToolError("label must be a non-empty string")
         if action in ("mouse_move", "left_click_drag"):
             if coordinate is None:
                 raise ToolError(f"coordinate is required for {action}")
@@ -165,113 +477,395 @@ class ComputerTool(BaseAnthropicTool):
                 raise ToolError(f"{coordinate} must be a tuple of length 2")
             if not all(isinstance(i, int) and i >= 0 for i in coordinate):
                 raise ToolError(f"{coordinate} must be a tuple of non-negative ints")
+            x, y = self.scale_coordinates(ScalingSource.API, coordinate[0], coordinate[1])
+            if x > self.width or y > self.height:
+                raise ToolError(f"Coordinates {coordinate[0]}, {coordinate[1]} are out of bounds")
+        elif action in ("key", "type"):
+            if text is None:
+                raise ToolError(f"text is required for {action}")
+        elif action not in INPUT_ACTIONS:
+            raise ToolError(f"Invalid action: {action}")
 
-            x, y = self.scale_coordinates(
-                ScalingSource.API, coordinate[0], coordinate[1]
+    async def _act(self, action: Action, text: str | None, coordinate, label=None):
+        """Perform an input action, screenshots are up to the caller."""
+        self._check_action(action, text, coordinate, label)
+        if action in ("mouse_move", "left_click_drag"):
+            x, y = self._to_screen(
+                *self.scale_coordinates(ScalingSource.API, coordinate[0], coordinate[1])
             )
 
+            fast = self._fast_mode
             if action == "mouse_move":
-                smooth_move_to(x, y)
+                await self._smooth_move_to(x, y, 0 if fast else MOVE_DURATION)
             elif action == "left_click_drag":
-                pyautogui.mouseDown(button="left")
-                smooth_move_to(x, y)
-                pyautogui.mouseUp(button="left")
+                await self._run(pyautogui.mouseDown, button="left")
+                try:
+                    await self._smooth_move_to(
+                        x, y, FAST_DRAG_DURATION if fast else MOVE_DURATION
+                    )
+                finally:
+                    await self._run(pyautogui.mouseUp, button="left")
 
         elif action in ("key", "type"):
-            if text is None:
-                raise ToolError(f"text is required for {action}")
-
             if action == "key":
-                if platform.system() == "Darwin":  # Check if we're on macOS
-                    text = text.replace("super+", "command+")
-
-                # Normalize key names
-                def normalize_key(key):
-                    key = key.lower().replace("_", "")
-                    key_map = {
-                        "pagedown": "pgdn",
-                        "pageup": "pgup",
-                        "enter": "return",
-                        "return": "enter",
-                        # Add more mappings as needed
-                    }
-                    return key_map.get(key, key)
-
-                keys = [normalize_key(k) for k in text.split("+")]
-
-                if len(keys) > 1:
-                    if "darwin" in platform.system().lower():
-                        # Use AppleScript for hotkey on macOS
-                        keystroke, modifier = (keys[-1], "+".join(keys[:-1]))
-                        modifier = modifier.lower() + " down"
-                        if keystroke.lower() == "space":
-                            keystroke = " "
-                        elif keystroke.lower() == "enter":
-                            keystroke = "\n"
-                        script = f"""
-                        tell application "System Events"
-                            keystroke "{keystroke}" using {modifier}
-                        end tell
-                        """
-                        os.system("osascript -e '{}'".format(script))
-                    else:
-                        pyautogui.hotkey(*keys)
-                else:
-                    pyautogui.press(keys[0])
+                await self._run(self._press_keys, text)
             elif action == "type":
-                pyautogui.write(text, interval=TYPING_DELAY_MS / 1000)
+                await self._type(text)
 
         elif action in ("left_click", "right_click", "double_click", "middle_click"):
-            time.sleep(0.1)
+            if label:
+                await self._remember(label)
+            if not self._fast_mode:
+                await asyncio.sleep(CLICK_PAUSE)
             button = {
                 "left_click": "left",
                 "right_click": "right",
                 "middle_click": "middle",
             }
             if action == "double_click":
-                pyautogui.click()
-                time.sleep(0.1)
-                pyautogui.click()
+                await self._run(pyautogui.click)
+                await asyncio.sleep(CLICK_PAUSE)
+                await self._run(pyautogui.click)
             else:
-                pyautogui.click(button=button.get(action, "left"))
-
-        elif action == "screenshot":
-            return await self.screenshot()
-
-        elif action == "cursor_position":
-            x, y = pyautogui.position()
-            x, y = self.scale_coordinates(ScalingSource.COMPUTER, x, y)
-            return ToolResult(output=f"X={x},Y={y}")
+                await self._run(pyautogui.click, button=button.get(action, "left"))
 
         else:
             raise ToolError(f"Invalid action: {action}")
 
-        # Take a screenshot after the action (except for cursor_position)
-        if action != "cursor_position":
-            return await self.screenshot()
+    async def _smooth_move_to(self, x, y, duration=MOVE_DURATION):
+        """Move the mouse to (x, y) with an eased animation, or straight there if duration is 0."""
+        if duration <= 0:
+            await self._run(pyautogui.moveTo, x, y)
+            return
 
-    async def screenshot(self):
-        """Take a screenshot of the current screen and return the base64 encoded image."""
-        temp_dir = Path(tempfile.gettempdir())
-        path = temp_dir / f"screenshot_{uuid4().hex}.png"
+        start_x, start_y = await self._run(pyautogui.position)
+        dx = x - start_x
+        dy = y - start_y
 
-        if self._scaling_enabled:
-            x, y = self.scale_coordinates(
-                ScalingSource.COMPUTER, self.width, self.height
-            )
-            # Use pyautogui's screenshot with direct scaling
-            screenshot = pyautogui.screenshot()
-            screenshot = screenshot.resize((x, y))
+        start_time = time.monotonic()
+
+        while True:
+            elapsed_time = time.monotonic() - start_time
+            if elapsed_time > duration:
+                break
+
+            t = elapsed_time / duration
+            eased_t = (1 - math.cos(t * math.pi)) / 2  # easeInOutSine function
+
+            target_x = start_x + dx * eased_t
+            target_y = start_y + dy * eased_t
+            # No pyautogui pause per step, we pace the steps ourselves at ~60 a second
+            await self._run(pyautogui.moveTo, target_x, target_y, _pause=False)
+            await asyncio.sleep(MOVE_STEP_INTERVAL)
+
+        # Ensure the mouse ends up exactly at the target (x, y)
+        await self._run(pyautogui.moveTo, x, y)
+
+    def _press_keys(self, text: str):
+        """Press a key or a combination like ctrl+s (blocking)."""
+        if platform.system() == "Darwin":  # Check if we're on macOS
+            text = text.replace("super+", "command+")
+
+        # Normalize key names
+        def normalize_key(key):
+            key = key.lower().replace("_", "")
+            key_map = {
+                "pagedown": "pgdn",
+                "pageup": "pgup",
+                "enter": "return",
+                "return": "enter",
+                # Add more mappings as needed
+            }
+            return key_map.get(key, key)
+
+        keys = [normalize_key(k) for k in text.split("+")]
+
+        if len(keys) > 1:
+            if "darwin" in platform.system().lower():
+                # Use AppleScript for hotkey on macOS
+                keystroke, modifier = (keys[-1], "+".join(keys[:-1]))
+                modifier = modifier.lower() + " down"
+                if keystroke.lower() == "space":
+                    keystroke = " "
+                elif keystroke.lower() == "enter":
+                    keystroke = "\n"
+                script = f"""
+                tell application "System Events"
+                    keystroke "{keystroke}" using {modifier}
+                end tell
+                """
+                os.system("osascript -e '{}'".format(script))
+            else:
+                pyautogui.hotkey(*keys)
         else:
-            screenshot = pyautogui.screenshot()
+            pyautogui.press(keys[0])
+
+    async def save(self, label: str | None) -> ToolResult:
+        """Save the element under the cursor as label, for locate."""
+        if not TEMPLATE_MATCHING:
+            raise ToolError("save needs numpy, which isn't installed")
+        if not isinstance(label, str) or not label.strip():
+            raise ToolError("label must be a non-empty string")
+        if not await self._remember(label):
+            raise ToolError(
+                "The area under the cursor is blank, move the cursor onto the element first"
+            )
+        return ToolResult(output=f"Saved the element under the cursor as {label.strip()!r}.")
+
+    async def _remember(self, label: str) -> bool:
+        """Save the patch around the cursor as the template for label. False if there's nothing to save."""
+        if not TEMPLATE_MATCHING:
+            return False
+        x, y = self._from_screen(*await self._run(pyautogui.position))
+        x, y = self.scale_coordinates(ScalingSource.COMPUTER, x, y)
+        frame, _ = await self._run(self._grab)
+        width, height = TEMPLATE_SIZE
+        left = min(max(x - width // 2, 0), max(frame.width - width, 0))
+        top = min(max(y - height // 2, 0), max(frame.height - height, 0))
+        template = frame.crop((left, top, left + width, top + height)).convert("L")
+        if np.asarray(template, dtype=np.float32).std() < MIN_TEMPLATE_CONTRAST:
+            return False  # Blank area, it would match anywhere
+        # Where the click was inside the patch, which isn't the center near the edges
+        self._templates[label.strip()] = (template, (x - left, y - top))
+        return True
+
+    async def locate(self, label: str | None) -> ToolResult:
+        """
+        Find a template saved by a labelled click on the current screen and
+        return where to click, without sending a screenshot.
+        """
+        if not TEMPLATE_MATCHING:
+            raise ToolError("locate needs numpy, which isn't installed")
+        if not self._templates:
+            raise ToolError(
+                "No saved elements yet, save the element under the cursor with the save action (or a label on a click)"
+            )
+        if not isinstance(label, str) or label.strip() not in self._templates:
+            raise ToolError(
+                f"Unknown label {label!r}, saved labels are: " + ", ".join(self._templates)
+            )
+        template, (offset_x, offset_y) = self._templates[label.strip()]
 
-        screenshot.save(str(path))
+        def find():
+            frame, _ = self._grab()
+            return locate(frame, template)
 
-        if path.exists():
-            base64_image = base64.b64encode(path.read_bytes()).decode()
-            path.unlink()  # Remove the temporary file
-            return ToolResult(base64_image=base64_image)
-        raise ToolError(f"Failed to take screenshot")
+        match = await self._run(find)
+        if match is None or match[0] < LOCATE_THRESHOLD:
+            best = f" (best match {match[0]:.2f})" if match else ""
+            return ToolResult(
+                output=f"{label!r} was not found on the screen{best}. Take a screenshot to look for it."
+            )
+        score, x, y, width, height, runner_up = match
+        offset_x = round(offset_x * width / template.width)
+        offset_y = round(offset_y * height / template.height)
+        if (
+            runner_up is not None
+            and runner_up[0] >= LOCATE_THRESHOLD
+            and score - runner_up[0] < LOCATE_MARGIN
+        ):
+            other_score, other_x, other_y = runner_up
+            return ToolResult(
+                output=f"{label!r} matches more than one place on the screen, e.g. "
+                f"X={x + offset_x},Y={y + offset_y} (match {score:.2f}) and "
+                f"X={other_x + offset_x},Y={other_y + offset_y} (match {other_score:.2f}). "
+                "Take a screenshot to tell which one is meant."
+            )
+        return ToolResult(
+            output=f"Found {label!r} at X={x + offset_x},Y={y + offset_y} (match {score:.2f})"
+        )
+
+    async def _type(self, text: str):
+        """
+        Enter text. Long text is pasted through the clipboard, anything else
+        (or if the clipboard doesn't work) is typed in groups, one tool thread
+        job each, so a cancel stops between groups.
+        """
+        min_length = getattr(
+            self.interpreter, "computer_paste_min_length", DEFAULT_PASTE_MIN_LENGTH
+        )
+        if min_length > 0 and len(text) >= min_length:
+            if await self._paste(text):
+                return
+
+        for group in chunks(text, TYPING_GROUP_SIZE):
+            await self._run(pyautogui.write, group, interval=TYPING_DELAY_MS / 1000)
+
+    async def _paste(self, text: str) -> bool:
+        """Paste text through the clipboard, restoring what was on it. False if that's not possible."""
+        if pyperclip is None:
+            return False
+        try:
+            saved = await self._run(pyperclip.paste)
+            await self._run(pyperclip.copy, text)
+        except Exception:
+            return False  # e.g. no clipboard tool (xclip/xsel) installed
+        try:
+            modifier = "command" if platform.system() == "Darwin" else "ctrl"
+            await self._run(pyautogui.hotkey, modifier, "v")
+            await asyncio.sleep(PASTE_SETTLE)
+        finally:
+            try:
+                await self._run(pyperclip.copy, saved)
+            except Exception:
+                pass
+        return True
+
+    @property
+    def _fast_mode(self) -> bool:
+        return getattr(self.interpreter, "computer_fast", False)
+
+    def _update_grabber(self):
+        """Start or stop background capture to match the computer_background_capture setting."""
+        enabled = getattr(self.interpreter, "computer_background_capture", False)
+        if enabled and self._grabber is None:
+            self._grabber = FrameGrabber(self._grab_now)
+        elif not enabled and self._grabber is not None:
+            self._grabber.stop()
+            self._grabber = None
+
+    async def screenshot(self, skip_if_unchanged=False, settle=0.0, expect_change=False):
+        """
+        Take a screenshot of the current screen and return the base64 encoded image.
+        With skip_if_unchanged, a screen that looks the same as the last one
+        sent is reported as text instead. See _grab_settled for settle and expect_change.
+        """
+        image_format = getattr(
+            self.interpreter, "screenshot_format", DEFAULT_SCREENSHOT_FORMAT
+        )
+        quality = getattr(
+            self.interpreter, "screenshot_quality", DEFAULT_SCREENSHOT_QUALITY
+        )
+        # Capturing, scaling and encoding are all blocking, keep them off the event loop
+        try:
+            screenshot = await self._grab_settled(settle, expect_change)
+            encoded = await self._run(
+                self._encode, screenshot, image_format, quality, skip_if_unchanged
+            )
+        except ToolError:
+            raise
+        except Exception as e:
+            raise ToolError(f"Failed to take screenshot: {e}")
+        if encoded is None:
+            return ToolResult(output=UNCHANGED_MESSAGE)
+        base64_image, media_type = encoded
+        return ToolResult(base64_image=base64_image, media_type=media_type)
+
+    def _encode(
+        self,
+        screenshot: Image.Image,
+        image_format: str,
+        quality: int,
+        skip_if_unchanged: bool = False,
+    ) -> tuple[str, str] | None:
+        """
+        Encode a screenshot in memory, returns (base64, media type), or None
+        if it's skipped for being the same as the last one.
+        """
+        fingerprint = frame_fingerprint(screenshot)
+        if skip_if_unchanged and frames_match(fingerprint, self._last_frame):
+            return None
+        self._last_frame = fingerprint
+        return encode_image(screenshot, image_format, quality)
+
+    async def zoom(self, region: list[int] | None) -> ToolResult:
+        """
+        A screenshot of just [x1, y1, x2, y2] (tool coordinates), at the screen's
+        native resolution, so small text can be read. It's only scaled down if it
+        would come out bigger than a regular screenshot.
+        """
+        if (
+            not isinstance(region, list)
+            or len(region) != 4
+            or not all(isinstance(i, int) and i >= 0 for i in region)
+        ):
+            raise ToolError(f"{region} must be a list of 4 non-negative ints [x1, y1, x2, y2]")
+        x1, y1 = self.scale_coordinates(ScalingSource.API, region[0], region[1])
+        x2, y2 = self.scale_coordinates(ScalingSource.API, region[2], region[3])
+        x2, y2 = min(x2, self.width), min(y2, self.height)
+        if x2 <= x1 or y2 <= y1:
+            raise ToolError(f"{region} must have x1 < x2 and y1 < y2, inside the screen")
+
+        left, top = self._to_screen(x1, y1)
+        max_size = self.scale_coordinates(ScalingSource.COMPUTER, self.width, self.height)
+        image_format = getattr(
+            self.interpreter, "screenshot_format", DEFAULT_SCREENSHOT_FORMAT
+        )
+        quality = getattr(
+            self.interpreter, "screenshot_quality", DEFAULT_SCREENSHOT_QUALITY
+        )
+
+        def capture():
+            image = pyautogui.screenshot(region=(left, top, x2 - x1, y2 - y1))
+            if image.width > max_size[0] or image.height > max_size[1]:
+                image.thumbnail(max_size, Image.Resampling.BILINEAR)
+            return encode_image(image, image_format, quality)
+
+        try:
+            base64_image, media_type = await self._run(capture)
+        except Exception as e:
+            raise ToolError(f"Failed to take screenshot: {e}")
+        return ToolResult(base64_image=base64_image, media_type=media_type)
+
+    def _grab(self, newer_than: float = 0.0) -> tuple[Image.Image, float]:
+        """
+        A screenshot scaled to the size the model sees, and when it was taken.
+        Comes from background capture if it's on, otherwise it's grabbed now.
+        """
+        grabber = self._grabber
+        if grabber is not None:
+            frame = grabber.frame(newer_than)
+            if frame is not None:
+                return frame
+        taken = time.monotonic()
+        return self._grab_now(), taken
+
+    def _grab_now(self) -> Image.Image:
+        screenshot = pyautogui.screenshot(region=self._region)
+        if self._scaling_enabled:
+            size = self.scale_coordinates(ScalingSource.COMPUTER, self.width, self.height)
+            if size != screenshot.size:
+                # Bilinear with a reducing gap is much faster than the default
+                # bicubic, and a downscaled screen looks the same either way
+                screenshot = screenshot.resize(
+                    size, Image.Resampling.BILINEAR, reducing_gap=2.0
+                )
+        return screenshot
+
+    def _grab_fingerprinted(self, newer_than: float = 0.0):
+        screenshot, taken = self._grab(newer_than)
+        return screenshot, taken, frame_fingerprint(screenshot)
+
+    async def _grab_settled(self, timeout: float, expect_change: bool = False) -> Image.Image:
+        """
+        A screenshot once the screen has stopped changing, i.e. two frames in a
+        row match, waiting at most `timeout` seconds. With expect_change it
+        also waits for the screen to change first, e.g. for a window that was
+        just launched to show up.
+        """
+        if not timeout:
+            screenshot, _ = await self._run(self._grab)
+            return screenshot
+        if np is None:
+            # Can't compare frames, fall back to a fixed delay where one is expected
+            if expect_change:
+                await asyncio.sleep(timeout)
+            screenshot, _ = await self._run(self._grab)
+            return screenshot
+
+        deadline = time.monotonic() + timeout
+        screenshot, taken, previous = await self._run(self._grab_fingerprinted)
+        changed = not expect_change
+        while time.monotonic() + SETTLE_INTERVAL <= deadline:
+            if self._grabber is None:
+                await asyncio.sleep(SETTLE_INTERVAL)  # Background capture paces itself
+            screenshot, taken, current = await self._run(self._grab_fingerprinted, taken)
+            if not frames_match(current, previous):
+                changed = True
+            elif changed:
+                break
+            previous = current
+        return screenshot
 
     async def shell(self, command: str, take_screenshot=True) -> ToolResult:
         """Run a shell command and return the output, error, and optionally a screenshot."""
@@ -280,14 +874,20 @@ class ComputerTool(BaseAnthropicTool):
         #     return ToolResult(error=f"Command '{command}' is not in allowed_commands.")
 
         _, stdout, stderr = await run(command)
-        base64_image = None
+        result = ToolResult(output=stdout, error=stderr)
+        if self._grabber is not None:
+            self._grabber.invalidate()
 
         if take_screenshot:
-            # delay to let things settle before taking a screenshot
-            await asyncio.sleep(self._screenshot_delay)
-            base64_image = (await self.screenshot()).base64_image
+            # Wait for the command's effect to show up and settle, but no longer than needed
+            screenshot = await self.screenshot(
+                settle=self._screenshot_delay, expect_change=True
+            )
+            result = result.replace(
+                base64_image=screenshot.base64_image, media_type=screenshot.media_type
+            )
 
-        return ToolResult(output=stdout, error=stderr, base64_image=base64_image)
+        return result
 
     def scale_coordinates(self, source: ScalingSource, x: int, y: int):
         """Scale coordinates to a target maximum resolution."""
@@ -313,3 +913,82 @@ class ComputerTool(BaseAnthropicTool):
             return round(x / x_scaling_factor), round(y / y_scaling_factor)
         # scale down
         return round(x * x_scaling_factor), round(y * y_scaling_factor)
+
+
+class ComputerExtrasTool(BaseAnthropicTool):
+    """
+    The computer tool's actions that Anthropic's computer tool doesn't have
+    (zoom, sequence, save, locate), declared as a custom tool. The built-in
+    tool's schema is fixed, so the model would never hear of them there.
+    Calls go to the same ComputerTool, so they share its screen state and
+    saved elements.
+    """
+
+    name: Literal["computer_extras"] = "computer_extras"
+    actions = ("zoom", "sequence", "save", "locate")
+    max_concurrency = 1
+
+    def __init__(self, computer: ComputerTool):
+        self.computer = computer
+        super().__init__()
+
+    def is_exclusive(self, tool_input: dict[str, Any]) -> bool:
+        return True  # Same mouse and screen as the computer tool's calls
+
+    def to_params(self) -> BetaToolParam:
+        return {
+            "name": self.name,
+            "description": (
+                "More actions on the screen of the computer tool, in the same coordinates:\n"
+                "* zoom: screenshot of `region` [x1, y1, x2, y2] at full resolution, to read small text\n"
+                "* sequence: run `actions` (clicks, moves, key and type actions, each like a "
+                "computer tool call) in order and take one screenshot at the end, "
+                "stopping at the first one that fails\n"
+                "* save: remember the element under the mouse cursor as `label`\n"
+                "* locate: find a saved element on the current screen and return where to "
+                "click it, without a screenshot. Take a screenshot if it's not found or ambiguous"
+            ),
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "enum": list(self.actions)},
+                    "region": {
+                        "type": "array",
+                        "description": "x1, y1, x2, y2 of the area to zoom into (zoom)",
+                        "items": {"type": "integer"},
+                        "minItems": 4,
+                        "maxItems": 4,
+                    },
+                    "actions": {
+                        "type": "array",
+                        "description": "The input actions to run (sequence). A click with a label also saves the element clicked",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "action": {"type": "string", "enum": list(INPUT_ACTIONS)},
+                                "text": {"type": "string"},
+                                "coordinate": {
+                                    "type": "array",
+                                    "items": {"type": "integer"},
+                                },
+                                "label": {"type": "string"},
+                            },
+                            "required": ["action"],
+                        },
+                    },
+                    "label": {
+                        "type": "string",
+                        "description": "Name of the element (save, locate)",
+                    },
+                },
+                "required": ["action"],
+            },
+        }
+
+    async def __call__(self, *, action: str, **kwargs):
+        if action not in self.actions:
+            raise ToolError(
+                f"Unknown action {action!r}, use one of {', '.join(self.actions)}. "
+                "Other actions are in the computer tool."
+            )
+        return await self.computer(action=action, **kwargs)
@@ -1,11 +1,14 @@
-from collections import defaultdict
+import asyncio
+import os
 from pathlib import Path
 from typing import Literal, get_args, Any # Added Any
 
 from anthropic.types.beta import BetaToolTextEditor20241022Param
 
 from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
-from .run import maybe_truncate, run
+from .edit_history import EditHistory, context_around
+from .large_file import MappedFile, is_large
+from .run import MAX_RESPONSE_LEN, is_spooled, maybe_truncate, read_lines, run
 
 Command = Literal[
     "view",
@@ -17,6 +20,16 @@ Command = Literal[
 SNIPPET_LINES: int = 4
 
 
+def _as_read(raw: str) -> str:
+    """Raw file text (read with newline="") the way a normal read_file returns it."""
+    return raw.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _as_written(text: str) -> str:
+    """The raw text write_file leaves on disk for text."""
+    return text.replace("\n", os.linesep) if os.linesep != "\n" else text
+
+
 class EditTool(BaseAnthropicTool):
     """
     An filesystem editor tool that allows the agent to view, create, and edit files.
@@ -26,12 +39,14 @@ class EditTool(BaseAnthropicTool):
     api_type: Literal["text_editor_20250124"] = "text_editor_20250124" # Updated identifier
     name: Literal["str_replace_editor"] = "str_replace_editor" # Reverted name to match Anthropic API requirement
 
-    _file_history: dict[Path, list[str]]
+    _file_history: EditHistory
     interpreter: Any # Add interpreter reference
 
     def __init__(self, interpreter: Any): # Accept interpreter instance
         self.interpreter = interpreter
-        self._file_history = defaultdict(list)
+        self._file_history = EditHistory(
+            spill=lambda: getattr(self.interpreter, "edit_history_spill", False)
+        )
         super().__init__()
 
     def to_params(self) -> BetaToolTextEditor20241022Param: # Note: Type hint might need update if Anthropic SDK changes param name
@@ -40,6 +55,10 @@ class EditTool(BaseAnthropicTool):
             "type": self.api_type,
         }
 
+    def is_exclusive(self, tool_input: dict[str, Any]) -> bool:
+        # Views can run alongside other calls, edits must see (and be seen by) them in order
+        return tool_input.get("command") != "view"
+
     async def __call__(
         self,
         *,
@@ -59,15 +78,16 @@ class EditTool(BaseAnthropicTool):
         elif command == "create":
             if file_text is None:
                 raise ToolError("Parameter `file_text` is required for command: create")
-            self.write_file(_path, file_text)
-            self._file_history[_path].append(file_text)
+            await asyncio.to_thread(self.write_file, _path, file_text)
+            # Undoing a create leaves the file as it was created
+            self._file_history.push(_path, 0, "", "", len(_as_written(file_text)))
             return ToolResult(output=f"File created successfully at: {_path}")
         elif command == "str_replace":
             if old_str is None:
                 raise ToolError(
                     "Parameter `old_str` is required for command: str_replace"
                 )
-            return self.str_replace(_path, old_str, new_str)
+            return await asyncio.to_thread(self.str_replace, _path, old_str, new_str)
         elif command == "insert":
             if insert_line is None:
                 raise ToolError(
@@ -75,9 +95,9 @@ class EditTool(BaseAnthropicTool):
                 )
             if new_str is None:
                 raise ToolError("Parameter `new_str` is required for command: insert")
-            return self.insert(_path, insert_line, new_str)
+            return await asyncio.to_thread(self.insert, _path, insert_line, new_str)
         elif command == "undo_edit":
-            return self.undo_edit(_path)
+            return await asyncio.to_thread(self.undo_edit, _path)
         raise ToolError(
             f'Unrecognized command {command}. The allowed commands for the {self.name} tool are: {", ".join(get_args(Command))}'
         )
@@ -129,28 +149,34 @@ class EditTool(BaseAnthropicTool):
                 stdout = f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n{stdout}\n"
             return CLIResult(output=stdout, error=stderr)
 
-        file_content = self.read_file(path)
-        init_line = 1
-        if view_range:
+        # Reading (and for big files, scanning) blocks, keep it off the event loop
+        return await asyncio.to_thread(self._view_file, path, view_range)
+
+    def _view_file(self, path: Path, view_range: list[int] | None = None):
+        if is_large(path):
+            with self.map_file(path) as mapped:
+                return self._view_mapped(path, mapped, view_range)
+
+        if view_range and is_spooled(path):
+            # Saved tool output can be huge, page through it without loading it all
             if len(view_range) != 2 or not all(isinstance(i, int) for i in view_range):
                 raise ToolError(
                     "Invalid `view_range`. It should be a list of two integers."
                 )
-            file_lines = file_content.split("\n")
-            n_lines_file = len(file_lines)
             init_line, final_line = view_range
-            if init_line < 1 or init_line > n_lines_file:
-                raise ToolError(
-                    f"Invalid `view_range`: {view_range}. Its first element `{init_line}` should be within the range of lines of the file: {[1, n_lines_file]}"
-                )
-            if final_line > n_lines_file:
-                raise ToolError(
-                    f"Invalid `view_range`: {view_range}. Its second element `{final_line}` should be smaller than the number of lines in the file: `{n_lines_file}`"
-                )
-            if final_line != -1 and final_line < init_line:
-                raise ToolError(
-                    f"Invalid `view_range`: {view_range}. Its second element `{final_line}` should be larger or equal than its first `{init_line}`"
+            if init_line < 1 or (final_line != -1 and final_line < init_line):
+                raise ToolError(f"Invalid `view_range`: {view_range}.")
+            return CLIResult(
+                output=self._make_output(
+                    read_lines(path, init_line, final_line), str(path), init_line=init_line
                 )
+            )
+
+        file_content = self.read_file(path)
+        init_line = 1
+        if view_range:
+            file_lines = file_content.split("\n")
+            init_line, final_line = self._check_view_range(view_range, len(file_lines))
 
             if final_line == -1:
                 file_content = "\n".join(file_lines[init_line - 1 :])
@@ -161,10 +187,51 @@ class EditTool(BaseAnthropicTool):
             output=self._make_output(file_content, str(path), init_line=init_line)
         )
 
+    def _check_view_range(self, view_range, n_lines_file: int) -> tuple[int, int]:
+        if len(view_range) != 2 or not all(isinstance(i, int) for i in view_range):
+            raise ToolError(
+                "Invalid `view_range`. It should be a list of two integers."
+            )
+        init_line, final_line = view_range
+        if init_line < 1 or init_line > n_lines_file:
+            raise ToolError(
+                f"Invalid `view_range`: {view_range}. Its first element `{init_line}` should be within the range of lines of the file: {[1, n_lines_file]}"
+            )
+        if final_line > n_lines_file:
+            raise ToolError(
+                f"Invalid `view_range`: {view_range}. Its second element `{final_line}` should be smaller than the number of lines in the file: `{n_lines_file}`"
+            )
+        if final_line != -1 and final_line < init_line:
+            raise ToolError(
+                f"Invalid `view_range`: {view_range}. Its second element `{final_line}` should be larger or equal than its first `{init_line}`"
+            )
+        return init_line, final_line
+
+    def _view_mapped(self, path: Path, mapped: MappedFile, view_range: list[int] | None):
+        """view for a large file, only the lines that are shown get read."""
+        if not view_range:
+            # Only the start is shown anyway, read just enough to fill the response
+            content = mapped.text(0, 4 * MAX_RESPONSE_LEN + 4)
+            return CLIResult(output=self._make_output(content, str(path)))
+        init_line, final_line = self._check_view_range(view_range, mapped.index.n_lines)
+        return CLIResult(
+            output=self._make_output(
+                mapped.lines(init_line, final_line), str(path), init_line=init_line
+            )
+        )
+
     def str_replace(self, path: Path, old_str: str, new_str: str | None):
         """Implement the str_replace command, which replaces old_str with new_str in the file content"""
-        # Read the file content
-        file_content = self.read_file(path).expandtabs()
+        if is_large(path):
+            with self.map_file(path) as mapped:
+                # Files with tabs or \r get rewritten by the text path (tabs
+                # expanded, newlines translated), so they still go through it
+                if mapped.index.plain:
+                    return self._str_replace_mapped(path, mapped, old_str, new_str)
+
+        # Read the file content, raw for the undo history
+        raw_content = self.read_file(path, newline="")
+        file_content = _as_read(raw_content).expandtabs()
         old_str = old_str.expandtabs()
         new_str = new_str.expandtabs() if new_str is not None else ""
 
@@ -191,8 +258,10 @@ class EditTool(BaseAnthropicTool):
         # Write the new content to the file
         self.write_file(path, new_file_content)
 
-        # Save the content to history
-        self._file_history[path].append(file_content)
+        # Save what was replaced to history
+        self._record_edit(
+            path, raw_content, new_file_content, file_content.find(old_str), old_str, new_str
+        )
 
         # Create a snippet of the edited section
         replacement_line = file_content.split(old_str)[0].count("\n")
@@ -209,9 +278,79 @@ class EditTool(BaseAnthropicTool):
 
         return CLIResult(output=success_msg)
 
+    def _str_replace_mapped(
+        self, path: Path, mapped: MappedFile, old_str: str, new_str: str | None
+    ):
+        """
+        str_replace for a large file: one scan of the mapped bytes finds old_str
+        and checks it's unique, and the new file is copied together from the
+        old one around the replacement.
+        """
+        old_str = old_str.expandtabs()
+        new_str = new_str.expandtabs() if new_str is not None else ""
+        old, new = old_str.encode(), new_str.encode()
+        data, index = mapped.data, mapped.index
+
+        if not old:
+            raise ToolError(
+                f"No replacement was performed. old_str is empty, it matches everywhere in {path}."
+            )
+        first = data.find(old)
+        if first == -1:
+            raise ToolError(
+                f"No replacement was performed, old_str `{old_str}` did not appear verbatim in {path}."
+            )
+        after = first + len(old)
+        if data.find(old, after) != -1:
+            # Like the text path, only occurrences within one line are listed
+            lines = []
+            if b"\n" not in old:
+                pos, line = first, index.line_of(data, first)
+                while pos != -1:
+                    lines.append(line)
+                    # On to the next match, counting the lines in between
+                    end = data.find(b"\n", pos)
+                    if end == -1:
+                        break
+                    pos = data.find(old, end + 1)
+                    if pos != -1:
+                        line += 1 + data[end + 1 : pos].count(b"\n")
+            raise ToolError(
+                f"No replacement was performed. Multiple occurrences of old_str `{old_str}` in lines {lines}. Please ensure it is unique"
+            )
+
+        # The snippet comes from the pieces around the edit, before they're written
+        replacement_line = index.line_of(data, first) - 1
+        start_line = max(0, replacement_line - SNIPPET_LINES)
+        snippet = (
+            data[index.line_start(data, start_line + 1) : first]
+            + new
+            + data[after : mapped.find_line_end(after, SNIPPET_LINES)]
+        ).decode(errors="replace")
+
+        size = mapped.size - len(old) + len(new)
+        # What will be around new, taken before the mapping is closed
+        context = context_around(data, first, after)
+        self.splice_file(mapped, [(0, first), new, (after, mapped.size)])
+        self._file_history.push(path, first, old, new, size, context)
+
+        success_msg = f"The file {path} has been edited. "
+        success_msg += self._make_output(
+            snippet, f"a snippet of {path}", start_line + 1
+        )
+        success_msg += "Review the changes and make sure they are as expected. Edit the file again if necessary."
+
+        return CLIResult(output=success_msg)
+
     def insert(self, path: Path, insert_line: int, new_str: str):
         """Implement the insert command, which inserts new_str at the specified line in the file content."""
-        file_text = self.read_file(path).expandtabs()
+        if is_large(path):
+            with self.map_file(path) as mapped:
+                if mapped.index.plain:
+                    return self._insert_mapped(path, mapped, insert_line, new_str)
+
+        raw_text = self.read_file(path, newline="")
+        file_text = _as_read(raw_text).expandtabs()
         new_str = new_str.expandtabs()
         file_text_lines = file_text.split("\n")
         n_lines_file = len(file_text_lines)
@@ -237,7 +376,13 @@ class EditTool(BaseAnthropicTool):
         snippet = "\n".join(snippet_lines)
 
         self.write_file(path, new_file_text)
-        self._file_history[path].append(file_text)
+        if insert_line == 0:
+            inserted = new_str + "\n"
+            start = 0
+        else:
+            inserted = "\n" + new_str
+            start = len("\n".join(file_text_lines[:insert_line]))
+        self._record_edit(path, raw_text, new_file_text, start, "", inserted)
 
         success_msg = f"The file {path} has been edited. "
         success_msg += self._make_output(
@@ -248,32 +393,150 @@ class EditTool(BaseAnthropicTool):
         success_msg += "Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."
         return CLIResult(output=success_msg)
 
+    def _insert_mapped(
+        self, path: Path, mapped: MappedFile, insert_line: int, new_str: str
+    ):
+        """insert for a large file, the new file is copied together around the new lines."""
+        new_str = new_str.expandtabs()
+        data, index = mapped.data, mapped.index
+        n_lines_file = index.n_lines
+
+        if insert_line < 0 or insert_line > n_lines_file:
+            raise ToolError(
+                f"Invalid `insert_line` parameter: {insert_line}. It should be within the range of lines of the file: {[0, n_lines_file]}"
+            )
+
+        snippet_parts = [new_str]
+        if insert_line > 0:
+            snippet_parts.insert(
+                0, mapped.lines(max(1, insert_line - SNIPPET_LINES + 1), insert_line)
+            )
+        if insert_line < n_lines_file:
+            snippet_parts.append(
+                mapped.lines(
+                    insert_line + 1, min(n_lines_file, insert_line + SNIPPET_LINES)
+                )
+            )
+            at = index.line_start(data, insert_line + 1)
+            inserted = new_str.encode() + b"\n"
+        else:
+            at = mapped.size
+            inserted = b"\n" + new_str.encode()
+
+        size = mapped.size + len(inserted)
+        context = context_around(data, at, at)
+        self.splice_file(mapped, [(0, at), inserted, (at, mapped.size)])
+        self._file_history.push(path, at, b"", inserted, size, context)
+
+        success_msg = f"The file {path} has been edited. "
+        success_msg += self._make_output(
+            "\n".join(snippet_parts),
+            "a snippet of the edited file",
+            max(1, insert_line - SNIPPET_LINES + 1),
+        )
+        success_msg += "Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."
+        return CLIResult(output=success_msg)
+
+    def _record_edit(
+        self, path: Path, before: str, after: str, start: int, old: str, new: str
+    ):
+        """
+        Save an edit made on the whole text to history, with before the raw
+        text of the file. Expanding tabs and writing newlines may have changed
+        more of the file than old -> new at start, then everything between the
+        first and last difference on disk is saved instead.
+        """
+        after = _as_written(after)
+        if "\t" in before or "\r" in before or "\r" in after:
+            self._file_history.push_diff(path, before, after)
+        else:
+            self._file_history.push(
+                path,
+                start,
+                old,
+                new,
+                len(after),
+                context_around(after, start, start + len(new)),
+            )
+
     def undo_edit(self, path: Path):
         """Implement the undo_edit command."""
-        if not self._file_history[path]:
+        edit = self._file_history.last(path)
+        if edit is None:
+            dropped = self._file_history.dropped(path)
+            if dropped:
+                raise ToolError(
+                    f"No edit history left for {path}, its {dropped} oldest edits were dropped to save memory."
+                )
             raise ToolError(f"No edit history found for {path}.")
 
-        old_text = self._file_history[path].pop()
-        self.write_file(path, old_text)
+        # The history only has what each edit replaced, so that's put back
+        # where the edit's new content is now. Changes made elsewhere in the
+        # file since are kept, but if the edited part itself was changed
+        # there's nothing to put it back into
+        changed = ToolError(
+            f"The text of the last edit to {path} was changed since, so the edit can't be undone. "
+            "Undo only works while the edited lines are still as the edit left them."
+        )
+        old_content = edit.old_content()
+        if edit.text:
+            # Raw text, so the line endings the edit rewrote come back too
+            current = self.read_file(path, newline="")
+            start = edit.find(current)
+            if start is None:
+                raise changed
+            old_text = current[:start] + old_content + current[start + edit.new_length :]
+            self.write_file(path, old_text, newline="")
+            old_text = _as_read(old_text)
+        else:
+            with self.map_file(path) as mapped:
+                start = edit.find(mapped.data)
+                if start is None:
+                    raise changed
+                self.splice_file(
+                    mapped,
+                    [(0, start), old_content, (start + edit.new_length, mapped.size)],
+                )
+            # Only the start is shown anyway
+            with open(path, "rb") as f:
+                old_text = f.read(4 * MAX_RESPONSE_LEN + 4).decode(errors="replace")
+        self._file_history.pop(path)
 
         return CLIResult(
             output=f"Last edit to {path} undone successfully. {self._make_output(old_text, str(path))}"
         )
 
-    def read_file(self, path: Path):
+    def read_file(self, path: Path, newline: str | None = None):
         """Read the content of a file from a given path; raise a ToolError if an error occurs."""
         try:
-            return path.read_text()
+            with open(path, newline=newline) as f:
+                return f.read()
         except Exception as e:
             raise ToolError(f"Ran into {e} while trying to read {path}") from None
 
-    def write_file(self, path: Path, file: str):
+    def write_file(self, path: Path, file: str, newline: str | None = None):
         """Write the content of a file to a given path; raise a ToolError if an error occurs."""
         try:
-            path.write_text(file)
+            path.write_text(file, newline=newline)
         except Exception as e:
             raise ToolError(f"Ran into {e} while trying to write to {path}") from None
 
+    def map_file(self, path: Path) -> MappedFile:
+        """Map a large file for reading; raise a ToolError if an error occurs."""
+        try:
+            return MappedFile(path)
+        except Exception as e:
+            raise ToolError(f"Ran into {e} while trying to read {path}") from None
+
+    def splice_file(self, mapped: MappedFile, pieces):
+        """Write a mapped file's new content (see MappedFile.splice); raise a ToolError if an error occurs."""
+        try:
+            mapped.splice(pieces)
+        except Exception as e:
+            raise ToolError(
+                f"Ran into {e} while trying to write to {mapped.path}"
+            ) from None
+
     def _make_output(
         self,
         file_content: str,
@@ -0,0 +1,254 @@
+"""Undo history for the editor tool, kept as reverse diffs instead of copies of the file."""
+
+import hashlib
+import itertools
+import zlib
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from .run import spool_dir
+
+MAX_FILE_HISTORY = 16 * 1024 * 1024  # Bytes of undo data kept in memory per file
+MAX_HISTORY = 64 * 1024 * 1024  # And for all files together
+MAX_SPILLED_HISTORY = 1024 * 1024 * 1024  # On disk, when spilling is on
+COMPRESS_MIN_SIZE = 1024  # Smaller hunks aren't worth compressing
+EDIT_OVERHEAD = 128  # Rough size of an Edit besides its data
+# Characters (or bytes) on either side of an edit kept to find it again if the
+# file was changed elsewhere since, and the largest new content kept for that
+ANCHOR_CONTEXT = 64
+MAX_ANCHOR_SIZE = 64 * 1024
+
+
+def _digest(content: bytes) -> bytes:
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+def _common_prefix(a, b) -> int:
+    """Length of the common start of two strings, found by comparing ever smaller slices."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def context_around(content, start: int, end: int):
+    """The ANCHOR_CONTEXT characters (or bytes) before start and after end in content, for EditHistory.push."""
+    return content[max(start - ANCHOR_CONTEXT, 0) : start], content[end : end + ANCHOR_CONTEXT]
+
+
+def _encode(content: str | bytes) -> bytes:
+    return content.encode(errors="surrogatepass") if isinstance(content, str) else content
+
+
+@dataclass(eq=False)
+class Edit:
+    """
+    How to take back one edit: in the file as it was right after the edit,
+    the new_length characters (or bytes) at start go back to the old content.
+    The file's size and a digest of those characters are kept to check it's
+    still in that state before undoing. If it isn't, the anchor (the new
+    content with a little context on either side) finds where it went.
+    """
+
+    seq: int
+    start: int
+    new_length: int
+    new_digest: bytes
+    size: int
+    text: bool  # Positions count characters of the text, else bytes of the file
+    data: bytes | None  # The old content, None once it's spilled to disk
+    compressed: bool
+    anchor: str | bytes | None = None  # None if the new content was too big to keep
+    anchor_offset: int = 0  # Where the new content starts in the anchor
+    spilled: Path | None = None
+    spilled_size: int = 0
+
+    @property
+    def cost(self) -> int:
+        return len(self.data) + len(self.anchor or "") + EDIT_OVERHEAD
+
+    def matches(self, size: int, region: str | bytes) -> bool:
+        """Whether a file of this size, with region at start..start+new_length, is the one this edit left."""
+        return size == self.size and _digest(_encode(region)) == self.new_digest
+
+    def find(self, content) -> int | None:
+        """
+        Where the new content of this edit starts in content (the file's text,
+        or its bytes for byte edits), which may have been changed elsewhere
+        since. None unless that's certain: the new content and its context
+        are still there unchanged, in place or in exactly one other place.
+        """
+        if self.matches(len(content), content[self.start : self.start + self.new_length]):
+            return self.start
+        if self.anchor is None:
+            # Too big to search for, changes after it still don't move it
+            region = content[self.start : self.start + self.new_length]
+            if self.new_length and _digest(_encode(region)) == self.new_digest:
+                return self.start
+            return None
+        if not self.anchor:
+            return None  # An empty edit of an empty file, that could be anywhere
+        at = self.start - self.anchor_offset
+        if content[at : at + len(self.anchor)] == self.anchor:
+            return self.start
+        first = content.find(self.anchor)
+        if first == -1 or content.find(self.anchor, first + 1) != -1:
+            return None
+        return first + self.anchor_offset
+
+    def old_content(self) -> str | bytes:
+        data = self.data if self.data is not None else self.spilled.read_bytes()
+        if self.compressed:
+            data = zlib.decompress(data)
+        return data.decode(errors="surrogatepass") if self.text else data
+
+
+class EditHistory:
+    """
+    The edits made to each file, newest last, for undo_edit.
+
+    An edit only keeps the content it replaced, plus where, so repeated
+    small edits to a big file cost a little each instead of a copy of the
+    file each. Undo data is capped per file and in total. Past the cap the
+    oldest edits are written to the spool directory if spill() says so, or
+    dropped. An edit can't be undone without the ones after it, so dropping
+    one also drops everything older for that file.
+
+    >>> history = EditHistory()
+    >>> history.push(Path("a.txt"), 6, "world", "there", 11, context=("hello ", ""))
+    >>> edit = history.last(Path("a.txt"))
+    >>> edit.find("hello there"), edit.find("oh, hello there"), edit.old_content()
+    (6, 10, 'world')
+    """
+
+    def __init__(self, spill=None):
+        self.spill = spill or (lambda: False)
+        self.memory = 0
+        self.disk = 0
+        self._edits: dict[Path, list[Edit]] = defaultdict(list)
+        self._file_memory: dict[Path, int] = defaultdict(int)
+        self._dropped: dict[Path, int] = defaultdict(int)
+        # Where each edit's data is, oldest first, for evicting across files
+        self._in_memory: OrderedDict[int, tuple[Path, Edit]] = OrderedDict()
+        self._on_disk: OrderedDict[int, tuple[Path, Edit]] = OrderedDict()
+        self._seq = itertools.count()
+
+    def push(
+        self,
+        path: Path,
+        start: int,
+        old: str | bytes,
+        new: str | bytes,
+        size: int,
+        context=None,
+    ):
+        """
+        Record that old at start was replaced by new, leaving a file of size
+        characters (for str content) or bytes. context is what's around new
+        in the file now (see context_around), to find it again after other
+        changes.
+        """
+        data = _encode(old)
+        compressed = False
+        if len(data) >= COMPRESS_MIN_SIZE:
+            packed = zlib.compress(data, 1)
+            if len(packed) < len(data):
+                data, compressed = packed, True
+        edit = Edit(
+            seq=next(self._seq),
+            start=start,
+            new_length=len(new),
+            new_digest=_digest(_encode(new)),
+            size=size,
+            text=isinstance(old, str),
+            data=data,
+            compressed=compressed,
+        )
+        if context is not None and len(new) <= MAX_ANCHOR_SIZE:
+            before, after = context
+            edit.anchor, edit.anchor_offset = before + new + after, len(before)
+        self._edits[path].append(edit)
+        self._in_memory[edit.seq] = (path, edit)
+        self._file_memory[path] += edit.cost
+        self.memory += edit.cost
+
+        while self._file_memory[path] > MAX_FILE_HISTORY:
+            oldest = next(e for e in self._edits[path] if e.data is not None)
+            self._evict(path, oldest)
+        while self.memory > MAX_HISTORY:
+            self._evict(*next(iter(self._in_memory.values())))
+
+    def push_diff(self, path: Path, before: str | bytes, after: str | bytes):
+        """Record an edit from the whole content before and after it, keeping only what differs."""
+        start = _common_prefix(before, after)
+        end = _common_prefix(before[start:][::-1], after[start:][::-1])
+        self.push(
+            path,
+            start,
+            before[start : len(before) - end],
+            after[start : len(after) - end],
+            len(after),
+            context_around(after, start, len(after) - end),
+        )
+
+    def last(self, path: Path) -> Edit | None:
+        edits = self._edits.get(path)
+        return edits[-1] if edits else None
+
+    def pop(self, path: Path) -> Edit:
+        """Forget the last edit of a file, once it's been undone."""
+        edit = self._edits[path].pop()
+        self._forget(path, edit)
+        if not self._edits[path]:
+            del self._edits[path], self._file_memory[path]
+        return edit
+
+    def dropped(self, path: Path) -> int:
+        """How many edits of a file were dropped to stay under the caps."""
+        return self._dropped.get(path, 0)
+
+    def _evict(self, path: Path, edit: Edit):
+        if not self.spill():
+            self._drop(path, edit)
+            return
+        spilled = spool_dir() / "undo" / f"{edit.seq}.bin"
+        try:
+            spilled.parent.mkdir(exist_ok=True)
+            spilled.write_bytes(edit.data)
+        except OSError:
+            self._drop(path, edit)  # e.g. the disk is full, lose it after all
+            return
+        del self._in_memory[edit.seq]
+        self._file_memory[path] -= edit.cost
+        self.memory -= edit.cost
+        edit.spilled, edit.spilled_size, edit.data = spilled, len(edit.data), None
+        self.disk += edit.spilled_size
+        self._on_disk[edit.seq] = (path, edit)
+        while self.disk > MAX_SPILLED_HISTORY:
+            self._drop(*next(iter(self._on_disk.values())))
+
+    def _drop(self, path: Path, edit: Edit):
+        """Drop edit and every older edit of the file."""
+        edits = self._edits[path]
+        count = edits.index(edit) + 1
+        for older in edits[:count]:
+            self._forget(path, older)
+        del edits[:count]
+        if not edits:
+            del self._edits[path], self._file_memory[path]
+        self._dropped[path] += count
+
+    def _forget(self, path: Path, edit: Edit):
+        if edit.data is not None:
+            del self._in_memory[edit.seq]
+            self._file_memory[path] -= edit.cost
+            self.memory -= edit.cost
+        else:
+            del self._on_disk[edit.seq]
+            self.disk -= edit.spilled_size
+            edit.spilled.unlink(missing_ok=True)
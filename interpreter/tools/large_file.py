@@ -0,0 +1,189 @@
+"""Line-based access to big files through mmap, for the editor tool."""
+
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+
+LARGE_FILE_SIZE = 4 * 1024 * 1024  # Anything smaller is simply read whole
+BLOCK_SIZE = 64 * 1024
+COPY_SIZE = 1024 * 1024
+MAX_CACHED_INDEXES = 8
+
+_indexes: "OrderedDict[Path, LineIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()  # Views of different files build indexes in parallel threads
+
+
+def is_large(path: Path) -> bool:
+    try:
+        return path.is_file() and path.stat().st_size >= LARGE_FILE_SIZE
+    except OSError:
+        return False
+
+
+class LineIndex:
+    """
+    Where the lines of a file start. Rather than an offset per line it keeps
+    the number of newlines before each BLOCK_SIZE block, so a file with
+    millions of lines costs a few thousand numbers. Finding a line jumps to
+    its block and scans the rest of the way from there.
+
+    Line numbers are 1-based and count like text.split("\\n"), so a file
+    that ends with a newline has an empty last line.
+
+    >>> data = b"one\\ntwo\\nthree"
+    >>> index = LineIndex(data, key=None)
+    >>> index.n_lines, index.line_start(data, 3), index.line_of(data, 5)
+    (3, 8, 2)
+    """
+
+    def __init__(self, data, key):
+        self.key = key  # (mtime_ns, size) of the file it was built from
+        self.size = len(data)
+        counts = array("q", [0])
+        total = 0
+        # Tabs and carriage returns are noted on the way, edits only work on
+        # the mapped bytes when neither would be changed by reading the text
+        plain = True
+        for start in range(0, self.size, BLOCK_SIZE):
+            block = data[start : start + BLOCK_SIZE]
+            total += block.count(b"\n")
+            counts.append(total)
+            if plain and (b"\t" in block or b"\r" in block):
+                plain = False
+        self.counts = counts
+        self.newlines = total
+        self.plain = plain
+
+    @property
+    def n_lines(self) -> int:
+        return self.newlines + 1
+
+    def line_start(self, data, line: int) -> int:
+        """Byte offset where a line starts."""
+        skip = line - 1  # Newlines before it
+        if skip <= 0:
+            return 0
+        # The block holding the newline the line starts after
+        block = bisect_left(self.counts, skip) - 1
+        pos = block * BLOCK_SIZE
+        for _ in range(skip - self.counts[block]):
+            pos = data.find(b"\n", pos) + 1
+        return pos
+
+    def line_end(self, data, line: int) -> int:
+        """Byte offset where a line ends, not counting its newline."""
+        if line >= self.n_lines:
+            return self.size
+        return self.line_start(data, line + 1) - 1
+
+    def line_of(self, data, offset: int) -> int:
+        """The line a byte offset is on."""
+        block = offset // BLOCK_SIZE
+        return self.counts[block] + data[block * BLOCK_SIZE : offset].count(b"\n") + 1
+
+
+def line_index(path: Path, data, key) -> LineIndex:
+    """The line index of a file, reused until its mtime or size changes."""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is not None and index.key == key:
+            _indexes.move_to_end(path)
+            return index
+    index = LineIndex(data, key)
+    with _indexes_lock:
+        _indexes[path] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+class MappedFile:
+    """A file mapped read-only, with its line index. Use it as a context manager."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            stat = os.fstat(self._file.fileno())
+            self.data = (
+                mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                if stat.st_size
+                else b""
+            )
+        except Exception:
+            self._file.close()
+            raise
+        self.index = line_index(path, self.data, (stat.st_mtime_ns, stat.st_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b""
+        self._file.close()
+
+    @property
+    def size(self) -> int:
+        return self.index.size
+
+    def text(self, start: int, end: int) -> str:
+        return self.data[start:end].decode(errors="replace").replace("\r\n", "\n")
+
+    def lines(self, first: int, last: int = -1) -> str:
+        """Lines first..last (inclusive, -1 for the end) as text."""
+        if last == -1:
+            last = self.index.n_lines
+        return self.text(
+            self.index.line_start(self.data, first), self.index.line_end(self.data, last)
+        )
+
+    def find_line_end(self, start: int, lines: int) -> int:
+        """The offset where the line `lines` lines after the one at start ends, or the file size."""
+        pos = start
+        for _ in range(lines + 1):
+            pos = self.data.find(b"\n", pos)
+            if pos == -1:
+                return self.size
+            pos += 1
+        return pos - 1
+
+    def splice(self, pieces):
+        """
+        Replace the file with pieces, each either bytes or a (start, end) range
+        of the current content. Ranges are copied straight from the mapping a
+        block at a time into a temporary file next to it, which then takes the
+        file's place, so the new content is never held in memory. Closes the
+        mapping.
+        """
+        target = os.path.realpath(self.path)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".edit-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for piece in pieces:
+                    if isinstance(piece, tuple):
+                        start, end = piece
+                        for pos in range(start, end, COPY_SIZE):
+                            out.write(self.data[pos : min(pos + COPY_SIZE, end)])
+                    else:
+                        out.write(piece)
+            shutil.copymode(target, temp)
+            self.close()  # Windows won't replace a mapped file
+            os.replace(temp, target)
+        except BaseException:
+            self.close()
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            raise
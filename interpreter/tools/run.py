@@ -1,10 +1,19 @@
 """Utility to run shell commands asynchronously with a timeout."""
 
 import asyncio
+import atexit
+import itertools
+import shutil
+import tempfile
+from pathlib import Path
 
 TRUNCATED_MESSAGE: str = "<response clipped><NOTE>To save on context only part of this file has been shown to you. You should retry this tool after you have searched inside the file with `grep -n` in order to find the line numbers of what you are looking for.</NOTE>"
+SPILLED_MESSAGE: str = "<response clipped><NOTE>{elided} of the output were left out here to save on context. The full output is saved at {path}. To see the rest, view it with the str_replace_editor `view` command and a `view_range`, or search it with `grep -n`, instead of running the command again.</NOTE>"
 MAX_RESPONSE_LEN: int = 16000
 
+_spool_dir: Path | None = None
+_spool_count = itertools.count(1)
+
 
 def maybe_truncate(content: str, truncate_after: int | None = MAX_RESPONSE_LEN):
     """Truncate content and append a notice if content exceeds the specified length."""
@@ -15,6 +24,47 @@ def maybe_truncate(content: str, truncate_after: int | None = MAX_RESPONSE_LEN):
     )
 
 
+def spool_dir() -> Path:
+    """The directory this session's oversized outputs are saved in, removed at exit."""
+    global _spool_dir
+    if _spool_dir is None:
+        _spool_dir = Path(tempfile.mkdtemp(prefix="interpreter-spool-"))
+        atexit.register(shutil.rmtree, _spool_dir, ignore_errors=True)
+    return _spool_dir
+
+
+def spool_path(name: str = "output") -> Path:
+    """A new file in the spool directory, which doubles as the handle given to the model."""
+    return spool_dir() / f"{next(_spool_count):04d}-{name}.txt"
+
+
+def spill(content: str, truncate_after: int | None = MAX_RESPONSE_LEN, name="output"):
+    """
+    Like maybe_truncate, for output that can't be produced again cheaply: the
+    full content is saved to the spool directory and the model gets its start
+    and end, plus the path to page through the rest.
+    """
+    if not truncate_after or len(content) <= truncate_after:
+        return content
+    path = spool_path(name)
+    path.write_text(content)
+    head = content[: truncate_after // 2]
+    tail = content[len(content) - (truncate_after - len(head)) :]
+    elided = f"{len(content) - len(head) - len(tail)} characters"
+    return f"{head}\n{SPILLED_MESSAGE.format(elided=elided, path=path)}\n{tail}"
+
+
+def is_spooled(path: Path) -> bool:
+    return _spool_dir is not None and path.parent == _spool_dir
+
+
+def read_lines(path: Path, init_line: int, final_line: int = -1) -> str:
+    """Lines init_line..final_line (1-based, inclusive, -1 for the end) of a file, read lazily."""
+    with open(path, errors="replace") as f:
+        stop = None if final_line == -1 else final_line
+        return "".join(itertools.islice(f, init_line - 1, stop)).removesuffix("\n")
+
+
 async def run(
     cmd: str,
     timeout: float | None = 120.0,  # seconds
@@ -29,8 +79,8 @@ async def run(
         stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
         return (
             process.returncode or 0,
-            maybe_truncate(stdout.decode(), truncate_after=truncate_after),
-            maybe_truncate(stderr.decode(), truncate_after=truncate_after),
+            spill(stdout.decode(), truncate_after=truncate_after, name="stdout"),
+            spill(stderr.decode(), truncate_after=truncate_after, name="stderr"),
         )
     except asyncio.TimeoutError as exc:
         try:
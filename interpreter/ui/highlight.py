@@ -0,0 +1,168 @@
+from functools import lru_cache
+from io import StringIO
+
+from pygments.formatters import Terminal256Formatter
+from pygments.lexer import ExtendedRegexLexer, LexerContext, RegexLexer
+from pygments.lexers import TextLexer, get_lexer_by_name
+from pygments.token import Error, Whitespace, _TokenType
+
+
+@lru_cache(maxsize=None)
+def get_lexer(lang):
+    """Cached lexer for a language name, plain text if it's unknown."""
+    try:
+        return get_lexer_by_name((lang or "").strip().lower())
+    except:
+        return TextLexer()
+
+
+@lru_cache(maxsize=None)
+def get_formatter(style):
+    """Cached terminal formatter for a pygments style."""
+    return Terminal256Formatter(style=style)
+
+
+def format_tokens(tokens, style):
+    """Turn (tokentype, value) pairs into ANSI-colored text."""
+    out = StringIO()
+    get_formatter(style).format(tokens, out)
+    return out.getvalue()
+
+
+class LineHighlighter:
+    """
+    Highlights code one line at a time, carrying the lexer state from line to
+    line. A multi-line string or comment that opens on one line stays a string
+    on the next, so streaming a block line by line colors it the same as
+    highlighting the whole block at once, but every character is lexed once.
+
+    >>> highlighter = LineHighlighter("python")
+    >>> tokens = highlighter.tokenize("x = '''a")
+    >>> highlighter.tokenize("b'''")[0]
+    (Token.Literal.String.Single, 'b')
+    """
+
+    def __init__(self, lang, style="monokai"):
+        self.lexer = get_lexer(lang)
+        self.style = style
+        self.stack = ["root"]
+
+        # The state can only be carried through the stock regex lexing loops,
+        # lexers with their own loop are run on each line separately
+        lexer_type = type(self.lexer)
+        if isinstance(self.lexer, ExtendedRegexLexer):
+            self.mode = "extended"
+        elif (
+            isinstance(self.lexer, RegexLexer)
+            and lexer_type.get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed
+        ):
+            self.mode = "regex"
+        else:
+            self.mode = "line"
+
+    def tokenize(self, line):
+        """Lex one line (without its newline) and return its (tokentype, value) pairs."""
+        text = line.replace("\r", "") + "\n"
+        if self.mode == "regex":
+            tokens = self._lex_regex(text)
+        elif self.mode == "extended":
+            context = LexerContext(text, 0, stack=self.stack)
+            tokens = [
+                (ttype, value)
+                for _, ttype, value in self.lexer.get_tokens_unprocessed(context=context)
+            ]
+            self.stack = context.stack
+        else:
+            tokens = [
+                (ttype, value)
+                for _, ttype, value in self.lexer.get_tokens_unprocessed(text)
+            ]
+
+        # Drop the newline we added, it's written by whoever prints the line
+        if tokens and tokens[-1][1].endswith("\n"):
+            ttype, value = tokens.pop()
+            if value[:-1]:
+                tokens.append((ttype, value[:-1]))
+        return tokens
+
+    def _lex_regex(self, text):
+        # Same as RegexLexer.get_tokens_unprocessed, except the state stack is
+        # kept on self so the next line starts where this one left off
+        lexer = self.lexer
+        tokendefs = lexer._tokens
+        statestack = self.stack
+        statetokens = tokendefs[statestack[-1]]
+        tokens = []
+        pos = 0
+        while True:
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if m:
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            tokens.append((action, m.group()))
+                        else:
+                            tokens.extend(
+                                (ttype, value) for _, ttype, value in action(lexer, m)
+                            )
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == "#pop":
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == "#push":
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == "#push":
+                            statestack.append(statestack[-1])
+                        statetokens = tokendefs[statestack[-1]]
+                    break
+            else:
+                if pos >= len(text):
+                    break
+                if text[pos] == "\n":
+                    # Nothing matched the end of the line, reset state to "root"
+                    statestack[:] = ["root"]
+                    statetokens = tokendefs["root"]
+                    tokens.append((Whitespace, "\n"))
+                else:
+                    tokens.append((Error, text[pos]))
+                pos += 1
+        return tokens
+
+    def format(self, tokens, start=0, end=None):
+        """
+        Format the tokens of a line, or just the [start:end] slice of it, which
+        lets long lines be wrapped after they were highlighted as a whole.
+        """
+        if start or end is not None:
+            tokens = slice_tokens(tokens, start, end)
+        return format_tokens(tokens, self.style)
+
+    def highlight(self, line):
+        """Tokenize and format one line."""
+        return self.format(self.tokenize(line))
+
+
+def slice_tokens(tokens, start, end=None):
+    """The (tokentype, value) pairs covering characters [start:end] of a line."""
+    sliced = []
+    pos = 0
+    for ttype, value in tokens:
+        token_end = pos + len(value)
+        if end is not None and pos >= end:
+            break
+        if token_end > start:
+            sliced.append(
+                (ttype, value[max(start - pos, 0) : None if end is None else end - pos])
+            )
+        pos = token_end
+    return sliced
@@ -1,14 +1,13 @@
 import os
-import sys
 import time
 from enum import Enum, auto
 from typing import Dict, Optional, Set
 
 from pygments import highlight
-from pygments.formatters import Terminal256Formatter
-from pygments.lexers import TextLexer, get_lexer_by_name
 
 from ..misc.spinner import SimpleSpinner
+from .highlight import LineHighlighter, get_formatter, get_lexer
+from .output import output
 
 
 class MarkdownElement(Enum):
@@ -20,6 +19,21 @@ class MarkdownElement(Enum):
     HEADER = "#"
 
 
+def _wrap_spans(line, width):
+    """(start, end) spans of line, word-wrapped to width at spaces."""
+    spans = []
+    start = end = pos = 0
+    for word in line.split(" "):
+        word_end = pos + len(word)
+        if word_end - start > width and end > start:
+            spans.append((start, end))
+            start = pos
+        end = word_end
+        pos = word_end + 1
+    spans.append((start, end))
+    return spans
+
+
 class MarkdownRenderer:
     def __init__(self):
         if os.name == "nt":
@@ -50,6 +64,7 @@ class MarkdownRenderer:
         self.in_code_block = False
         self.current_code_line = ""
         self.line_number = 1
+        self.highlighter = None
 
         # Add spinner (no text, just the spinner)
         self.spinner = SimpleSpinner("")
@@ -57,31 +72,26 @@ class MarkdownRenderer:
     def write_styled(self, text: str, element: Optional[MarkdownElement] = None):
         """Write text with appropriate styling."""
         if element == MarkdownElement.BOLD:
-            sys.stdout.write(f"{self.BOLD}{text}{self.RESET}")
+            output.write(f"{self.BOLD}{text}{self.RESET}")
         elif element == MarkdownElement.CODE:
-            sys.stdout.write(f"{self.CODE}{text}{self.RESET}")
+            output.write(f"{self.CODE}{text}{self.RESET}")
         elif element == MarkdownElement.CODE_BLOCK:
             # Handle single line of code block
-            try:
-                lexer = get_lexer_by_name(self.code_lang.strip().lower())
-            except:
-                lexer = TextLexer()
-            formatter = Terminal256Formatter(style="monokai")
-            formatted = highlight(text + "\n", lexer, formatter)
-            sys.stdout.write(formatted)
-            sys.stdout.flush()
+            formatted = highlight(
+                text + "\n", get_lexer(self.code_lang), get_formatter("monokai")
+            )
+            output.write(formatted)
         elif element == MarkdownElement.LINK:
             # Extract URL from buffer
             url_start = self.buffer.index("](") + 2
             url = self.buffer[url_start:-1]
-            sys.stdout.write(
+            output.write(
                 f"{self.OSC}{url}{self.ST}{self.LINK}{text}{self.RESET}{self.OSC}{self.ST}"
             )
         elif element == MarkdownElement.HEADER:
-            sys.stdout.write(f"{self.BOLD}{text}{self.RESET}")
+            output.write(f"{self.BOLD}{text}{self.RESET}")
         else:
-            sys.stdout.write(text)
-        sys.stdout.flush()
+            output.write(text)
 
     def is_element_complete(self) -> bool:
         """Check if current markdown element is complete."""
@@ -167,17 +177,22 @@ class MarkdownRenderer:
                         # First newline after ``` - this line contains the language
                         self.code_lang = self.current_code_line
                         self.collecting_lang = False
+                        # Lexer state carries from line to line within the block
+                        self.highlighter = LineHighlighter(
+                            self.code_lang,
+                            style=os.getenv("INTERPRETER_CODE_STYLE", "monokai"),
+                        )
                         try:
                             terminal_width = os.get_terminal_size().columns
                         except:
                             terminal_width = int(os.environ.get("TERMINAL_WIDTH", "50"))
-                        sys.stdout.write(
+                        output.write(
                             "\033[38;5;240m\n────┬" + "─" * (terminal_width - 5) + "\n"
                         )  # Top line
-                        sys.stdout.write(
+                        output.write(
                             "\033[38;5;240m    │ " + self.code_lang + "\n"
                         )  # Language line
-                        sys.stdout.write(
+                        output.write(
                             "\033[38;5;240m────┼"
                             + "─" * (terminal_width - 5)
                             + "\033[0m\n"
@@ -186,14 +201,6 @@ class MarkdownRenderer:
                         self.current_code_line = ""
                     else:
                         self.spinner.stop()  # Stop before any output
-                        try:
-                            lexer = get_lexer_by_name(self.code_lang.strip().lower())
-                        except:
-                            lexer = TextLexer()
-                        formatter = Terminal256Formatter(
-                            style=os.getenv("INTERPRETER_CODE_STYLE", "monokai")
-                        )
-
                         try:
                             terminal_width = os.get_terminal_size().columns
                         except:
@@ -205,48 +212,23 @@ class MarkdownRenderer:
                             terminal_width - len(line_prefix) + len("\033[38;5;240m")
                         )  # Adjust for ANSI code
 
+                        # Every line goes through the lexer to keep its state right
+                        tokens = self.highlighter.tokenize(self.current_code_line)
                         if (
                             not self.current_code_line.strip()
                         ):  # Empty or whitespace-only line
-                            sys.stdout.write(f"{line_prefix}\n")
+                            output.write(f"{line_prefix}\n")
                         else:
-                            # Split the original line into words before highlighting
-                            words = self.current_code_line.split(" ")
-                            current_line = ""
-                            first_line = True
-
-                            for word in words:
-                                test_line = (
-                                    current_line + (" " if current_line else "") + word
-                                )
-                                if len(test_line) > content_width:
-                                    # Highlight and write current line
-                                    if first_line:
-                                        formatted = highlight(
-                                            current_line, lexer, formatter
-                                        ).rstrip()
-                                        sys.stdout.write(f"{line_prefix}{formatted}\n")
-                                        first_line = False
-                                    else:
-                                        formatted = highlight(
-                                            current_line, lexer, formatter
-                                        ).rstrip()
-                                        sys.stdout.write(
-                                            f"\033[38;5;240m    │ {formatted}\n"
-                                        )
-                                    current_line = word
-                                else:
-                                    current_line = test_line if current_line else word
-
-                            # Write any remaining content
-                            if current_line:
-                                formatted = highlight(
-                                    current_line, lexer, formatter
+                            # Word-wrap the line after highlighting it as a whole
+                            spans = _wrap_spans(self.current_code_line, content_width)
+                            for i, (start, end) in enumerate(spans):
+                                formatted = self.highlighter.format(
+                                    tokens, start, end
                                 ).rstrip()
-                                if first_line:
-                                    sys.stdout.write(f"{line_prefix}{formatted}\n")
+                                if i == 0:
+                                    output.write(f"{line_prefix}{formatted}\n")
                                 else:
-                                    sys.stdout.write(
+                                    output.write(
                                         f"\033[38;5;240m    │ {formatted}\n"
                                     )
 
@@ -256,28 +238,25 @@ class MarkdownRenderer:
                 elif char == "`" and self.current_code_line.endswith("``"):
                     self.spinner.stop()  # Stop before final output
                     if self.current_code_line[:-2]:
-                        try:
-                            lexer = get_lexer_by_name(self.code_lang.strip().lower())
-                        except:
-                            lexer = TextLexer()
-                        formatter = Terminal256Formatter(style="monokai")
-                        formatted = highlight(
-                            self.current_code_line[:-2], lexer, formatter
+                        if self.highlighter is None:
+                            self.highlighter = LineHighlighter(self.code_lang)
+                        formatted = self.highlighter.highlight(
+                            self.current_code_line[:-2]
                         ).rstrip()
-                        sys.stdout.write(
+                        output.write(
                             f"{str(self.line_number).rjust(4)} │ {formatted}\n"
                         )
                     try:
                         terminal_width = os.get_terminal_size().columns
                     except:
                         terminal_width = int(os.environ.get("TERMINAL_WIDTH", "50"))
-                    sys.stdout.write(
+                    output.write(
                         "\033[38;5;240m────┴" + "─" * (terminal_width - 5) + "\033[0m\n"
                     )
-                    sys.stdout.flush()
                     self.in_code_block = False
                     self.collecting_lang = False
                     self.current_code_line = ""
+                    self.highlighter = None
                     self.current_element = None
                     self.buffer = ""
                 else:
@@ -337,7 +316,7 @@ class MarkdownRenderer:
             self.line_start = char == "\n"
 
     def close(self):
-        pass
+        output.flush()
 
     def reset(self):
         """Reset all state variables to their initial values."""
@@ -350,3 +329,4 @@ class MarkdownRenderer:
         self.collecting_lang = False
         self.in_code_block = False
         self.current_code_line = ""
+        self.highlighter = None
@@ -0,0 +1,145 @@
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+
+
+class TerminalOutput:
+    """
+    Collects everything the renderers write and puts it on the terminal from a
+    background thread, at most `fps` frames a second, with one write and one
+    flush per frame. Writing only appends to the pending frame, so a slow
+    terminal never holds up whoever is producing the output (e.g. the API stream).
+
+    Each frame drains everything that's pending, so the backlog is normally no
+    more than what arrived during one frame. If the terminal stalls (e.g. it's
+    paused with Ctrl-S) the backlog is collapsed into one string every
+    MAX_PARTS writes, so it holds the text but not a deque entry per write.
+    Anything that prints directly (input prompts, tool output) should call
+    flush() first so the order is kept.
+
+    The same thread animates the spinner. Starting and stopping one only flips
+    state, and the spinner is cleared inside the frame, before any content
+    that follows it, so the two never interleave.
+    """
+
+    SPINNER_FRAMES = ["   ", ".  ", ".. ", "..."]
+    SPINNER_INTERVAL = 0.2
+    MAX_PARTS = 1024  # Pending writes kept apart before they're joined
+
+    def __init__(self, fps=60):
+        self.frame_interval = 1 / fps
+        self._parts = deque()  # append/popleft are thread-safe, no lock per write
+        self._parts_lock = threading.Lock()  # Only for taking parts off the front
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # One writer on the terminal at a time
+        self._pending = threading.Event()
+        self._thread = None
+        self._last_frame = 0.0
+
+        # Spinner state, only the most recently started spinner is animated
+        self._spinner = None
+        self._spinner_text = ""
+        self._spinner_index = 0
+        self._spinner_next = 0.0
+        self._spinner_width = 0  # Width of the frame on screen, 0 if not shown
+
+        atexit.register(self.flush)
+
+    def write(self, text):
+        """Queue text for the next frame."""
+        if not text:
+            return
+        self._parts.append(text)
+        if len(self._parts) > self.MAX_PARTS:
+            self._collapse()
+        self._wake()
+
+    def _collapse(self):
+        """Join the pending parts into one, keeping their place in front of newer writes."""
+        with self._parts_lock:
+            parts = self._parts
+            if len(parts) <= self.MAX_PARTS:
+                return  # Another thread got here first, or a frame drained them
+            parts.appendleft("".join([parts.popleft() for _ in range(len(parts))]))
+
+    def start_spinner(self, owner, text=""):
+        """Animate a spinner at the start of the current line until stopped."""
+        self._spinner_text = text
+        self._spinner_index = 0
+        self._spinner_next = 0.0
+        self._spinner = owner
+        self._wake()
+
+    def stop_spinner(self, owner):
+        """Stop owner's spinner, the next frame clears it from the line."""
+        if self._spinner is owner:
+            self._spinner = None
+            self._wake()
+
+    def _wake(self):
+        if not self._pending.is_set():
+            if self._thread is None:
+                self._start()
+            self._pending.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="terminal-output", daemon=True
+                )
+                self._thread.start()
+
+    def flush(self):
+        """Write everything that's pending right now, from the calling thread."""
+        with self._write_lock:
+            with self._parts_lock:
+                parts = self._parts
+                parts = [parts.popleft() for _ in range(len(parts))]
+            spinning = self._spinner is not None
+            now = time.monotonic()
+
+            frame = []
+            if self._spinner_width and (parts or not spinning):
+                # Take the spinner off the line before anything else goes there
+                frame.append("\r" + " " * self._spinner_width + "\r")
+                self._spinner_width = 0
+            frame.extend(parts)
+            if spinning and (now >= self._spinner_next or parts):
+                spinner_frame = self.SPINNER_FRAMES[
+                    self._spinner_index % len(self.SPINNER_FRAMES)
+                ]
+                frame.append("\r" + self._spinner_text + spinner_frame)
+                self._spinner_width = len(self._spinner_text) + len(spinner_frame)
+                if now >= self._spinner_next:
+                    self._spinner_index += 1
+                    self._spinner_next = now + self.SPINNER_INTERVAL
+
+            if frame:
+                # Looked up each time, so redirected/captured stdout is respected
+                sys.stdout.write("".join(frame))
+                sys.stdout.flush()
+            self._last_frame = now
+
+    def _run(self):
+        while True:
+            # While a spinner runs, wake up for its next frame even without output
+            timeout = None
+            if self._spinner is not None:
+                timeout = max(self._spinner_next - time.monotonic(), 0)
+            self._pending.wait(timeout)
+            # Let the rest of the frame's output pile up before writing
+            delay = self._last_frame + self.frame_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._pending.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # e.g. stdout closed during shutdown
+
+
+# Shared by all renderers so their output stays in order
+output = TerminalOutput()
@@ -1,15 +1,13 @@
-import json
 import os
 import random
 import re
-import sys
 
-from pygments import highlight
-from pygments.formatters import Terminal256Formatter
-from pygments.lexers import TextLexer, get_lexer_by_name
 from pygments.styles import get_all_styles
 
+from ..misc.json_stream import JSONStreamParser
 from ..misc.spinner import SimpleSpinner
+from .highlight import LineHighlighter
+from .output import output
 
 
 class ContentRenderer:
@@ -21,7 +19,11 @@ class ContentRenderer:
         self.started = False
         self.style = style
 
-    def feed(self, json_obj):
+    def feed(self, json_obj, delta=""):
+        """
+        Render newly arrived content. json_obj holds the tool name and the
+        arguments completed so far, delta is what was added to this renderer's key.
+        """
         pass
 
     def flush(self):
@@ -33,8 +35,9 @@ class CodeRenderer(ContentRenderer):
         super().__init__(style)
         self.line_number = 1
         self.code_lang = None
+        self.highlighter = None
         self.buffer = ""
-        self.rendered_content = ""
+        self.has_content = False
         self.spinner = SimpleSpinner("")
         self.is_spinning = False
         try:
@@ -57,16 +60,13 @@ class CodeRenderer(ContentRenderer):
             SchemaRenderer.print_separator("┼")
         else:
             SchemaRenderer.print_separator("┴")
-            print()
+            output.write("\n")
 
-    def feed(self, json_obj):
+    def feed(self, json_obj, delta=""):
         self.json_obj = json_obj
 
         if json_obj.get("name") == "bash":
-            content = json_obj.get("command", "")
             self.code_lang = "bash"
-        elif json_obj.get("name") == "str_replace_editor":
-            content = json_obj.get("file_text", "")
 
         if self.code_lang is None:
             # Derive it from path extension
@@ -87,22 +87,25 @@ class CodeRenderer(ContentRenderer):
                 "txt": "text",
             }.get(extension, "text")
 
+        if self.highlighter is None:
+            # One highlighter per block, so lexer state carries across lines
+            self.highlighter = LineHighlighter(self.code_lang, self.style)
+
         # Start spinner if we have content to process
-        if not self.is_spinning and content.strip():
+        if delta.strip():
+            self.has_content = True
+        if not self.is_spinning and self.has_content:
             self.spinner.start()
             self.is_spinning = True
 
-        # Only process the new part of the content
-        if len(content) <= len(self.rendered_content):
+        if not delta:
             return
 
-        # Get only the new content
-        new_content = content[len(self.rendered_content) :]
-        self.buffer += new_content
-        self.rendered_content = content  # Update what we've seen
+        # Only the incomplete last line is buffered
+        self.buffer += delta
 
         # Process complete lines
-        if "\n" in self.buffer:
+        if "\n" in delta:
             lines = self.buffer.split("\n")
             for line in lines[:-1]:
                 if self.is_spinning:
@@ -116,20 +119,17 @@ class CodeRenderer(ContentRenderer):
 
     def _render_line(self, line):
         line = line.encode("utf-8", errors="replace").decode("utf-8")
-        try:
-            lexer = get_lexer_by_name(self.code_lang)
-        except:
-            lexer = TextLexer()
-
-        formatter = Terminal256Formatter(style=self.style)
+        if self.highlighter is None:
+            self.highlighter = LineHighlighter(self.code_lang, self.style)
+        tokens = self.highlighter.tokenize(line)
         available_width = self.terminal_width - self.prefix_width - self.safety_padding
 
         # Remove ANSI escape sequences for width calculation
         line_no_ansi = re.sub(r"\033\[[0-9;]*[a-zA-Z]", "", line)
 
-        # Split long lines before highlighting, accounting for actual visible width
+        # Split long lines after highlighting, accounting for actual visible width
         if len(line_no_ansi) > available_width:
-            chunks = []
+            spans = []
             pos = 0
             chunk_start = 0
             ansi_offset = 0
@@ -138,7 +138,7 @@ class CodeRenderer(ContentRenderer):
                 if pos - chunk_start >= available_width:
                     # Find actual position in original string including ANSI codes
                     real_pos = pos + ansi_offset
-                    chunks.append(line[chunk_start:real_pos])
+                    spans.append((chunk_start, real_pos))
                     chunk_start = real_pos
                 pos += 1
 
@@ -156,34 +156,33 @@ class CodeRenderer(ContentRenderer):
                         break
 
             if chunk_start < len(line):
-                chunks.append(line[chunk_start:])
+                spans.append((chunk_start, len(line)))
         else:
-            chunks = [line]
+            spans = [(0, len(line))]
 
         if self.show_line_numbers:
-            # Highlight and print first chunk with line number
+            # Print first chunk with line number
             line_prefix = f"{SchemaRenderer.GRAY_COLOR}{str(self.line_number).rjust(3)} │ {SchemaRenderer.RESET_COLOR}"
-            highlighted = highlight(chunks[0] + "\n", lexer, formatter).rstrip()
+            highlighted = self.highlighter.format(tokens, *spans[0]).rstrip()
 
             if self.line_number == 0 and highlighted.strip() == "":
                 return
 
-            sys.stdout.write(f"{line_prefix}{highlighted}\n")
+            output.write(f"{line_prefix}{highlighted}\n")
 
             # Print remaining chunks with padding and pipe
             continuation_prefix = (
                 f"{SchemaRenderer.GRAY_COLOR}    │ {SchemaRenderer.RESET_COLOR}"
             )
-            for chunk in chunks[1:]:
-                highlighted = highlight(chunk + "\n", lexer, formatter).rstrip()
-                sys.stdout.write(f"{continuation_prefix}{highlighted}\n")
+            for start, end in spans[1:]:
+                highlighted = self.highlighter.format(tokens, start, end).rstrip()
+                output.write(f"{continuation_prefix}{highlighted}\n")
         else:
             # Print chunks without line numbers
-            for chunk in chunks:
-                highlighted = highlight(chunk + "\n", lexer, formatter).rstrip()
-                sys.stdout.write(f"{highlighted}\n")
+            for start, end in spans:
+                highlighted = self.highlighter.format(tokens, start, end).rstrip()
+                output.write(f"{highlighted}\n")
 
-        sys.stdout.flush()
         self.line_number += 1
 
     def flush(self):
@@ -199,7 +198,7 @@ class CodeRenderer(ContentRenderer):
         if self.show_line_numbers:
             SchemaRenderer.print_separator("┴", newline=False)
         else:
-            print()
+            output.write("\n")
             SchemaRenderer.print_separator("─", newline=False)
 
 
@@ -212,23 +211,14 @@ class PathRenderer(ContentRenderer):
         self.last_printed_pos = 0
         self.diverged = False
 
-    def feed(self, json_obj):
+    def feed(self, json_obj, delta=""):
         self.json_obj = json_obj
 
-        if json_obj.get("name") == "computer":
-            if "coordinate" in json_obj:
-                content = json_obj.get("coordinate", "")
-            elif "text" in json_obj:
-                content = json_obj.get("text", "")
-        else:
-            content = json_obj.get("path", "")
-
-        content = str(content)
+        # Coordinates arrive as one complete list, paths and text as string deltas
+        content = str(delta)
 
         # Process each new character
-        while self.last_printed_pos < len(content):
-            curr_char = content[self.last_printed_pos]
-
+        for curr_char in content:
             # If we haven't diverged yet, check if we're still matching cwd
             if not self.diverged:
                 if (
@@ -237,22 +227,21 @@ class PathRenderer(ContentRenderer):
                 ):
                     # We just diverged - print everything from start
                     self.diverged = True
-                    sys.stdout.write(content[: self.last_printed_pos + 1])
+                    output.write(self.cwd[: self.last_printed_pos] + curr_char)
                 elif self.last_printed_pos >= len(self.cwd):
                     # We're past cwd - print just this character
-                    sys.stdout.write(curr_char)
+                    output.write(curr_char)
             else:
                 # Already diverged - print each new character
-                sys.stdout.write(curr_char)
+                output.write(curr_char)
 
-            sys.stdout.flush()
             self.last_printed_pos += 1
 
     def close(self):
         self.flush()
         if self.json_obj and (
             self.json_obj.get("command") == "view"
-            or self.json_obj.get("name") == "computer"
+            or self.json_obj.get("name") in ("computer", "computer_extras")
         ):
             SchemaRenderer.print_separator("┴", newline=True)
 
@@ -275,6 +264,10 @@ class CommandRenderer(ContentRenderer):
         "double_click": "⊛",
         "screenshot": "⚆",
         "cursor_position": "⊹",
+        "zoom": "⊕",
+        "sequence": "≡",
+        "save": "⊞",
+        "locate": "⌖",
         "Tia Interpreter": "●",
     }
 
@@ -285,38 +278,31 @@ class CommandRenderer(ContentRenderer):
         self.rendered_commands = set()  # Track complete commands we've rendered
         self.json_obj = None
 
-    def feed(self, json_obj):
+    def feed(self, json_obj, delta=""):
         self.json_obj = json_obj
-        if json_obj.get("name") == "bash":
-            content = json_obj.get("name", "")
-        elif json_obj.get("name") == "str_replace_editor":
-            content = json_obj.get("command", "")
-        elif json_obj.get("name") == "computer":
-            content = json_obj.get("action", "")
+
+        # Buffer the content
+        self.buffer += delta
+        content = self.buffer
 
         # If we've already rendered this complete command, skip
         if content in self.rendered_commands:
             return
 
-        # Buffer the content
-        self.buffer = content
-
         # If this is a complete command (matches one of our icons), render it
         if content.strip() in self.ICONS:
             icon = self.ICONS.get(content.strip(), "•")
             ICON_COLOR = "\033[37m"  # White color
-            sys.stdout.write(
+            output.write(
                 f"{SchemaRenderer.GRAY_COLOR}  {ICON_COLOR}{icon}\033[0m{SchemaRenderer.GRAY_COLOR} │ {content}{SchemaRenderer.RESET_COLOR} "
             )
-            sys.stdout.flush()
             self.rendered_commands.add(content)
-            self.buffer = ""
 
     def flush(self):
         pass  # No need to flush since we render when we get a complete command
 
     def close(self):
-        if self.json_obj and self.json_obj.get("name") == "computer":
+        if self.json_obj and self.json_obj.get("name") in ("computer", "computer_extras"):
             if set(self.json_obj.keys()) == {"name", "action"}:
                 SchemaRenderer.print_separator("┴", newline=True)
 
@@ -333,10 +319,10 @@ class InsertRenderer(ContentRenderer):
         self.context_style = "bw"
         self.showed_after_context = False
         self.line_number = 1
-        self.rendered_content = ""
         self.is_spinning = False
         self.spinner = SimpleSpinner("")
         self.code_lang = "python"
+        self.highlighter = LineHighlighter(self.code_lang, self.style)
         self.buffer = ""
         try:
             self.terminal_width = os.get_terminal_size().columns
@@ -372,9 +358,8 @@ class InsertRenderer(ContentRenderer):
 
         return 1  # Default to first line if neither specified
 
-    def feed(self, json_obj):
+    def feed(self, json_obj, delta=""):
         path = json_obj.get("path", "")
-        content = json_obj.get("new_str", "")
 
         # Initialize context if needed
         if not self.showed_context:
@@ -411,16 +396,12 @@ class InsertRenderer(ContentRenderer):
             self.showed_context = True
 
         # Process the new content
-        if len(content) <= len(self.rendered_content):
+        if not delta:
             return
-
-        # Get only the new content
-        new_content = content[len(self.rendered_content) :]
-        self.buffer += new_content
-        self.rendered_content = content
+        self.buffer += delta
 
         # Process complete lines
-        if "\n" in self.buffer:
+        if "\n" in delta:
             lines = self.buffer.split("\n")
             # Render complete lines
             for line in lines[:-1]:
@@ -434,14 +415,9 @@ class InsertRenderer(ContentRenderer):
             self.buffer = lines[-1]
 
     def _render_line(self, line, is_context=False):
-        try:
-            lexer = get_lexer_by_name(self.code_lang)
-        except:
-            lexer = TextLexer()
-
         available_width = self.terminal_width - self.prefix_width - self.safety_padding
 
-        # Split long lines before highlighting/formatting
+        # Split long lines, new content is highlighted as a whole line first
         if len(line) > available_width:
             chunks = [
                 line[i : i + available_width]
@@ -449,6 +425,8 @@ class InsertRenderer(ContentRenderer):
             ]
         else:
             chunks = [line]
+        if not is_context:
+            tokens = self.highlighter.tokenize(line)
 
         # Prepare first line prefix
         if is_context:
@@ -463,22 +441,25 @@ class InsertRenderer(ContentRenderer):
                 f"{SchemaRenderer.GRAY_COLOR}{chunks[0]}{SchemaRenderer.RESET_COLOR}"
             )
         else:
-            formatter = Terminal256Formatter(style=self.style)
-            highlighted = highlight(chunks[0] + "\n", lexer, formatter).rstrip()
-        sys.stdout.write(f"{line_prefix}{highlighted}\n")
+            highlighted = self.highlighter.format(
+                tokens, 0, len(chunks[0])
+            ).rstrip()
+        output.write(f"{line_prefix}{highlighted}\n")
 
         # Print remaining chunks with padding and pipe
         continuation_prefix = f"{line_number_color}    │ {SchemaRenderer.RESET_COLOR}"
-        for chunk in chunks[1:]:
+        for i, chunk in enumerate(chunks[1:], start=1):
             if is_context:
                 highlighted = (
                     f"{SchemaRenderer.GRAY_COLOR}{chunk}{SchemaRenderer.RESET_COLOR}"
                 )
             else:
-                highlighted = highlight(chunk + "\n", lexer, formatter).rstrip()
-            sys.stdout.write(f"{continuation_prefix}{highlighted}\n")
+                start = i * available_width
+                highlighted = self.highlighter.format(
+                    tokens, start, start + len(chunk)
+                ).rstrip()
+            output.write(f"{continuation_prefix}{highlighted}\n")
 
-        sys.stdout.flush()
         self.line_number += 1
 
     def flush(self):
@@ -512,7 +493,7 @@ class OldStrRenderer(ContentRenderer):
         SchemaRenderer.print_separator("┼")
         self.RED_COLOR = "\033[39m\033[38;5;204m"  # Monokai red
         self.RESET_COLOR = "\033[0m"
-        self.rendered_content = ""
+        self.content_parts = []  # Everything received, joined only when needed
         self.line_number = 1
         self.code_lang = "python"
         try:
@@ -544,7 +525,7 @@ class OldStrRenderer(ContentRenderer):
                     for i, line in enumerate(lines_before):
                         line_num = start_line + i
                         prefix = f"{SchemaRenderer.GRAY_COLOR}{str(line_num).rjust(3)} │ {SchemaRenderer.RESET_COLOR}"
-                        sys.stdout.write(
+                        output.write(
                             f"{prefix}{SchemaRenderer.GRAY_COLOR}{line}{SchemaRenderer.RESET_COLOR}\n"
                         )
                     self.line_number = self.found_line_number
@@ -554,21 +535,18 @@ class OldStrRenderer(ContentRenderer):
         except:
             self.found_line_number = 1
 
-    def feed(self, json_obj):
-        content = json_obj.get("old_str", "")
+    def feed(self, json_obj, delta=""):
         self.path = json_obj.get("path", "")
 
-        if len(content) <= len(self.rendered_content):
+        if not delta:
             return
 
-        # Get only the new content
-        new_content = content[len(self.rendered_content) :]
-        self.buffer += new_content
-        self.rendered_content = content
+        self.buffer += delta
+        self.content_parts.append(delta)
 
         # If this is our first content, find the line number
         if self.found_line_number is None:
-            self._find_line_number(content, self.path)
+            self._find_line_number("".join(self.content_parts), self.path)
 
         # Process complete lines
         if "\n" in self.buffer and self.found_line_number is not None:
@@ -580,14 +558,9 @@ class OldStrRenderer(ContentRenderer):
             self.buffer = lines[-1]
 
     def _render_line(self, line):
-        try:
-            lexer = get_lexer_by_name(self.code_lang)
-        except:
-            lexer = TextLexer()
-
         available_width = self.terminal_width - self.prefix_width - self.safety_padding
 
-        # Split long lines before highlighting
+        # Split long lines
         if len(line) > available_width:
             chunks = [
                 line[i : i + available_width]
@@ -598,7 +571,7 @@ class OldStrRenderer(ContentRenderer):
 
         # Render first chunk with line number
         line_prefix = f"{SchemaRenderer.GRAY_COLOR}{str(self.line_number).rjust(3)} │ {SchemaRenderer.RESET_COLOR}"
-        sys.stdout.write(
+        output.write(
             f"{line_prefix}{self.RED_COLOR}\033[9m{chunks[0]}\033[29m{self.RESET_COLOR}\n"
         )
 
@@ -607,11 +580,10 @@ class OldStrRenderer(ContentRenderer):
             f"{SchemaRenderer.GRAY_COLOR}    │ {SchemaRenderer.RESET_COLOR}"
         )
         for chunk in chunks[1:]:
-            sys.stdout.write(
+            output.write(
                 f"{continuation_prefix}{self.RED_COLOR}\033[9m{chunk}\033[29m{self.RESET_COLOR}\n"
             )
 
-        sys.stdout.flush()
         self.line_number += 1
 
     def flush(self):
@@ -621,12 +593,12 @@ class OldStrRenderer(ContentRenderer):
 
     def close(self):
         # Try to find line number one last time if we haven't found it yet
-        if self.found_line_number is None and self.rendered_content and self.path:
-            self._find_line_number(self.rendered_content, self.path)
+        if self.found_line_number is None and self.content_parts and self.path:
+            self._find_line_number("".join(self.content_parts), self.path)
 
         self.flush()
         if self.found_line_number is None:
-            print("No line number found")
+            output.write("No line number found\n")
 
 
 class SchemaRenderer:
@@ -640,15 +612,15 @@ class SchemaRenderer:
         except:
             terminal_width = int(os.environ.get("TERMINAL_WIDTH", "50"))
         if newline:
-            sys.stdout.write("\n")
+            output.write("\n")
         if line:
-            sys.stdout.write(
+            output.write(
                 f"{SchemaRenderer.GRAY_COLOR}────{char}"
                 + "─" * (terminal_width - 5)
                 + f"{SchemaRenderer.RESET_COLOR}\n"
             )
         else:
-            sys.stdout.write(
+            output.write(
                 f"{SchemaRenderer.GRAY_COLOR}    {char}{SchemaRenderer.RESET_COLOR}\n"
             )
 
@@ -669,98 +641,42 @@ class SchemaRenderer:
         "action": {"renderer": CommandRenderer},
         "text": {"renderer": PathRenderer},
         "coordinate": {"renderer": PathRenderer},
+        "region": {"renderer": PathRenderer},
+        "actions": {"renderer": PathRenderer},
+        "label": {"renderer": PathRenderer},
     }
 
 
 class ToolRenderer:
     def __init__(self, name=None):
         self.current_renderers = {}
-        self.partial_json = ""
+        self.parser = JSONStreamParser()
+        self.keys_seen = {}  # Arguments that have started, in order of arrival
         self.code_style = random.choice(list(get_all_styles()))
         self.code_style = "monokai"  # bw
         # print("Style:", self.code_style)
         self.current_schema = None
-        self.current_json = None  # Store the current parsed JSON state
         self.name = name
 
-    def _parse_json(self, json_chunk):
-        # Add new chunk to existing buffer
-        self.partial_json += json_chunk
-
-        # Try to parse the complete buffer first
-        try:
-            result = json.loads(self.partial_json)
-            self.current_json = result  # Store the current state
-            # Only clear buffer if we successfully parsed the entire thing
-            if result.get("end", False):
-                self.partial_json = ""
-            return result
-        except:
-            pass
-
-        # Rest of the method remains the same for handling incomplete JSON
-        new_s = ""
-        stack = []
-        is_inside_string = False
-        escaped = False
-
-        # Process each character in the string one at a time.
-        for char in self.partial_json:
-            if is_inside_string:
-                if char == '"' and not escaped:
-                    is_inside_string = False
-                elif char == "\n" and not escaped:
-                    char = (
-                        "\\n"  # Replace the newline character with the escape sequence.
-                    )
-                elif char == "\\":
-                    escaped = not escaped
-                else:
-                    escaped = False
-            else:
-                if char == '"':
-                    is_inside_string = True
-                    escaped = False
-                elif char == "{":
-                    stack.append("}")
-                elif char == "[":
-                    stack.append("]")
-                elif char == "}" or char == "]":
-                    if stack and stack[-1] == char:
-                        stack.pop()
-                    else:
-                        # Mismatched closing character; the input is malformed.
-                        return None
-
-            # Append the processed character to the new string.
-            new_s += char
-
-        # If we're still inside a string at the end of processing, we need to close the string.
-        if is_inside_string:
-            new_s += '"'
-
-        # Close any remaining open structures in the reverse order that they were opened.
-        for closing_char in reversed(stack):
-            new_s += closing_char
-
-        # Attempt to parse the modified string as JSON.
-        try:
-            result = json.loads(new_s)
-            self.current_json = result  # Store the current state
-            # Only clear buffer if we successfully parsed a complete message
-            if result.get("end", False):
-                self.partial_json = ""
-            return result
-        except:
-            # Don't print the failure message since it's expected for incomplete JSON
-            return None
+    @property
+    def current_json(self):
+        """The tool arguments parsed so far (complete values only)."""
+        return self.parser.value
 
     def feed(self, chunk):
-        json_obj = self._parse_json(chunk)
-        if not json_obj:
+        try:
+            events = self.parser.feed(chunk)
+        except ValueError:
+            # Malformed arguments, there's nothing sensible left to render
+            return
+        if not events:
             return
 
-        json_obj["name"] = self.name  # Pass name into renderers
+        # Pass name into renderers, alongside the arguments so far. Values that are
+        # still streaming only reach renderers as deltas, so they're blank here
+        for key, _ in events:
+            self.keys_seen.setdefault(key, "")
+        json_obj = {**self.keys_seen, **(self.parser.value or {}), "name": self.name}
 
         # Process the JSON object
         schemas = []
@@ -768,22 +684,32 @@ class ToolRenderer:
             schemas = SchemaRenderer.edit_schemas.items()
         elif self.name == "bash":
             schemas = SchemaRenderer.bash_schemas.items()
-        elif self.name == "computer":
+        elif self.name in ("computer", "computer_extras"):
             schemas = SchemaRenderer.computer_schemas.items()
 
-        for schema_type, schema in schemas:
-            if schema_type in json_obj:
-                # If this is a new schema type, initialize it
-                if schema_type not in self.current_renderers:
-                    # Close any existing renderers
-                    self.close()
-                    # Initialize the new renderer
-                    self.current_renderers[schema_type] = schema["renderer"](
-                        self.code_style
+        for key, delta in events:
+            for schema_type, schema in schemas:
+                if schema_type in self.current_renderers:
+                    # Only the renderer of the key that changed has new content
+                    self.current_renderers[schema_type].feed(
+                        json_obj, delta if schema_type == key else ""
                     )
+                    continue
 
-                # Feed the entire JSON object to the renderer
-                self.current_renderers[schema_type].feed(json_obj)
+                if schema_type == key:
+                    initial = delta
+                elif schema_type == "name" and self.name:
+                    initial = self.name  # Not one of the arguments, render it up front
+                else:
+                    continue
+
+                # This is a new schema type, close any existing renderers
+                self.close()
+                # Initialize the new renderer
+                self.current_renderers[schema_type] = schema["renderer"](
+                    self.code_style
+                )
+                self.current_renderers[schema_type].feed(json_obj, initial)
 
     def close(self):
         # Close any remaining content
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import re
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from interpreter.tools import bash
+from interpreter.tools.bash import BashTool
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="needs /bin/bash")
+
+
+def run(tool, *commands, **kwargs):
+    """Run commands one after another on tool, then stop its shells."""
+
+    async def main():
+        try:
+            return [await tool(command=command, **kwargs) for command in commands]
+        finally:
+            for session in [tool._session, *tool._pool]:
+                if session and session._process:
+                    session.stop()
+                    await session._process.wait()
+
+    return asyncio.run(main())
+
+
+def make_tool(**settings):
+    # Settings the tool reads off the interpreter
+    return BashTool(SimpleNamespace(**settings))
+
+
+def test_output_and_exit_code():
+    (result,) = run(make_tool(), "echo hello; (exit 7)")
+    assert result.output == "hello\n\n(exit code 7)"
+
+
+def test_sentinel_split_across_reads(monkeypatch):
+    # One byte per read, so the sentinel always arrives in pieces
+    monkeypatch.setattr(bash, "READ_SIZE", 1)
+    ok, failed = run(make_tool(), "printf '<<exit-not-it\\n'; echo done", "false")
+    assert ok.output == "<<exit-not-it\ndone"
+    assert failed.output == "<No output>\n\n(exit code 1)"
+
+
+def test_stderr_is_merged_in_order():
+    (result,) = run(make_tool(), "echo one; echo two >&2; echo three")
+    assert result.output == "one\ntwo\nthree"
+
+
+def test_timeout_interrupts_the_command(monkeypatch):
+    monkeypatch.setattr(bash, "INTERRUPT_GRACE", 0.5)
+    tool = make_tool()
+    start = time.monotonic()
+    slow, after = run(tool, "cd /tmp; echo started; sleep 30", "pwd", timeout=0.3)
+    assert time.monotonic() - start < 5
+    # bash may add its own "Terminated" note
+    assert slow.output.startswith("started\n")
+    assert slow.output.endswith("\n\n(command timed out after 0.3s and was interrupted)")
+    # Same shell, the cd is still in effect
+    assert after.output == "/tmp"
+
+
+def test_timeout_escalates_to_sigkill(monkeypatch):
+    monkeypatch.setattr(bash, "INTERRUPT_GRACE", 0.5)
+    ignores_term = (
+        "python3 -c 'import signal, time; "
+        "signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)'"
+    )
+    start = time.monotonic()
+    slow, after = run(make_tool(), ignores_term, "echo still here", timeout=0.3)
+    assert time.monotonic() - start < 5
+    assert "was interrupted" in slow.output
+    assert after.output == "still here"
+
+
+def test_timeout_restarts_a_stuck_shell(monkeypatch):
+    monkeypatch.setattr(bash, "INTERRUPT_GRACE", 0.5)
+    tool = make_tool()
+    # A loop of builtins has no process of its own to signal
+    (stuck,) = run(tool, "cd /tmp; while :; do :; done", timeout=0.3)
+    assert "the shell had to be restarted" in stuck.output
+    (after,) = run(tool, "echo fresh", timeout=5)
+    assert after.output == "fresh"
+
+
+def test_long_output_keeps_head_and_tail_and_spools_the_rest():
+    (result,) = run(make_tool(bash_output_limit=100), "seq 1 1000")
+    full = "".join(f"{i}\n" for i in range(1, 1001))
+    assert result.output.startswith("1\n2\n3\n")
+    assert result.output.endswith("\n999\n1000")
+    assert "bytes of the output were left out" in result.output
+    path = re.search(r"The full output is saved at (\S+)\. ", result.output).group(1)
+    with open(path) as spooled:
+        assert spooled.read() == full
+
+
+def test_short_output_is_not_spooled():
+    (result,) = run(make_tool(bash_output_limit=100), "seq 1 10")
+    assert result.output == "\n".join(str(i) for i in range(1, 11))
+
+
+def test_pty_session_is_a_terminal():
+    (result,) = run(make_tool(bash_pty=True), "test -t 1 && echo terminal; (exit 2)")
+    assert result.output == "terminal\n\n(exit code 2)"
+
+
+def test_pty_scrollback_keeps_the_last_lines():
+    tool = make_tool(bash_pty=True, bash_scrollback=50, bash_output_limit=100_000)
+    (result,) = run(tool, "seq 1 500")
+    lines = result.output.split("\n")
+    # Older lines scrolled out of the terminal's history
+    assert "earlier lines scrolled out" in lines[0]
+    assert lines[-1] == "500"
+    assert lines[1:] == [str(i) for i in range(501 - len(lines[1:]), 501)]
+    assert len(lines[1:]) >= 50
+
+
+def test_finished_background_job_is_reaped_with_its_exit_code():
+    tool = BashTool(None)
+    (started,) = run(tool, "echo working; exit 3 &")
+    pid = int(re.search(r"pid (\d+)", started.output).group(1))
+    (job,) = tool._jobs.values()
+    # Wait for it to finish without reaping it
+    os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+    assert job.exit_path.read_text() == "3\n"
+    assert job.log_path.read_text() == "working\n"
+    assert str(job.exit_path) in started.output
+
+    # The next command reaps it, so the model's `kill -0` sees it's gone
+    (check,) = run(tool, f"kill -0 {pid} 2>/dev/null; echo $?")
+    assert check.output.strip() == "1"
+    assert tool._jobs == {}
+
+
+def test_killed_background_job_has_no_exit_code():
+    tool = BashTool(None)
+    (started,) = run(tool, "sleep 30 &")
+    pid = int(re.search(r"pid (\d+)", started.output).group(1))
+    (job,) = tool._jobs.values()
+    run(tool, f"kill -- -{pid}")
+    assert job.process.wait(timeout=5) < 0
+    assert not job.exit_path.exists()
@@ -0,0 +1,91 @@
+import asyncio
+
+from interpreter.tools.base import BaseAnthropicTool, ToolResult
+from interpreter.tools.collection import ToolCollection
+
+
+class FakeTool(BaseAnthropicTool):
+    """Sleeps for the call's `delay`, noting in log when each call starts and finishes."""
+
+    def __init__(self, name, log, max_concurrency=None):
+        self.name = name
+        self.log = log
+        self.max_concurrency = max_concurrency
+
+    async def __call__(self, id, delay=0.0, exclusive=False):
+        self.log.append(("start", id))
+        await asyncio.sleep(delay)
+        self.log.append(("finish", id))
+        return ToolResult(output=id)
+
+    def is_exclusive(self, tool_input):
+        return tool_input.get("exclusive", False)
+
+    def to_params(self):
+        return {"name": self.name}
+
+
+def run_many(tools, calls):
+    collection = ToolCollection(*tools)
+    return asyncio.run(collection.run_many(calls))
+
+
+def test_results_come_back_in_call_order():
+    log = []
+    results = run_many(
+        [FakeTool("fake", log)],
+        [("fake", {"id": "slow", "delay": 0.05}), ("fake", {"id": "fast"})],
+    )
+    assert [result.output for result in results] == ["slow", "fast"]
+    # They overlapped, the fast one finished first
+    assert log == [("start", "slow"), ("start", "fast"), ("finish", "fast"), ("finish", "slow")]
+
+
+def test_unknown_tool_fails_in_its_place():
+    results = run_many([FakeTool("fake", [])], [("nope", {}), ("fake", {"id": "a"})])
+    assert results[0].error == "Tool nope is invalid"
+    assert results[1].output == "a"
+
+
+def test_exclusive_call_is_a_barrier():
+    log = []
+    results = run_many(
+        [FakeTool("fake", log)],
+        [
+            ("fake", {"id": "a", "delay": 0.03}),
+            ("fake", {"id": "b", "delay": 0.01}),
+            ("fake", {"id": "x", "delay": 0.01, "exclusive": True}),
+            ("fake", {"id": "c"}),
+            ("fake", {"id": "d"}),
+        ],
+    )
+    assert [result.output for result in results] == ["a", "b", "x", "c", "d"]
+    # Everything before x is done before it starts, nothing after it starts before it's done
+    assert log[:4] == [("start", "a"), ("start", "b"), ("finish", "b"), ("finish", "a")]
+    assert log[4:6] == [("start", "x"), ("finish", "x")]
+    assert sorted(log[6:]) == [("finish", "c"), ("finish", "d"), ("start", "c"), ("start", "d")]
+
+
+def test_max_concurrency_of_one_runs_a_tools_calls_in_order():
+    log = []
+    results = run_many(
+        [FakeTool("serial", log, max_concurrency=1), FakeTool("free", log)],
+        [
+            ("serial", {"id": "s1", "delay": 0.03}),
+            ("serial", {"id": "s2", "delay": 0.01}),
+            ("free", {"id": "f", "delay": 0.01}),
+            ("serial", {"id": "s3"}),
+        ],
+    )
+    assert [result.output for result in results] == ["s1", "s2", "f", "s3"]
+    serial = [event for event in log if event[1].startswith("s")]
+    assert serial == [
+        ("start", "s1"),
+        ("finish", "s1"),
+        ("start", "s2"),
+        ("finish", "s2"),
+        ("start", "s3"),
+        ("finish", "s3"),
+    ]
+    # The other tool didn't wait for them
+    assert log.index(("start", "f")) < log.index(("finish", "s1"))
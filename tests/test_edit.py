@@ -0,0 +1,187 @@
+import asyncio
+import random
+
+import pytest
+
+from interpreter.tools import edit_history, large_file
+from interpreter.tools.base import ToolError
+from interpreter.tools.edit import EditTool
+
+
+def run(tool, **kwargs):
+    return asyncio.run(tool(**kwargs))
+
+
+@pytest.fixture(params=["text", "mapped"])
+def mode(request, monkeypatch):
+    # "mapped" makes every file count as large, so plain files are edited
+    # through mmap instead of being read whole
+    if request.param == "mapped":
+        monkeypatch.setattr(large_file, "LARGE_FILE_SIZE", 1)
+    return request.param
+
+
+def edit_and_undo(path, edits):
+    """Apply (command, kwargs) edits, undo all of them and return the file after each step."""
+    tool = EditTool(None)
+    states = [path.read_bytes()]
+    for command, kwargs in edits:
+        run(tool, command=command, path=str(path), **kwargs)
+        states.append(path.read_bytes())
+    undone = []
+    for _ in edits:
+        run(tool, command="undo_edit", path=str(path))
+        undone.append(path.read_bytes())
+    return states, undone
+
+
+EDITS = [
+    ("str_replace", {"old_str": "line 3\n", "new_str": "third line\nand more\n"}),
+    ("insert", {"insert_line": 0, "new_str": "header"}),
+    ("str_replace", {"old_str": "line 7\nline 8\n", "new_str": ""}),
+    ("insert", {"insert_line": 5, "new_str": "middle"}),
+    ("str_replace", {"old_str": "line 9", "new_str": "last"}),
+]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "\n".join(f"line {i}" for i in range(10)),
+        "\n".join(f"line {i}" for i in range(10)) + "\n",
+        "\n".join(f"\tline {i}\tx" if i in (1, 5) else f"line {i}" for i in range(10)),
+        "\r\n".join(f"line {i}" for i in range(10)) + "\r\n",
+        "\r\n".join(f"\tline {i}" if i == 4 else f"line {i}" for i in range(10)),
+    ],
+    ids=["plain", "trailing-newline", "tabs", "crlf", "crlf-and-tabs"],
+)
+def test_undo_restores_every_step(tmp_path, mode, content):
+    path = tmp_path / "file.txt"
+    path.write_bytes(content.encode())
+    states, undone = edit_and_undo(path, EDITS)
+    # Each undo gives back the file exactly as it was before that edit,
+    # including tabs and line endings the edit rewrote
+    assert undone == states[-2::-1]
+
+
+def test_random_edits_round_trip(tmp_path, mode):
+    rng = random.Random(0)
+    path = tmp_path / "file.txt"
+    words = ["alpha", "beta", "gamma", "delta", "\tindented", ""]
+    lines = [f"{i} {rng.choice(words)}" for i in range(200)]
+    path.write_bytes("\n".join(lines).encode())
+
+    edits = []
+    for step in range(30):
+        if rng.random() < 0.5:
+            line = rng.randrange(200)
+            old_str, new_str = f"\n{line} ", f"\n{line} edited {step} "
+            edits.append(("str_replace", {"old_str": old_str, "new_str": new_str}))
+        else:
+            insert_line = rng.randrange(150)
+            edits.append(("insert", {"insert_line": insert_line, "new_str": f"new {step}"}))
+
+    # Edits whose old_str an earlier edit already replaced are skipped
+    tool = EditTool(None)
+    states = [path.read_bytes()]
+    for command, kwargs in edits:
+        try:
+            run(tool, command=command, path=str(path), **kwargs)
+        except ToolError:
+            continue
+        states.append(path.read_bytes())
+    for expected in states[-2::-1]:
+        run(tool, command="undo_edit", path=str(path))
+        assert path.read_bytes() == expected
+
+
+def test_undo_create(tmp_path):
+    path = tmp_path / "new.txt"
+    tool = EditTool(None)
+    run(tool, command="create", path=str(path), file_text="hello\n")
+    run(tool, command="str_replace", path=str(path), old_str="hello", new_str="bye")
+    run(tool, command="undo_edit", path=str(path))
+    run(tool, command="undo_edit", path=str(path))
+    assert path.read_text() == "hello\n"
+    with pytest.raises(ToolError, match="No edit history"):
+        run(tool, command="undo_edit", path=str(path))
+
+
+def test_undo_keeps_changes_made_elsewhere(tmp_path, mode):
+    path = tmp_path / "file.txt"
+    path.write_text("one\ntwo\nthree\n")
+    tool = EditTool(None)
+    run(tool, command="str_replace", path=str(path), old_str="two", new_str="TWO")
+    # Something else adds lines before and after the edit
+    path.write_text("zero\none\nTWO\nthree\nfour\n")
+    run(tool, command="undo_edit", path=str(path))
+    assert path.read_text() == "zero\none\ntwo\nthree\nfour\n"
+
+
+def test_undo_refuses_when_the_edit_itself_changed(tmp_path, mode):
+    path = tmp_path / "file.txt"
+    path.write_text("one\ntwo\nthree\n")
+    tool = EditTool(None)
+    run(tool, command="str_replace", path=str(path), old_str="two", new_str="TWO")
+    path.write_text("one\nTW0\nthree\n")
+    with pytest.raises(ToolError, match="can't be undone"):
+        run(tool, command="undo_edit", path=str(path))
+    # The history is kept, the edit can be undone once it's back
+    path.write_text("one\nTWO\nthree\n")
+    run(tool, command="undo_edit", path=str(path))
+    assert path.read_text() == "one\ntwo\nthree\n"
+
+
+def test_undo_refuses_when_the_edit_is_in_two_places(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("a\nb\n")
+    tool = EditTool(None)
+    run(tool, command="str_replace", path=str(path), old_str="b", new_str="B")
+    path.write_text("x\na\nB\na\nB\n")
+    with pytest.raises(ToolError, match="can't be undone"):
+        run(tool, command="undo_edit", path=str(path))
+
+
+def test_history_cap_drops_oldest_edits(tmp_path, monkeypatch):
+    monkeypatch.setattr(edit_history, "MAX_FILE_HISTORY", 4000)
+    monkeypatch.setattr(edit_history, "COMPRESS_MIN_SIZE", 10**9)
+    path = tmp_path / "file.txt"
+    path.write_text("a" * 10)
+    tool = EditTool(None)
+    for i in range(10):
+        old_str = path.read_text()
+        run(tool, command="str_replace", path=str(path), old_str=old_str, new_str=str(i) * 1000)
+    history = tool._file_history
+    assert history.memory <= 4000
+    dropped = history.dropped(path)
+    assert 0 < dropped < 10
+
+    for i in reversed(range(dropped, 10)):
+        run(tool, command="undo_edit", path=str(path))
+        assert path.read_text() == (str(i - 1) * 1000 if i else "a" * 10)
+    with pytest.raises(ToolError, match=f"its {dropped} oldest edits were dropped"):
+        run(tool, command="undo_edit", path=str(path))
+
+
+def test_history_cap_spills_to_disk(tmp_path, monkeypatch):
+    class Settings:
+        edit_history_spill = True
+
+    monkeypatch.setattr(edit_history, "MAX_FILE_HISTORY", 4000)
+    monkeypatch.setattr(edit_history, "COMPRESS_MIN_SIZE", 10**9)
+    monkeypatch.setattr(edit_history, "spool_dir", lambda: tmp_path / "spool")
+    (tmp_path / "spool").mkdir()
+    path = tmp_path / "file.txt"
+    path.write_text("a" * 10)
+    tool = EditTool(Settings())
+    for i in range(10):
+        old_str = path.read_text()
+        run(tool, command="str_replace", path=str(path), old_str=old_str, new_str=str(i) * 1000)
+    assert tool._file_history.disk > 0
+    assert tool._file_history.dropped(path) == 0
+
+    for _ in range(10):
+        run(tool, command="undo_edit", path=str(path))
+    assert path.read_text() == "a" * 10
+    # Spilled edits are deleted once they're undone
+    assert not any((tmp_path / "spool" / "undo").iterdir())
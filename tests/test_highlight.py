@@ -0,0 +1,89 @@
+import pytest
+
+from pygments.styles import get_style_by_name
+
+from interpreter.ui.highlight import LineHighlighter, get_lexer, slice_tokens
+
+# Multi-line strings here are lexer states, which carry over from line to
+# line. Tokens matched by one regex across lines (C-style block comments,
+# heredocs) are only highlighted per line, so they're left out
+SOURCES = {
+    "python": '''import os
+
+def f(x, *args):
+    """A docstring
+    over several lines, with 'quotes' and "more"
+    """
+    s = \'\'\'one
+two\'\'\'
+    return f"{x!r} {s}"  # comment
+
+class A(B):
+    @property
+    def y(self): return [1, 2.5, 0x1F]
+''',
+    "javascript": """// a comment
+const x = `template
+${y} text`;
+function f(a) { return a * 2; }
+""",
+    "bash": """#!/bin/bash
+for f in *.txt; do
+  echo "$f: $(wc -l < "$f")
+  still the same string"
+done
+""",
+}
+
+
+def char_styles(tokens, style="monokai"):
+    # Token boundaries may differ, and so may the token type where two types
+    # look the same (e.g. a docstring lexed whole is String.Doc, line by line
+    # it's a string). What each visible character looks like must match
+    style = get_style_by_name(style)
+    return [
+        (char, style.style_for_token(ttype))
+        for ttype, value in tokens
+        for char in value
+        if not char.isspace()
+    ]
+
+
+@pytest.mark.parametrize("lang", SOURCES)
+def test_line_by_line_matches_whole_file(lang):
+    source = SOURCES[lang]
+    highlighter = LineHighlighter(lang)
+    assert highlighter.mode == "regex"
+
+    line_tokens = []
+    for line in source.split("\n")[:-1]:
+        line_tokens.extend(highlighter.tokenize(line))
+    whole = [
+        (ttype, value)
+        for _, ttype, value in get_lexer(lang).get_tokens_unprocessed(source)
+    ]
+    assert char_styles(line_tokens) == char_styles(whole)
+
+
+def test_tokens_cover_the_line():
+    highlighter = LineHighlighter("python")
+    for line in SOURCES["python"].split("\n"):
+        assert "".join(value for _, value in highlighter.tokenize(line)) == line
+
+
+def test_lexers_with_their_own_loop_go_line_by_line():
+    highlighter = LineHighlighter("json")
+    assert highlighter.mode == "line"
+    assert "".join(value for _, value in highlighter.tokenize('{"a": 1}')) == '{"a": 1}'
+
+
+def test_unknown_language_is_plain_text():
+    highlighter = LineHighlighter("no-such-language")
+    assert [value for _, value in highlighter.tokenize("x = 1")] == ["x = 1"]
+
+
+def test_slice_tokens():
+    tokens = LineHighlighter("python").tokenize("value = 'text'")
+    for start, end in [(0, 5), (3, 10), (8, None), (0, 0), (13, 100)]:
+        sliced = slice_tokens(tokens, start, end)
+        assert "".join(value for _, value in sliced) == "value = 'text'"[start:end]
@@ -0,0 +1,181 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from anthropic.types.beta import (
+    BetaInputJSONDelta,
+    BetaMessage,
+    BetaMessageDeltaUsage,
+    BetaRawContentBlockDeltaEvent,
+    BetaRawContentBlockStartEvent,
+    BetaRawContentBlockStopEvent,
+    BetaRawMessageDeltaEvent,
+    BetaRawMessageStartEvent,
+    BetaTextBlock,
+    BetaTextDelta,
+    BetaToolUseBlock,
+    BetaUsage,
+)
+from anthropic.types.beta.beta_raw_message_delta_event import Delta
+
+from interpreter import interpreter as interpreter_module
+from interpreter.interpreter import Interpreter
+
+
+async def stream(events):
+    for event in events:
+        yield event
+
+
+def anthropic_turn(block, deltas, stop_reason):
+    """The events of one streamed Anthropic message with a single content block."""
+    start = BetaRawMessageStartEvent(
+        type="message_start",
+        message=BetaMessage(
+            id="msg_1",
+            content=[],
+            model="claude-test",
+            role="assistant",
+            stop_reason=None,
+            stop_sequence=None,
+            type="message",
+            usage=BetaUsage(input_tokens=10, output_tokens=1),
+        ),
+    )
+    return [
+        start,
+        BetaRawContentBlockStartEvent(type="content_block_start", index=0, content_block=block),
+        *(
+            BetaRawContentBlockDeltaEvent(type="content_block_delta", index=0, delta=delta)
+            for delta in deltas
+        ),
+        BetaRawContentBlockStopEvent(type="content_block_stop", index=0),
+        BetaRawMessageDeltaEvent(
+            type="message_delta",
+            delta=Delta(stop_reason=stop_reason),
+            usage=BetaMessageDeltaUsage(output_tokens=5),
+        ),
+    ]
+
+
+class FakeAnthropic:
+    """Stands in for AsyncAnthropic, streaming one prepared message per request."""
+
+    def __init__(self, turns):
+        self.turns = list(turns)
+        self.requests = []
+        self.beta = SimpleNamespace(messages=SimpleNamespace(create=self.create))
+
+    async def create(self, **params):
+        self.requests.append(params)
+        return stream(self.turns.pop(0))
+
+
+def make_interpreter(provider):
+    interpreter = Interpreter()
+    interpreter.provider = provider
+    interpreter.max_tokens = 1000
+    interpreter.tools = ["interpreter"]
+    interpreter.auto_run = True
+    interpreter.interactive = False
+    interpreter.max_turns = 4
+    return interpreter
+
+
+def respond(interpreter, user_input):
+    async def run():
+        return [chunk async for chunk in interpreter.async_respond(user_input)]
+
+    return asyncio.run(run())
+
+
+def test_anthropic_turn_with_a_tool_call():
+    interpreter = make_interpreter("anthropic")
+    interpreter._client = FakeAnthropic(
+        [
+            anthropic_turn(
+                BetaToolUseBlock(id="toolu_1", name="bash", input={}, type="tool_use"),
+                [
+                    BetaInputJSONDelta(type="input_json_delta", partial_json='{"command": "ec'),
+                    BetaInputJSONDelta(type="input_json_delta", partial_json='ho hi"}'),
+                ],
+                "tool_use",
+            ),
+            anthropic_turn(
+                BetaTextBlock(type="text", text=""),
+                [BetaTextDelta(type="text_delta", text="It printed hi.")],
+                "end_turn",
+            ),
+        ]
+    )
+
+    chunks = respond(interpreter, "say hi")
+    assert chunks
+
+    requests = interpreter._client.requests
+    assert len(requests) == 2
+    assert "bash" in [tool["name"] for tool in requests[0]["tools"]]
+
+    tool_use = interpreter.messages[1]["content"][0]
+    assert tool_use.input == {"command": "echo hi"}
+    tool_result = interpreter.messages[2]["content"][0]
+    assert tool_result["type"] == "tool_result"
+    assert tool_result["tool_use_id"] == "toolu_1"
+    assert "hi" in json.dumps(tool_result["content"])
+    assert interpreter.messages[-1]["content"][0].text == "It printed hi."
+
+
+def litellm_chunk(content=None, tool_call=None, finish_reason=None):
+    tool_calls = None
+    if tool_call is not None:
+        call_id, name, arguments = tool_call
+        tool_calls = [
+            SimpleNamespace(
+                id=call_id,
+                type="function",
+                function=SimpleNamespace(name=name, arguments=arguments),
+            )
+        ]
+    delta = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+def test_litellm_turn_with_a_tool_call(monkeypatch):
+    turns = [
+        [
+            litellm_chunk(tool_call=("call_1", "bash", '{"command": ')),
+            litellm_chunk(tool_call=(None, None, '"echo hi"}')),
+            litellm_chunk(finish_reason="tool_calls"),
+        ],
+        [litellm_chunk(content="It printed hi."), litellm_chunk(finish_reason="stop")],
+    ]
+    requests = []
+
+    async def acompletion(**params):
+        requests.append(params)
+        return stream(turns.pop(0))
+
+    monkeypatch.setattr(interpreter_module.litellm, "acompletion", acompletion)
+    interpreter = make_interpreter("openai")
+    interpreter.model = "gpt-test"
+
+    respond(interpreter, "say hi")
+
+    assert len(requests) == 2
+    tool_message = next(m for m in interpreter.messages if isinstance(m, dict) and m["role"] == "tool")
+    assert tool_message["tool_call_id"] == "call_1"
+    assert "hi" in tool_message["content"]
+
+
+def test_api_error_on_the_first_turn_is_raised():
+    # Raised while the bash warm-up is still spawning, which must not leave
+    # asyncio.run waiting on it forever
+    class FailingAnthropic(FakeAnthropic):
+        async def create(self, **params):
+            raise RuntimeError("API is down")
+
+    interpreter = make_interpreter("anthropic")
+    interpreter._client = FailingAnthropic([])
+    with pytest.raises(RuntimeError, match="API is down"):
+        respond(interpreter, "hi")
@@ -0,0 +1,80 @@
+import json
+import random
+
+import pytest
+
+from interpreter.misc.json_stream import JSONStreamParser
+
+DOCUMENTS = [
+    '{"command": "ls -la", "restart": false}',
+    '{"command": "echo \\"hi\\" \\\\ done\\n", "timeout": 30}',
+    '{"path": "/tmp/x.py", "view_range": [1, -1], "old_str": null}',
+    '{"text": "caf\\u00e9 \\ud83d\\ude00 \\u4e2d\\u6587", "n": -1.5e3}',
+    '{"nested": {"a": [1, {"b": "c"}, []], "d": {}}, "e": true}',
+    '{"file_text": "def f():\\n\\treturn \'x\'\\r\\n", "empty": ""}',
+    '{ "spaced" : [ 1 , 2 ] , "key" : "value" }',
+    "{}",
+]
+
+
+def random_chunks(text, rng):
+    # Cut text at random places, including empty chunks and single characters
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.choice([0, 1, 1, 2, 3, 5, 8, 20])
+        chunks.append(text[pos : pos + size])
+        pos += size
+    return chunks
+
+
+def parse(chunks):
+    parser = JSONStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser.close(), events
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_random_chunking_matches_json_loads(document):
+    rng = random.Random(document)
+    expected = json.loads(document)
+    for _ in range(200):
+        value, events = parse(random_chunks(document, rng))
+        assert value == expected
+
+        # The deltas of each top-level string add up to its value, and other
+        # values are reported once, complete
+        seen = {}
+        for key, delta in events:
+            if isinstance(expected[key], str):
+                seen[key] = seen.get(key, "") + delta
+            else:
+                assert key not in seen
+                seen[key] = delta
+        assert seen == expected
+
+
+def test_one_chunk_per_character():
+    document = DOCUMENTS[3]
+    value, _ = parse(list(document))
+    assert value == json.loads(document)
+
+
+def test_surrogate_pair_split_between_chunks():
+    # A delta never holds half of a surrogate pair
+    value, events = parse(['{"s": "\\ud83d', '\\ude00"}'])
+    assert value == {"s": "\U0001F600"}
+    assert "".join(delta for _, delta in events) == "\U0001F600"
+
+
+def test_trailing_top_level_literal_needs_close():
+    parser = JSONStreamParser()
+    parser.feed("123")
+    assert parser.close() == 123
+
+
+@pytest.mark.parametrize("document", ['{"a" 1}', '{"a": 1 "b": 2}', '{1: 2}', "{} x"])
+def test_invalid_json(document):
+    with pytest.raises(ValueError):
+        parse([document])
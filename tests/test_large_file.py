@@ -0,0 +1,92 @@
+import random
+from bisect import bisect_right
+
+import pytest
+
+from interpreter.tools import large_file
+from interpreter.tools.large_file import LineIndex, MappedFile
+
+
+@pytest.fixture(params=[7, 64, 64 * 1024])
+def block_size(request, monkeypatch):
+    # Small blocks put line starts on, just before and just after block edges
+    monkeypatch.setattr(large_file, "BLOCK_SIZE", request.param)
+    return request.param
+
+
+def random_data(rng):
+    # Mostly short lines, with runs of empty ones
+    lines = ["x" * rng.choice([0, 0, 1, 5, 30]) for _ in range(rng.randint(0, 300))]
+    return "\n".join(lines).encode()
+
+
+def starts_of(data):
+    # Reference: line i (1-based) starts after the (i-1)th newline
+    return [0] + [i + 1 for i, byte in enumerate(data) if byte == ord("\n")]
+
+
+def test_line_start_and_line_of(block_size):
+    rng = random.Random(block_size)
+    for _ in range(50):
+        data = random_data(rng)
+        index = LineIndex(data, key=None)
+        starts = starts_of(data)
+        assert index.n_lines == len(starts)
+        for line, start in enumerate(starts, 1):
+            assert index.line_start(data, line) == start
+            end = starts[line] - 1 if line < len(starts) else len(data)
+            assert index.line_end(data, line) == end
+        for offset in range(len(data)):
+            assert index.line_of(data, offset) == bisect_right(starts, offset)
+
+
+def test_empty_data(block_size):
+    index = LineIndex(b"", key=None)
+    assert index.n_lines == 1
+    assert index.line_start(b"", 1) == 0
+    assert index.line_end(b"", 1) == 0
+
+
+def test_newline_at_the_end_makes_an_empty_last_line(block_size):
+    data = b"one\ntwo\n"
+    index = LineIndex(data, key=None)
+    assert index.n_lines == 3
+    assert index.line_start(data, 3) == len(data)
+
+
+def test_tabs_and_carriage_returns_are_not_plain(block_size):
+    assert LineIndex(b"a\nb\nc", key=None).plain
+    assert not LineIndex(b"a\n\tb", key=None).plain
+    assert not LineIndex(b"a\r\nb", key=None).plain
+
+
+def test_mapped_file(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"first\nsecond\nthird\n")
+    with MappedFile(path) as mapped:
+        assert mapped.size == 19
+        assert mapped.lines(2, 3) == "second\nthird"
+        assert mapped.lines(3) == "third\n"
+        assert mapped.find_line_end(0, 1) == len(b"first\nsecond")
+        assert mapped.find_line_end(6, 5) == mapped.size
+
+
+def test_splice_copies_ranges_and_keeps_the_mode(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"0123456789")
+    path.chmod(0o640)
+    mapped = MappedFile(path)
+    mapped.splice([(0, 3), b"abc", (7, 10)])
+    assert path.read_bytes() == b"012abc789"
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ["file.txt"]
+
+
+def test_index_is_rebuilt_after_the_file_changes(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"a\nb")
+    with MappedFile(path) as mapped:
+        assert mapped.index.n_lines == 2
+    path.write_bytes(b"a\nb\nc\nd")
+    with MappedFile(path) as mapped:
+        assert mapped.index.n_lines == 4
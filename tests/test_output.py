@@ -0,0 +1,121 @@
+import sys
+import threading
+import time
+
+from interpreter.ui.output import TerminalOutput
+
+
+class Recorder:
+    """Stands in for stdout, keeping each write as one frame."""
+
+    def __init__(self):
+        self.frames = []
+        self.flushes = 0
+
+    def write(self, text):
+        self.frames.append(text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_writes_come_out_in_order(monkeypatch):
+    stdout = Recorder()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    output = TerminalOutput(fps=1000)
+
+    expected = "".join(f"part {i}\n" for i in range(2000))
+    for i in range(2000):
+        output.write(f"part {i}\n")
+    output.flush()
+    assert "".join(stdout.frames) == expected
+    # Batched into frames, not written and flushed once per part
+    assert stdout.flushes < 2000
+
+
+def test_writes_from_several_threads_are_all_written(monkeypatch):
+    stdout = Recorder()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    output = TerminalOutput(fps=1000)
+
+    def writer(name):
+        for i in range(500):
+            output.write(f"{name}{i};")
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    output.flush()
+
+    parts = "".join(stdout.frames).split(";")[:-1]
+    assert sorted(parts) == sorted(f"{name}{i}" for name in "abcd" for i in range(500))
+    for name in "abcd":
+        # Each thread's own writes keep their order
+        mine = [int(part[1:]) for part in parts if part[0] == name]
+        assert mine == list(range(500))
+
+
+def test_background_thread_writes_without_flush(monkeypatch):
+    stdout = Recorder()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    output = TerminalOutput(fps=100)
+    output.write("hello")
+    assert wait_for(lambda: "".join(stdout.frames) == "hello")
+
+
+def test_spinner_is_cleared_before_content(monkeypatch):
+    stdout = Recorder()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    output = TerminalOutput(fps=1000)
+    owner = object()
+
+    output.start_spinner(owner, "Working")
+    output.flush()
+    assert stdout.frames[-1] == "\rWorking   "
+
+    output.stop_spinner(owner)
+    output.write("done\n")
+    output.flush()
+    text = "".join(stdout.frames)
+    # The spinner frame is blanked out, then the content follows it
+    assert text.endswith("\r" + " " * len("Working   ") + "\r" + "done\n")
+
+
+def test_only_the_owner_stops_the_spinner(monkeypatch):
+    stdout = Recorder()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    output = TerminalOutput(fps=1000)
+
+    output.start_spinner("first", "a")
+    output.start_spinner("second", "b")
+    output.stop_spinner("first")
+    output.flush()
+    assert stdout.frames[-1] == "\rb   "
+    output.stop_spinner("second")
+    output.flush()
+    assert stdout.frames[-1] == "\r    \r"
+
+
+def test_backlog_is_collapsed_while_the_terminal_is_stalled(monkeypatch):
+    stdout = Recorder()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    output = TerminalOutput(fps=1000)
+
+    # Hold the terminal, as a frame stuck on a slow write would
+    with output._write_lock:
+        for i in range(10 * TerminalOutput.MAX_PARTS):
+            output.write(f"part {i}\n")
+        assert len(output._parts) <= TerminalOutput.MAX_PARTS
+    output.flush()
+    assert "".join(stdout.frames) == "".join(
+        f"part {i}\n" for i in range(10 * TerminalOutput.MAX_PARTS)
+    )
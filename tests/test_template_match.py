@@ -0,0 +1,74 @@
+from PIL import Image, ImageDraw
+
+from interpreter.misc.template_match import FrameMatcher, locate
+
+
+def button(label, size=(96, 40)):
+    image = Image.new("L", size, 200)
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle(
+        (2, 2, size[0] - 3, size[1] - 3), 6, fill=90, outline=20, width=2
+    )
+    draw.text((12, 12), label, fill=250)
+    return image
+
+
+def screen():
+    # A light window with some lines of text, like a dialog or a page
+    image = Image.new("L", (800, 600), 235)
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        draw.text((20, 20 + 40 * i), f"line {i} of some text", fill=30)
+    return image
+
+
+def test_finds_the_element():
+    frame, ok = screen(), button("OK")
+    frame.paste(ok, (500, 300))
+    score, x, y, width, height, runner_up = locate(frame, ok)
+    assert score > 0.99
+    assert (x, y, width, height) == (500, 300, 96, 40)
+    assert runner_up[0] < 0.5
+
+
+def test_finds_the_element_at_another_scale():
+    # e.g. the page was zoomed in since the element was saved
+    frame, ok = screen(), button("OK")
+    frame.paste(ok.resize((120, 50), Image.Resampling.BILINEAR), (300, 200))
+    score, x, y, width, height, _ = locate(frame, ok)
+    assert score > 0.95
+    assert (width, height) == (120, 50)
+    assert abs(x - 300) <= 1 and abs(y - 200) <= 1
+
+
+def test_similar_element_is_the_runner_up():
+    frame, ok = screen(), button("OK")
+    frame.paste(ok, (500, 300))
+    frame.paste(button("Cancel"), (620, 300))
+    score, x, y, _, _, (other_score, other_x, other_y) = locate(frame, ok)
+    assert (x, y) == (500, 300)
+    assert (other_x, other_y) == (620, 300)
+    # Close, but clearly lower than the element itself
+    assert score - other_score > 0.05
+
+
+def test_duplicate_element_is_reported():
+    frame, ok = screen(), button("OK")
+    frame.paste(ok, (500, 300))
+    frame.paste(ok, (100, 500))
+    score, x, y, _, _, (other_score, other_x, other_y) = locate(frame, ok)
+    assert score > 0.99 and other_score > 0.99
+    assert {(x, y), (other_x, other_y)} == {(500, 300), (100, 500)}
+
+
+def test_missing_element_scores_low():
+    score = locate(screen(), button("OK"))[0]
+    assert score < 0.5
+
+
+def test_flat_template_matches_nothing():
+    assert locate(screen(), Image.new("L", (40, 40), 100)) is None
+
+
+def test_template_larger_than_frame():
+    assert FrameMatcher(screen().resize((50, 30))).match(button("OK")) is None